@@ -0,0 +1,805 @@
+#!/usr/bin/env python
+
+# timing benchmarks for the optimized parts of the audio pipeline
+# each one runs the current implementation alongside the original version (kept in tests/reference_functions.py, which the regression tests in the tests folder check against) and reports the run times, along with whether the outputs matched on the inputs given
+# can be pointed at real WAV files, otherwise synthetic diary-like audio is generated - nothing is written to PHOENIX
+# usage: python benchmarks/phone_audio_benchmarks.py check_name [wav paths...]
+
+# prevent librosa from logging a warning every time it is imported
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import librosa
+import soundfile as sf
+import pandas as pd
+from datetime import datetime, timedelta
+import pytz
+
+# the pipeline functions and the reference versions are imported from their folders in the repo
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repo_root, "individual_modules", "functions_called"))
+sys.path.insert(0, os.path.join(repo_root, "tests"))
+
+from phone_audio_vad import detect_pauses, separate_foreground, resynthesized_magnitude, pause_sample_mask, add_pause_rows, chunked_separation, resynthesized_max, detect_pauses_from_max, pause_audio_metrics
+from phone_audio_qc import qc_metrics
+from audio_buffer_functions import set_audio_dtype
+from vad_engine_functions import nn_filter_engines, vad_backends
+from frame_filter_functions import pause_frame_mask
+from opensmile_functions import LLD_FEATURES, lld_engine, extract_lld, save_lld, load_lld
+from feature_store_functions import upsert_rows, load_table, upsert_partitions, load_partition
+from spectrogram_functions import queue_spectrogram, render_spectrogram_job
+from qc_index_functions import qc_row_by_day, qc_row_by_filename
+from phone_audio_metadata_format import create_eastern_time_filemap, parse_recordings, first_per_day, filemap_table
+from phone_transcribeme_sftp_push import study_transcript_push
+from phone_transcribeme_sftp_pull import study_transcript_pull
+from local_sftp_server import start_local_sftp_server, stop_local_sftp_server
+from reference_functions import (synthetic_diary, pause_overlap, pause_agreement, FLOAT32_TOLERANCES, legacy_detect_pauses, legacy_pause_speech_signals, legacy_filter_opensmile, synthetic_frame_table, synthetic_lld,
+								 legacy_save_csv, tables_match, synthetic_qc_rows, synthetic_pause_rows, legacy_comparison_image, add_raw_week, legacy_is_dst, legacy_eastern_time_filemap, synthetic_raw_history,
+								 legacy_qc_minutes, synthetic_qc_study, legacy_transcript_push, synthetic_to_send, pushed_correctly, synthetic_transcripts, pulled_correctly)
+
+# loads the input WAV paths at the VAD sample rate, or makes a few synthetic diaries of different lengths if no paths are given
+# returns list of (label, audio, sample rate)
+def benchmark_inputs(paths, sr=22050):
+	inputs = []
+	if len(paths) == 0:
+		for seconds, seed in [(5, 0), (30, 1), (120, 2), (600, 3)]:
+			audio, cur_sr = synthetic_diary(seconds=seconds, sr=sr, seed=seed)
+			inputs.append(("synthetic " + str(seconds) + "s", audio, cur_sr))
+		return inputs
+	for path in paths:
+		audio, cur_sr = librosa.load(path, sr=sr)
+		inputs.append((path, audio, cur_sr))
+	return inputs
+
+# checks that the vectorized pause detection gives exactly the same pause periods (and therefore the same pauseTimesOutput CSV rows) as the original loops
+# a few thresholds are tried for each input so that both sparse and dense pause patterns are covered
+# returns True if everything matched
+def check_pause_detect(paths=[]):
+	all_match = True
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		for spec_thres in [0.01, 0.03, 0.1, 0.5]:
+			start_time = time.time()
+			legacy = legacy_detect_pauses(S_full, sr, spec_thres=spec_thres)
+			legacy_seconds = time.time() - start_time
+			start_time = time.time()
+			current = detect_pauses(S_full, sr, spec_thres=spec_thres)
+			current_seconds = time.time() - start_time
+			match = (legacy == current)
+			all_match = all_match and match
+			speedup = (legacy_seconds / current_seconds) if current_seconds > 0 else float("inf")
+			print(label + ", threshold " + str(spec_thres) + ": " + ("match" if match else "MISMATCH") + " (" + str(len(current)) + " pauses) - original " + str(round(legacy_seconds, 4)) + " s, vectorized " + str(round(current_seconds, 4)) + " s (" + str(round(speedup, 1)) + "x)")
+	print("Pause detection regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that pause detection done within VAD on the in-memory foreground (fused mode) gives the same pauses as the original route of saving the foreground WAV and reading it back for pause detection
+# also reports how much the pauses change when detecting directly on the foreground magnitude spectrogram instead, as the fraction of pause spectrogram indices the two agree on
+# returns True if the resynthesized fused pauses matched exactly
+def check_fused_vad(paths=[]):
+	all_match = True
+	scratch = tempfile.mkdtemp()
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		try:
+			S_foreground, S_background = separate_foreground(S_full, sr)
+		except:
+			print(label + " is too short for VAD, skipping")
+			continue
+
+		# original route - inverse transform, write the foreground WAV, read it back, forward transform
+		start_time = time.time()
+		foreground = librosa.istft(S_foreground)
+		scratch_path = os.path.join(scratch, "foreground.wav")
+		sf.write(scratch_path, foreground, sr)
+		data, fs = sf.read(scratch_path)
+		S_saved, phase = librosa.magphase(librosa.stft(data))
+		legacy = detect_pauses(S_saved, fs)
+		legacy_seconds = time.time() - start_time
+
+		start_time = time.time()
+		fused = detect_pauses(resynthesized_magnitude(librosa.istft(S_foreground), sr), sr)
+		fused_seconds = time.time() - start_time
+
+		start_time = time.time()
+		direct = detect_pauses(S_foreground, sr)
+		direct_seconds = time.time() - start_time
+
+		match = (legacy == fused)
+		all_match = all_match and match
+		agreement = pause_agreement(legacy, direct)
+		print(label + ": resynthesized " + ("match" if match else "MISMATCH") + " (" + str(len(fused)) + " pauses), direct foreground found " + str(len(direct)) + " pauses with " + str(round(agreement * 100, 1)) + "% agreement - saved WAV route " + str(round(legacy_seconds, 4)) + " s, fused resynthesized " + str(round(fused_seconds, 4)) + " s, fused direct " + str(round(direct_seconds, 4)) + " s")
+	try:
+		os.remove(os.path.join(scratch, "foreground.wav"))
+	except:
+		pass
+	os.rmdir(scratch)
+	print("Fused VAD regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# compares each of the nearest neighbor filter engines for VAD against the original librosa one
+# reports run time, the fraction of foreground mask values (the voice soft mask, thresholded at 0.5) that agree, and the agreement of the resulting pause times
+# returns True if the blocked engine gave the same pause times as librosa, and every other engine agreed on at least min_agreement of the pause indices pooled across all the inputs
+# (agreement on a single short diary with only a few pauses can swing a lot from one pause changing, so it is only reported per input)
+def check_nn_filter(paths=[], min_agreement=0.9):
+	all_match = True
+	pooled = {}
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		results = {}
+		for engine in nn_filter_engines:
+			start_time = time.time()
+			try:
+				S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=engine)
+			except:
+				break
+			engine_seconds = time.time() - start_time
+			pauses = detect_pauses(resynthesized_magnitude(librosa.istft(S_foreground), sr), sr)
+			results[engine] = (engine_seconds, S_foreground > 0.5 * S_full, pauses)
+		if len(results) == 0:
+			print(label + " is too short for VAD, skipping")
+			continue
+
+		librosa_seconds, librosa_mask, librosa_pauses = results["librosa"]
+		print(label + ": librosa took " + str(round(librosa_seconds, 2)) + " s (" + str(len(librosa_pauses)) + " pauses)")
+		for engine in results:
+			if engine == "librosa":
+				continue
+			engine_seconds, engine_mask, engine_pauses = results[engine]
+			agreement = pause_agreement(librosa_pauses, engine_pauses)
+			if engine == "blocked":
+				all_match = all_match and (engine_pauses == librosa_pauses)
+			num_both, num_either = pause_overlap(librosa_pauses, engine_pauses)
+			pooled_both, pooled_either = pooled.get(engine, (0, 0))
+			pooled[engine] = (pooled_both + num_both, pooled_either + num_either)
+			speedup = (librosa_seconds / engine_seconds) if engine_seconds > 0 else float("inf")
+			print("    " + engine + " took " + str(round(engine_seconds, 2)) + " s (" + str(round(speedup, 1)) + "x) - " + str(round(np.mean(engine_mask == librosa_mask) * 100, 2)) + "% foreground mask agreement, " + str(len(engine_pauses)) + " pauses with " + str(round(agreement * 100, 1)) + "% agreement")
+	for engine in pooled:
+		pooled_both, pooled_either = pooled[engine]
+		agreement = (float(pooled_both) / pooled_either) if pooled_either > 0 else 1.0
+		print(engine + " pause agreement across all inputs: " + str(round(agreement * 100, 1)) + "%")
+		all_match = all_match and (agreement >= min_agreement)
+	print("Nearest neighbor filter engine check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# total length in seconds of a set of pause periods (as returned by detect_pauses), as it would be recorded in the pause times CSV
+def pause_seconds(pause_periods, sr, samples_per_spec_bin=512):
+	return sum([num for first, last, num in pause_periods]) * samples_per_spec_bin / float(sr)
+
+# compares each lightweight VAD backend against the original foreground separation VAD (with the given nearest neighbor filter engine, and the default resynthesized pause detection), to help pick a backend for triage runs
+# reports per diary run time for each, along with the pause count and minutes of speech (diary length minus pause time) each finds, how closely those agree (smaller over larger), and the pause time agreement
+# then the same agreements pooled across all the inputs - these are only reported, as how closely the backends need to agree depends on what the run is for
+def check_vad_backends(paths=[], nn_engine="librosa"):
+	totals = {}
+	for label, audio, sr in benchmark_inputs(paths):
+		diary_minutes = len(audio) / float(sr) / 60.0
+		start_time = time.time()
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		stft_seconds = time.time() - start_time
+		start_time = time.time()
+		try:
+			S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=nn_engine)
+		except:
+			print(label + " is too short for VAD, skipping")
+			continue
+		separation_pauses = detect_pauses(resynthesized_magnitude(librosa.istft(S_foreground), sr), sr)
+		separation_seconds = stft_seconds + time.time() - start_time
+		separation_speech = diary_minutes - pause_seconds(separation_pauses, sr) / 60.0
+		print(label + ": separation took " + str(round(separation_seconds, 2)) + " s - " + str(len(separation_pauses)) + " pauses, " + str(round(separation_speech, 2)) + " minutes of speech")
+		for backend in vad_backends:
+			start_time = time.time()
+			backend_pauses = vad_backends[backend](librosa.magphase(librosa.stft(audio))[0], sr)
+			backend_seconds = time.time() - start_time
+			backend_speech = diary_minutes - pause_seconds(backend_pauses, sr) / 60.0
+			count_agreement = float(min(len(backend_pauses), len(separation_pauses))) / max(1, len(backend_pauses), len(separation_pauses))
+			speech_agreement = (min(backend_speech, separation_speech) / max(backend_speech, separation_speech)) if max(backend_speech, separation_speech) > 0 else 1.0
+			num_both, num_either = pause_overlap(separation_pauses, backend_pauses)
+			cur_totals = totals.get(backend, [0, 0, 0.0, 0.0, 0, 0, 0.0, 0.0])
+			totals[backend] = [a + b for a, b in zip(cur_totals, [len(separation_pauses), len(backend_pauses), separation_speech, backend_speech, num_both, num_either, separation_seconds, backend_seconds])]
+			speedup = (separation_seconds / backend_seconds) if backend_seconds > 0 else float("inf")
+			print("    " + backend + " took " + str(round(backend_seconds, 3)) + " s (" + str(round(speedup, 1)) + "x) - " + str(len(backend_pauses)) + " pauses (" + str(round(count_agreement * 100, 1)) + "% count agreement), " + str(round(backend_speech, 2)) + " minutes of speech (" + str(round(speech_agreement * 100, 1)) + "% agreement), " + str(round(pause_agreement(separation_pauses, backend_pauses) * 100, 1)) + "% pause time agreement")
+	for backend in totals:
+		sep_count, backend_count, sep_speech, backend_speech, num_both, num_either, sep_seconds, backend_seconds = totals[backend]
+		print(backend + " across all inputs: " + str(backend_count) + " vs " + str(sep_count) + " pauses, " + str(round(backend_speech, 2)) + " vs " + str(round(sep_speech, 2)) + " minutes of speech, " + str(round((float(num_both) / num_either if num_either > 0 else 1.0) * 100, 1)) + "% pause time agreement - " + str(round(backend_seconds, 2)) + " s vs " + str(round(sep_seconds, 2)) + " s in total")
+
+# compares chunked VAD (chunked_separation, as run by diary_vad when given chunk_sec) against separating the whole diary at once, for the librosa and approximate nearest neighbor filter engines
+# reports run time and peak memory allocated (traced by tracemalloc) for each, and checks the pauses (resynthesized and direct foreground) come out exactly the same where they should -
+# for diaries no longer than one chunk, and for the approximate engine given at least 2 minutes of overlap - otherwise reports the pause time agreement
+# also reports the fraction of foreground audio samples that differ at all (with the approximate engine a near tie in similarity can pick a different neighbour for the odd time point)
+# the librosa engine is only run on diaries up to max_librosa_seconds long, as on longer ones it takes several minutes each way
+# returns True if everything that should match did
+def check_chunked_vad(paths=[], chunk_sec=240, overlap_sec=125, max_librosa_seconds=120):
+	all_match = True
+	tracemalloc.start()
+	for label, audio, sr in benchmark_inputs(paths):
+		for engine in ["librosa", "approximate"]:
+			if engine == "librosa" and len(audio) / float(sr) > max_librosa_seconds:
+				continue
+			tracemalloc.reset_peak()
+			start_time = time.time()
+			try:
+				S_full, phase = librosa.magphase(librosa.stft(audio))
+				S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=engine)
+			except:
+				print(label + " is too short for VAD, skipping")
+				break
+			whole_foreground = librosa.istft(S_foreground)
+			whole_pauses = detect_pauses(resynthesized_magnitude(whole_foreground, sr), sr)
+			whole_direct = detect_pauses(S_foreground, sr)
+			whole_seconds = time.time() - start_time
+			whole_peak = tracemalloc.get_traced_memory()[1]
+			del S_full, phase, S_foreground, S_background
+
+			tracemalloc.reset_peak()
+			start_time = time.time()
+			foreground, frame_max, image_panels, image_factor = chunked_separation(audio, sr, nn_engine=engine, chunk_sec=chunk_sec, overlap_sec=overlap_sec, foreground_max=True, image_width_px=1200)
+			chunked_pauses = detect_pauses_from_max(resynthesized_max(foreground, sr, int(librosa.time_to_frames(chunk_sec, sr=sr))), sr)
+			chunked_direct = detect_pauses_from_max(frame_max, sr)
+			chunked_seconds = time.time() - start_time
+			chunked_peak = tracemalloc.get_traced_memory()[1]
+
+			same = chunked_pauses == whole_pauses and chunked_direct == whole_direct
+			foreground_diff = np.mean(foreground != whole_foreground)
+			should_match = (engine == "approximate" and overlap_sec >= 120) or len(audio) / float(sr) <= chunk_sec
+			if should_match:
+				all_match = all_match and same
+				result = ("match" if same else "MISMATCH")
+			else:
+				result = ("same" if same else str(round(pause_agreement(whole_pauses, chunked_pauses) * 100, 1)) + "% pause time agreement")
+			print(label + ", " + engine + ": " + result + " (" + str(len(chunked_pauses)) + " pauses, " + str(round(foreground_diff * 100, 3)) + "% of foreground samples differ) - whole diary " + str(round(whole_seconds, 2)) + " s with " + str(round(whole_peak / 1e6, 1)) + " MB peak, chunked " + str(round(chunked_seconds, 2)) + " s with " + str(round(chunked_peak / 1e6, 1)) + " MB peak")
+	tracemalloc.stop()
+	print("Chunked VAD regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# runs the audio QC metrics, resynthesized pause detection (on one shared VAD foreground, which is float32 either way), and the pause-derived dB and flatness in float64 and then float32
+# reports the largest differences seen against FLOAT32_TOLERANCES, along with the run time and peak memory allocated (traced by tracemalloc) for each precision
+# returns True if every output stayed within tolerance
+def check_float32(paths=[]):
+	all_match = True
+	worst = {"db": 0.0, "std": 0.0, "flatness": 0.0, "pause_agreement": 1.0}
+	tracemalloc.start()
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		try:
+			S_foreground, S_background = separate_foreground(S_full, sr, nn_engine="approximate")
+		except:
+			print(label + " is too short for VAD, skipping")
+			continue
+		foreground = librosa.istft(S_foreground)
+		del S_full, phase, S_background
+
+		results = {}
+		for dtype_name in ["float64", "float32"]:
+			set_audio_dtype(dtype_name)
+			tracemalloc.reset_peak()
+			start_time = time.time()
+			vol, std, mean_flat, max_flat = qc_metrics(audio)
+			pauses = detect_pauses(resynthesized_magnitude(foreground, sr), sr)
+			pause_vals = [[], [], [], [], []]
+			add_pause_rows(pause_vals, "", pauses, sr, 1.0)
+			pause_mask = pause_sample_mask(len(audio), pause_vals[2], pause_vals[3])
+			pause_db, pause_flatness = pause_audio_metrics(audio[pause_mask].astype(dtype_name))
+			results[dtype_name] = (20 * np.log10(vol / float(2*(10**(-5)))), std, mean_flat, max_flat, pauses, pause_db, pause_flatness, time.time() - start_time, tracemalloc.get_traced_memory()[1])
+		set_audio_dtype("float64")
+
+		db64, std64, mean64, max64, pauses64, pause_db64, pause_flat64, seconds64, peak64 = results["float64"]
+		db32, std32, mean32, max32, pauses32, pause_db32, pause_flat32, seconds32, peak32 = results["float32"]
+		diffs = {"db": max(abs(db32 - db64), abs(pause_db32 - pause_db64) if len(pauses64) > 0 else 0.0),
+				 "std": abs(std32 - std64) / std64,
+				 "flatness": max([abs(a - b) / b for a, b in [(mean32, mean64), (max32, max64), (pause_flat32, pause_flat64)] if b > 0 and not np.isnan(b)]),
+				 "pause_agreement": pause_agreement(pauses64, pauses32)}
+		within = diffs["db"] <= FLOAT32_TOLERANCES["db"] and diffs["std"] <= FLOAT32_TOLERANCES["std"] and diffs["flatness"] <= FLOAT32_TOLERANCES["flatness"] and diffs["pause_agreement"] >= FLOAT32_TOLERANCES["pause_agreement"]
+		all_match = all_match and within
+		for key in worst:
+			worst[key] = min(worst[key], diffs[key]) if key == "pause_agreement" else max(worst[key], diffs[key])
+		print(label + ": " + ("within tolerance" if within else "OUT OF TOLERANCE") + " - dB off by " + str(round(diffs["db"], 5)) + ", std by " + "{:.1e}".format(diffs["std"]) + ", flatness by " + "{:.1e}".format(diffs["flatness"]) + " (relative), " + str(len(pauses32)) + " vs " + str(len(pauses64)) + " pauses with " + str(round(diffs["pause_agreement"] * 100, 2)) + "% agreement - float64 " + str(round(seconds64, 2)) + " s with " + str(round(peak64 / 1e6, 1)) + " MB peak, float32 " + str(round(seconds32, 2)) + " s with " + str(round(peak32 / 1e6, 1)) + " MB peak")
+	tracemalloc.stop()
+	print("Largest differences: dB " + str(round(worst["db"], 5)) + " (tolerance " + str(FLOAT32_TOLERANCES["db"]) + "), std " + "{:.1e}".format(worst["std"]) + " (" + str(FLOAT32_TOLERANCES["std"]) + "), flatness " + "{:.1e}".format(worst["flatness"]) + " (" + str(FLOAT32_TOLERANCES["flatness"]) + "), lowest pause agreement " + str(round(worst["pause_agreement"] * 100, 2)) + "% (" + str(FLOAT32_TOLERANCES["pause_agreement"] * 100) + "%)")
+	print("float32 numeric mode check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that building the pause-only and speech-only signals from a sample mask gives exactly the same signals as the original appending loops, using the pause times detected on each input
+# a lower threshold is tried as well to get diaries with many short pauses, which is where the appending was slowest
+# returns True if all signals matched
+def check_pause_assembly(paths=[]):
+	all_match = True
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		for spec_thres in [0.03, 0.1]:
+			pause_vals = [[], [], [], [], []]
+			add_pause_rows(pause_vals, label, detect_pauses(S_full, sr, spec_thres=spec_thres), sr, 1.0)
+			pause_starts = pause_vals[2]
+			pause_stops = pause_vals[3]
+
+			start_time = time.time()
+			legacy_pauses, legacy_speech = legacy_pause_speech_signals(audio, pause_starts, pause_stops)
+			legacy_seconds = time.time() - start_time
+
+			start_time = time.time()
+			pause_mask = pause_sample_mask(len(audio), pause_starts, pause_stops)
+			pauses_only = audio[pause_mask].astype(np.float64)
+			speech_mask = ~pause_mask
+			speech_mask[-1] = False
+			speech_only = audio[speech_mask].astype(np.float64)
+			mask_seconds = time.time() - start_time
+
+			match = np.array_equal(legacy_pauses, pauses_only) and np.array_equal(legacy_speech, speech_only)
+			all_match = all_match and match
+			speedup = (legacy_seconds / mask_seconds) if mask_seconds > 0 else float("inf")
+			print(label + ", threshold " + str(spec_thres) + ": " + ("match" if match else "MISMATCH") + " (" + str(len(pause_starts)) + " pauses) - appending " + str(round(legacy_seconds, 4)) + " s, mask " + str(round(mask_seconds, 4)) + " s (" + str(round(speedup, 1)) + "x)")
+	print("Pause/speech signal assembly regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that filtering a frame-level feature table by pause times with the sorted interval search gives exactly the same filtered table as the original per-pause loop
+# uses the pause times detected on each input at a couple of thresholds, applied to a table of 10 ms frames with random feature values (as OpenSMILE is not needed for this)
+# returns True if all tables matched
+def check_os_filter(paths=[]):
+	all_match = True
+	feature_cols = ["Loudness_sma3", "F0semitoneFrom27.5Hz_sma3nz", "HNRdBACF_sma3nz"]
+	for label, audio, sr in benchmark_inputs(paths):
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		raw_os_result = synthetic_frame_table(len(audio) / float(sr), feature_cols)
+		num_frames = raw_os_result.shape[0]
+		for spec_thres in [0.03, 0.1]:
+			pause_vals = [[], [], [], [], []]
+			add_pause_rows(pause_vals, label, detect_pauses(S_full, sr, spec_thres=spec_thres), sr, 1.0)
+			pause_start_times = [b/float(sr) for b in pause_vals[2]]
+			pause_stop_times = [b/float(sr) for b in pause_vals[3]]
+
+			start_time = time.time()
+			legacy = legacy_filter_opensmile(raw_os_result, pause_start_times, pause_stop_times, feature_cols)
+			legacy_seconds = time.time() - start_time
+
+			start_time = time.time()
+			in_pause = pause_frame_mask(raw_os_result, pause_start_times, pause_stop_times)
+			current = raw_os_result[feature_cols].copy()
+			current.loc[in_pause] = np.nan
+			current["frameTime"] = raw_os_result["frameTime"].tolist()
+			current_seconds = time.time() - start_time
+
+			match = legacy.equals(current)
+			all_match = all_match and match
+			speedup = (legacy_seconds / current_seconds) if current_seconds > 0 else float("inf")
+			print(label + ", threshold " + str(spec_thres) + ": " + ("match" if match else "MISMATCH") + " (" + str(len(pause_start_times)) + " pauses, " + str(int(np.sum(in_pause))) + " of " + str(num_frames) + " frames in pauses) - per-pause loop " + str(round(legacy_seconds, 4)) + " s, interval search " + str(round(current_seconds, 4)) + " s (" + str(round(speedup, 1)) + "x)")
+	print("OpenSMILE pause filtering regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that OpenSMILE LLDs saved in the binary format load back the same as the semicolon CSV, and compares file size and load time of the two
+# LLDs are computed in process if the opensmile python package is installed, otherwise random values in the same layout are used (10 ms frames, with NaN where unvoiced like the _sma3nz features)
+def check_lld_format(paths=[]):
+	all_match = True
+	try:
+		engine = lld_engine()
+	except ImportError:
+		print("opensmile python package not installed, using random LLD values")
+		engine = None
+	with tempfile.TemporaryDirectory() as temp_folder:
+		for label, audio, sr in benchmark_inputs(paths):
+			if engine is not None:
+				lld = extract_lld(engine, audio, sr)
+			else:
+				lld = synthetic_lld(len(audio) / float(sr), LLD_FEATURES)
+			out_root = os.path.join(temp_folder, "diary")
+			save_lld(lld, out_root, save_csv=True)
+
+			start_time = time.time()
+			from_csv = pd.read_csv(out_root + ".csv", sep=';')
+			csv_seconds = time.time() - start_time
+			start_time = time.time()
+			from_binary = load_lld(out_root)
+			binary_seconds = time.time() - start_time
+
+			numeric_cols = ["frameTime"] + LLD_FEATURES
+			match = (from_binary.columns.tolist() == from_csv.columns.tolist()) and from_binary["name"].equals(from_csv["name"]) and np.allclose(from_binary[numeric_cols].to_numpy(), from_csv[numeric_cols].to_numpy(), rtol=1e-12, atol=0, equal_nan=True)
+			all_match = all_match and match
+			csv_kb = os.path.getsize(out_root + ".csv") / 1024.0
+			binary_kb = os.path.getsize(out_root + ".npz") / 1024.0
+			print(label + ": " + ("match" if match else "MISMATCH") + " (" + str(len(lld)) + " frames) - CSV " + str(round(csv_kb, 1)) + " KB loaded in " + str(round(csv_seconds, 4)) + " s, binary " + str(round(binary_kb, 1)) + " KB loaded in " + str(round(binary_seconds, 4)) + " s")
+			os.remove(out_root + ".csv")
+			os.remove(out_root + ".npz")
+	print("OpenSMILE LLD binary format check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that saving weekly batches of rows with the feature store gives the same CSV as the original read-concatenate-rewrite save, and compares the time each takes per save as the patient history grows
+# then checks that saving a row again with an existing key replaces it, in both the store and the CSV
+# no WAV input is needed for this one - optional first argument is the number of weeks of history to simulate (default 520, i.e. 10 years)
+def check_feature_store(args=[]):
+	num_weeks = int(args[0]) if len(args) > 0 else 520
+	key_cols = ["OLID", "filename"]
+	rng = np.random.default_rng(0)
+	weekly_rows = [synthetic_qc_rows(w, rng) for w in range(num_weeks)]
+	legacy_seconds = []
+	store_seconds = []
+	with tempfile.TemporaryDirectory() as temp_folder:
+		legacy_path = os.path.join(temp_folder, "legacy", "TEST_AAAAA_phone_audioQC_output.csv")
+		store_path = os.path.join(temp_folder, "store", "TEST_AAAAA_phone_audioQC_output.csv")
+		os.mkdir(os.path.dirname(legacy_path))
+		os.mkdir(os.path.dirname(store_path))
+		for rows in weekly_rows:
+			start_time = time.time()
+			legacy_save_csv(legacy_path, rows, key_cols)
+			legacy_seconds.append(time.time() - start_time)
+			start_time = time.time()
+			upsert_rows(store_path, rows, key_cols)
+			store_seconds.append(time.time() - start_time)
+
+		legacy_csv = pd.read_csv(legacy_path)
+		match = tables_match(legacy_csv, pd.read_csv(store_path)) and tables_match(legacy_csv, load_table(store_path))
+		print(str(num_weeks) + " weekly saves (" + str(legacy_csv.shape[0]) + " rows): " + ("match" if match else "MISMATCH"))
+		for label, first, last in [("first 10 weeks", 0, 10), ("last 10 weeks", num_weeks - 10, num_weeks)]:
+			legacy_mean = np.mean(legacy_seconds[first:last])
+			store_mean = np.mean(store_seconds[first:last])
+			print(label + ": read-concatenate-rewrite " + str(round(legacy_mean * 1000, 2)) + " ms per save, feature store " + str(round(store_mean * 1000, 2)) + " ms per save (" + str(round(legacy_mean / store_mean, 1)) + "x)")
+
+		# replace one row from the first week - the CSV then has to be rewritten, the store just gets the new row
+		replacement = weekly_rows[0].iloc[[3]].copy()
+		replacement["overall_db"] = -1.0
+		upsert_rows(store_path, replacement, key_cols)
+		expected = pd.concat([legacy_csv.drop(index=3), replacement], ignore_index=True)
+		replaced = tables_match(expected, pd.read_csv(store_path)) and tables_match(expected, load_table(store_path))
+		print("replacing an existing row: " + ("match" if replaced else "MISMATCH"))
+	all_match = match and replaced
+	print("Feature store regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that pause times saved with one partition per diary give the same CSV and the same per-diary pauses as the original pause times CSV, and compares the time for each weekly run -
+# saving the week's pauses, then getting each of the week's diaries' pauses back (as pause-derived QC does) - as the patient history grows
+# no WAV input is needed for this one - optional first argument is the number of weeks of history to simulate (default 104, i.e. 2 years)
+def check_pause_store(args=[]):
+	num_weeks = int(args[0]) if len(args) > 0 else 104
+	rng = np.random.default_rng(0)
+	weekly_rows = [synthetic_pause_rows(w, rng) for w in range(num_weeks)]
+	legacy_seconds = []
+	store_seconds = []
+	all_match = True
+	with tempfile.TemporaryDirectory() as temp_folder:
+		legacy_path = os.path.join(temp_folder, "legacy", "TEST_AAAAA_phone_audioVAD_pauseTimesOutput.csv")
+		store_path = os.path.join(temp_folder, "store", "TEST_AAAAA_phone_audioVAD_pauseTimesOutput.csv")
+		os.mkdir(os.path.dirname(legacy_path))
+		os.mkdir(os.path.dirname(store_path))
+		for rows in weekly_rows:
+			diaries = pd.unique(rows["filename"]).tolist()
+			start_time = time.time()
+			legacy_save_csv(legacy_path, rows, ["filename", "pause_number"])
+			pause_times = pd.read_csv(legacy_path)
+			legacy_pauses = [pause_times[pause_times["filename"]==filename] for filename in diaries]
+			legacy_seconds.append(time.time() - start_time)
+
+			start_time = time.time()
+			upsert_partitions(store_path, rows, "filename")
+			store_pauses = [load_partition(store_path, "filename", filename) for filename in diaries]
+			store_seconds.append(time.time() - start_time)
+
+			for legacy_cur, store_cur in zip(legacy_pauses, store_pauses):
+				all_match = all_match and tables_match(legacy_cur.reset_index(drop=True), store_cur)
+		csv_match = tables_match(pd.read_csv(legacy_path), pd.read_csv(store_path))
+		all_match = all_match and csv_match
+		print(str(num_weeks) + " weekly runs (" + str(sum([r.shape[0] for r in weekly_rows])) + " pauses): per-diary pauses " + ("match" if all_match else "MISMATCH") + ", CSV " + ("match" if csv_match else "MISMATCH"))
+		for label, first, last in [("first 10 weeks", 0, 10), ("last 10 weeks", num_weeks - 10, num_weeks)]:
+			legacy_mean = np.mean(legacy_seconds[first:last])
+			store_mean = np.mean(store_seconds[first:last])
+			print(label + ": full CSV " + str(round(legacy_mean * 1000, 2)) + " ms per run, per-diary partitions " + str(round(store_mean * 1000, 2)) + " ms per run (" + str(round(legacy_mean / store_mean, 1)) + "x)")
+
+		# saving a diary again replaces all of its old pauses, even if it now has fewer
+		redo = weekly_rows[0][weekly_rows[0]["filename"] == weekly_rows[0]["filename"].iloc[0]].iloc[:10].copy()
+		upsert_partitions(store_path, redo, "filename")
+		redo_match = tables_match(redo.reset_index(drop=True), load_partition(store_path, "filename", redo["filename"].iloc[0])) and (pd.read_csv(store_path).shape[0] == pd.read_csv(legacy_path).shape[0] - (weekly_rows[0]["filename"] == redo["filename"].iloc[0]).sum() + 10)
+		print("saving a diary again: " + ("match" if redo_match else "MISMATCH"))
+	all_match = all_match and redo_match
+	print("Per-diary pause times regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# compares drawing the VAD comparison image inline (as VAD used to) with queuing it and rendering it separately - reports the time the VAD loop spends on it either way,
+# and checks the rendered images are the same size and look the same (mean absolute pixel difference below max_pixel_diff, on a 0 to 1 scale)
+# the approximate nearest neighbor filter is used for the foreground, as only the rendering is being compared here
+# inline rendering of diaries longer than max_inline_seconds is skipped - at full resolution it needs several GB of memory for a 10 minute diary - so only the queued path is timed for those
+def check_spectrograms(paths=[], max_pixel_diff=0.03, max_inline_seconds=120):
+	import matplotlib.pyplot as plt
+	all_match = True
+	with tempfile.TemporaryDirectory() as temp_folder:
+		for label, audio, sr in benchmark_inputs(paths):
+			S_full, phase = librosa.magphase(librosa.stft(audio))
+			S_foreground, S_background = separate_foreground(S_full, sr, nn_engine="approximate")
+			legacy_path = os.path.join(temp_folder, "legacy.png")
+			queued_path = os.path.join(temp_folder, "queued.png")
+
+			start_time = time.time()
+			queue_spectrogram(os.path.join(temp_folder, "queue"), queued_path, [("Full spectrum", S_full, None), ("Background", S_background, None), ("Foreground", S_foreground, "time")], sr, figsize=(12, 8))
+			queue_seconds = time.time() - start_time
+			start_time = time.time()
+			job_path, success, error = render_spectrogram_job(os.path.join(temp_folder, "queue", "queued.npz"))
+			render_seconds = time.time() - start_time
+			if len(audio) / float(sr) > max_inline_seconds:
+				all_match = all_match and success
+				print(label + ": " + ("rendered" if success else "RENDER FAILED") + " - queuing " + str(round(queue_seconds, 3)) + " s, deferred rendering " + str(round(render_seconds, 3)) + " s (inline rendering skipped)")
+				continue
+			start_time = time.time()
+			legacy_comparison_image(S_full, S_background, S_foreground, sr, legacy_path)
+			legacy_seconds = time.time() - start_time
+
+			legacy_image = plt.imread(legacy_path)
+			queued_image = plt.imread(queued_path)
+			same_size = success and legacy_image.shape == queued_image.shape
+			pixel_diff = np.mean(np.abs(legacy_image - queued_image)) if same_size else float("inf")
+			match = same_size and pixel_diff <= max_pixel_diff
+			all_match = all_match and match
+			print(label + ": " + ("match" if match else "MISMATCH") + " (mean pixel difference " + str(round(pixel_diff, 4)) + ") - inline rendering " + str(round(legacy_seconds, 3)) + " s, queuing " + str(round(queue_seconds, 3)) + " s (" + str(round(legacy_seconds / queue_seconds, 1)) + "x less time in the VAD loop), deferred rendering " + str(round(render_seconds, 3)) + " s")
+	print("Spectrogram rendering check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that building the ETFileMap incrementally from the last run's raw listing gives exactly the same CSV as a full rebuild, for a simulated weekly run over years of uploads
+# and compares the time for each run as the history grows - then checks the fallbacks to a full rebuild, for a recording that turns up dated before the last one mapped and for a removed recording
+# no WAV input is needed for this one - optional first argument is the number of weeks of history to simulate (default 260, i.e. 5 years)
+def check_filemap(args=[]):
+	num_weeks = int(args[0]) if len(args) > 0 else 260
+	rng = np.random.default_rng(0)
+	start_folder = os.getcwd()
+	full_seconds = []
+	incremental_seconds = []
+	all_match = True
+	with tempfile.TemporaryDirectory() as temp_folder:
+		# both builds read the same raw folder, each writing to its own processed folder
+		full_root = os.path.join(temp_folder, "full") + "/"
+		incremental_root = os.path.join(temp_folder, "incremental") + "/"
+		raw_folder = os.path.join(full_root, "TEST", "AAAAA", "phone", "raw")
+		os.makedirs(raw_folder)
+		os.makedirs(os.path.join(incremental_root, "TEST", "AAAAA", "phone"))
+		os.symlink(raw_folder, os.path.join(incremental_root, "TEST", "AAAAA", "phone", "raw"))
+		full_map = os.path.join(full_root, "TEST", "AAAAA", "phone", "processed", "audio", "TEST_AAAAA_phone_audio_ETFileMap.csv")
+		incremental_map = os.path.join(incremental_root, "TEST", "AAAAA", "phone", "processed", "audio", "TEST_AAAAA_phone_audio_ETFileMap.csv")
+		os.makedirs(os.path.dirname(full_map))
+		os.makedirs(os.path.dirname(incremental_map))
+
+		def run_both(quiet=True):
+			start_time = time.time()
+			create_eastern_time_filemap("TEST", "AAAAA", incremental=False, root=full_root)
+			full_time = time.time() - start_time
+			start_time = time.time()
+			create_eastern_time_filemap("TEST", "AAAAA", incremental=True, root=incremental_root)
+			incremental_time = time.time() - start_time
+			with open(full_map) as f_full, open(incremental_map) as f_incremental:
+				match = f_full.read() == f_incremental.read()
+			return match, full_time, incremental_time
+
+		# the simulated uploads include no badly named files, so the builds have nothing to print each week
+		num_recordings = 0
+		for week in range(num_weeks):
+			num_recordings = num_recordings + len(add_raw_week(raw_folder, week, rng))
+			match, full_time, incremental_time = run_both()
+			all_match = all_match and match
+			full_seconds.append(full_time)
+			incremental_seconds.append(incremental_time)
+		print(str(num_weeks) + " weekly runs (" + str(num_recordings) + " recordings, " + str(pd.read_csv(full_map).shape[0]) + " study days): ETFileMap " + ("match" if all_match else "MISMATCH"))
+		for label, first, last in [("first 10 weeks", 0, 10), ("last 10 weeks", num_weeks - 10, num_weeks)]:
+			full_mean = np.mean(full_seconds[first:last])
+			incremental_mean = np.mean(incremental_seconds[first:last])
+			print(label + ": full rebuild " + str(round(full_mean * 1000, 2)) + " ms per run, incremental " + str(round(incremental_mean * 1000, 2)) + " ms per run (" + str(round(full_mean / incremental_mean, 1)) + "x)")
+
+		match, full_time, incremental_time = run_both()
+		print("run with no new recordings: " + ("match" if match else "MISMATCH") + ", incremental " + str(round(incremental_time * 1000, 2)) + " ms")
+		all_match = all_match and match
+
+		# a late arriving recording from early in the history changes recording numbers, and a removed one can change which recording a day maps to
+		late_path = os.path.join(raw_folder, "phone0", "audio_recordings", "2019-01-01 20_00_00.mp4.lock")
+		open(late_path, "w").close()
+		match, full_time, incremental_time = run_both()
+		print("recording added before the last one mapped: " + ("match" if match else "MISMATCH"))
+		all_match = all_match and match
+		os.remove(late_path)
+		match, full_time, incremental_time = run_both()
+		print("recording removed: " + ("match" if match else "MISMATCH"))
+		all_match = all_match and match
+	os.chdir(start_folder)
+	print("Incremental ETFileMap regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks the vectorized ETFileMap day assignment against the original per-file loop over a multi-year synthetic history, and compares their run times
+# the original loop applies the Eastern Time offset for the UTC hour as though it were local time (and a fixed 4 hour offset when that hour doesn't exist or is ambiguous locally), while the vectorized version converts
+# the actual UTC time - so they can only differ for recordings submitted within a few hours of a daylight savings change, and any other difference fails the check
+# every mapped recording is also checked against a plain per-recording timezone conversion, for US/Eastern and for a couple of other timezones (including a half hour offset)
+# no WAV input is needed for this one - optional first argument is the number of years of history to simulate (default 5)
+def check_filemap_timezone(args=[]):
+	num_years = float(args[0]) if len(args) > 0 else 5
+	rng = np.random.default_rng(0)
+	paths = synthetic_raw_history(num_years, rng)
+	print(str(len(paths)) + " recordings over " + str(num_years) + " years")
+	files = [x.split("/")[-1] for x in paths]
+	sorted_paths = [paths[i] for i in sorted(range(len(paths)), key=lambda k: files[k])]
+	all_match = True
+
+	legacy_seconds = []
+	vectorized_seconds = []
+	for r in range(3):
+		start_time = time.time()
+		legacy_csv = legacy_eastern_time_filemap(paths)
+		legacy_seconds.append(time.time() - start_time)
+		start_time = time.time()
+		vectorized_csv = filemap_table(first_per_day(parse_recordings(sorted_paths, 1, "US/Eastern")))
+		vectorized_seconds.append(time.time() - start_time)
+
+	# recordings where the original offset isn't the real one
+	offset_differs = set()
+	for path in sorted_paths:
+		name = path.split("/")[-1].split(".")[0]
+		try:
+			utc_time = datetime.strptime(name[:19], "%Y-%m-%d %H_%M_%S")
+		except:
+			continue
+		try:
+			legacy_offset = -4 if legacy_is_dst(utc_time) else -5
+		except:
+			legacy_offset = -4
+		real_offset = pytz.utc.localize(utc_time).astimezone(pytz.timezone("US/Eastern")).utcoffset().total_seconds() / 3600
+		if legacy_offset != real_offset:
+			offset_differs.add(path)
+	legacy_rows = legacy_csv.astype(object).fillna("").astype(str).set_index("iso_date")
+	vectorized_rows = vectorized_csv.astype(object).fillna("").astype(str).set_index("iso_date")
+	differing_days = [d for d in legacy_rows.index.union(vectorized_rows.index) if d not in legacy_rows.index or d not in vectorized_rows.index or not legacy_rows.loc[d].equals(vectorized_rows.loc[d])]
+	# a differing day must involve one of those recordings, either as the recording mapped to it by one version, or as the recording just before it (which can decide whether a same-day recording is skipped)
+	explained = set()
+	for d in differing_days:
+		for rows in [legacy_rows, vectorized_rows]:
+			if d in rows.index and rows.loc[d, "original_filepath"] != "":
+				position = sorted_paths.index(rows.loc[d, "original_filepath"])
+				if len(offset_differs.intersection(sorted_paths[max(0, position - 1):position + 1])) > 0:
+					explained.add(d)
+	unexplained = [d for d in differing_days if d not in explained]
+	# recording numbers further on are unaffected, so nothing beyond the affected days may differ
+	print("US/Eastern: " + str(legacy_csv.shape[0]) + " days from the original loop, " + str(vectorized_csv.shape[0]) + " from the vectorized version, " + str(len(differing_days)) + " days differ (" + str(len(offset_differs)) + " recordings within a daylight savings change), " + str(len(unexplained)) + " not explained by daylight savings")
+	all_match = all_match and len(unexplained) == 0 and legacy_csv.columns.equals(vectorized_csv.columns)
+	print("original loop " + str(round(np.median(legacy_seconds) * 1000, 2)) + " ms, vectorized " + str(round(np.median(vectorized_seconds) * 1000, 2)) + " ms (" + str(round(np.median(legacy_seconds) / np.median(vectorized_seconds), 1)) + "x)")
+
+	for timezone in ["US/Eastern", "US/Pacific", "Asia/Kolkata"]:
+		day_rows = first_per_day(parse_recordings(sorted_paths, 1, timezone))
+		converted_match = True
+		for iso_date, time_str, path in zip(day_rows["iso_date"], day_rows["ET_time_formatted_string"], day_rows["original_filepath"]):
+			name = path.split("/")[-1].split(".")[0]
+			local_time = pytz.utc.localize(datetime.strptime(name[:19], "%Y-%m-%d %H_%M_%S")).astimezone(pytz.timezone(timezone))
+			study_day = (local_time - timedelta(hours=4)).date()
+			expected = str(local_time.hour + (24 if local_time.hour < 4 else 0)) + "_" + local_time.strftime("%M_%S") + name[19:]
+			converted_match = converted_match and iso_date == study_day.isoformat() and time_str == expected
+		converted_match = converted_match and day_rows["iso_date"].is_monotonic_increasing and day_rows["iso_date"].is_unique
+		print(timezone + ": " + str(day_rows.shape[0]) + " days with a recording, per-recording conversion " + ("match" if converted_match else "MISMATCH"))
+		all_match = all_match and converted_match
+	print("Vectorized ETFileMap timezone check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks that the study-wide QC index gives the same diary lengths as the original per-file CSV lookups, for a synthetic study where every patient has a batch of diaries to look up, and compares the time for each
+# no WAV input is needed for this one - optional arguments are the number of patients (default 50), days of history per patient (default 1000), and diaries looked up per patient (default 14)
+def check_qc_index(args=[]):
+	num_patients = int(args[0]) if len(args) > 0 else 50
+	num_days = int(args[1]) if len(args) > 1 else 1000
+	num_lookups = int(args[2]) if len(args) > 2 else 14
+	rng = np.random.default_rng(0)
+	start_folder = os.getcwd()
+	with tempfile.TemporaryDirectory() as temp_folder:
+		root = temp_folder + "/"
+		lookups = synthetic_qc_study(root, num_patients, num_days, num_lookups, rng)
+
+		start_time = time.time()
+		legacy_minutes = [legacy_qc_minutes(root, "TEST", OLID, day_num=day_num, filename=filename) for OLID, day_num, filename in lookups]
+		legacy_seconds = time.time() - start_time
+		os.chdir(start_folder)
+
+		start_time = time.time()
+		index_minutes = []
+		for OLID, day_num, filename in lookups:
+			if day_num is not None:
+				index_minutes.append(float(qc_row_by_day("TEST", OLID, day_num, root=root)["length(minutes)"]))
+			else:
+				index_minutes.append(float(qc_row_by_filename("TEST", OLID, filename, source="raw", root=root)["length(minutes)"]))
+		index_seconds = time.time() - start_time
+
+		# a missing day comes back as None, and a patient without a table raises an IOError
+		missing_match = qc_row_by_day("TEST", "P0000", num_days + 1, root=root) is None
+		try:
+			qc_row_by_day("TEST", "NOTAPATIENT", 1, root=root)
+			missing_match = False
+		except IOError:
+			pass
+	all_match = legacy_minutes == index_minutes and missing_match
+	print(str(num_patients) + " patients, " + str(len(lookups)) + " lookups: minutes " + ("match" if legacy_minutes == index_minutes else "MISMATCH") + ", missing entries " + ("match" if missing_match else "MISMATCH"))
+	print("per-file CSV lookups " + str(round(legacy_seconds, 3)) + " seconds, study QC index " + str(round(index_seconds, 3)) + " seconds (" + str(round(legacy_seconds / index_seconds, 1)) + "x)")
+	print("Study QC index regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks the study-wide single session push against the original connection per file push, using a local SFTP server standing in for TranscribeMe
+# the server adds a delay to each login so the handshake costs roughly what it does against the real server - then also checks that a dropped connection is reopened without losing files, and that a wrong password fails straight away leaving the files in to_send
+# no WAV input is needed for this one - optional arguments are the number of patients (default 6), files per patient (default 5), MB per file (default 2), and login delay in seconds (default 0.3)
+def check_sftp_push(args=[]):
+	num_patients = int(args[0]) if len(args) > 0 else 6
+	files_per_patient = int(args[1]) if len(args) > 1 else 5
+	file_mb = float(args[2]) if len(args) > 2 else 2
+	login_delay_sec = float(args[3]) if len(args) > 3 else 0.3
+	rng = np.random.default_rng(0)
+	start_folder = os.getcwd()
+	results = {}
+	with tempfile.TemporaryDirectory() as temp_folder:
+		for run in ["legacy", "session", "dropped", "wrong_password"]:
+			root = os.path.join(temp_folder, run, "PROTECTED")
+			server_folder = os.path.join(temp_folder, run, "server")
+			os.makedirs(os.path.join(server_folder, "audio"))
+			contents = synthetic_to_send(root, num_patients, files_per_patient, file_mb, rng)
+			server = start_local_sftp_server(server_folder, "partners_itp", "pw", drop_after=(files_per_patient + 1 if run == "dropped" else None), login_delay_sec=login_delay_sec)
+			start_time = time.time()
+			if run == "legacy":
+				for p in range(num_patients):
+					legacy_transcript_push(root, "TEST", "P" + str(p).zfill(4), "pw", server["port"], pipeline=True)
+			else:
+				study_transcript_push("TEST", "wrong" if run == "wrong_password" else "pw", pipeline=True, num_channels=1, host="127.0.0.1", port=server["port"], root=root)
+			results[run] = (time.time() - start_time, server["connections"])
+			os.chdir(start_folder)
+			stop_local_sftp_server(server)
+			if run == "wrong_password":
+				left = sum([len(os.listdir(os.path.join(root, "TEST", OLID, "phone", "processed", "audio", "to_send"))) for OLID in set([k[0] for k in contents])])
+				results[run] = results[run] + (left == len(contents) and server["connections"] == 1,)
+			else:
+				results[run] = results[run] + (pushed_correctly(root, server_folder, contents, True),)
+	num_files = num_patients * files_per_patient
+	for run in ["legacy", "session", "dropped"]:
+		print(run + " push of " + str(num_files) + " files: " + str(round(results[run][0], 2)) + " seconds over " + str(results[run][1]) + " connection(s), files " + ("correct" if results[run][2] else "WRONG"))
+	print("wrong password: " + str(round(results["wrong_password"][0], 2)) + " seconds, files " + ("left in to_send" if results["wrong_password"][2] else "WRONG"))
+	print("single session push " + str(round(results["legacy"][0] / results["session"][0], 1)) + "x faster than a connection per file")
+	all_match = results["legacy"][2] and results["session"][2] and results["dropped"][2] and results["dropped"][1] > 1 and results["wrong_password"][2]
+	print("SFTP push regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+# checks the concurrent SFTP transfers of the push and pull against running them one at a time, for a weekly backlog across a synthetic study, using a local SFTP server standing in for TranscribeMe
+# the server adds a delay to each login and each request, so a single connection's rate is limited roughly as it is against a remote server - then also checks the bandwidth cap holds, and that files survive connections being dropped partway through
+# no WAV input is needed for this one - optional arguments are the number of patients (default 8), files per patient (default 10), MB per file (default 0.5), seconds of delay per request (default 0.005), and number of channels (default 4)
+def check_sftp_transfers(args=[]):
+	num_patients = int(args[0]) if len(args) > 0 else 8
+	files_per_patient = int(args[1]) if len(args) > 1 else 10
+	file_mb = float(args[2]) if len(args) > 2 else 0.5
+	request_delay_sec = float(args[3]) if len(args) > 3 else 0.005
+	num_channels = int(args[4]) if len(args) > 4 else 4
+	bandwidth_mb = 2.0
+	rng = np.random.default_rng(0)
+	results = {}
+	with tempfile.TemporaryDirectory() as temp_folder:
+		for run in ["sequential", "concurrent", "capped", "dropped"]:
+			root = os.path.join(temp_folder, run, "PROTECTED")
+			server_folder = os.path.join(temp_folder, run, "server")
+			os.makedirs(os.path.join(server_folder, "audio"))
+			contents = synthetic_to_send(root, num_patients if run != "capped" else 2, files_per_patient, file_mb, rng)
+			server = start_local_sftp_server(server_folder, "partners_itp", "pw", drop_after=(7 if run == "dropped" else None), login_delay_sec=0.3, request_delay_sec=request_delay_sec)
+			channels = 1 if run == "sequential" else num_channels
+			start_time = time.time()
+			study_transcript_push("TEST", "pw", num_channels=channels, bandwidth_mb=(bandwidth_mb if run == "capped" else None), host="127.0.0.1", port=server["port"], root=root)
+			push_seconds = time.time() - start_time
+			push_match = pushed_correctly(root, server_folder, contents, False)
+			pull_seconds = 0
+			pull_match = True
+			if run in ["sequential", "concurrent"]:
+				transcripts = synthetic_transcripts(server_folder, contents, rng)
+				start_time = time.time()
+				study_transcript_pull("TEST", "pw", num_channels=channels, host="127.0.0.1", port=server["port"], root=root)
+				pull_seconds = time.time() - start_time
+				pull_match = pulled_correctly(root, server_folder, contents, transcripts)
+			stop_local_sftp_server(server)
+			results[run] = {"push_seconds": push_seconds, "pull_seconds": pull_seconds, "match": push_match and pull_match, "connections": server["connections"], "mb": len(contents) * file_mb}
+	for run in ["sequential", "concurrent"]:
+		print(run + ": push of " + str(num_patients * files_per_patient) + " files " + str(round(results[run]["push_seconds"], 2)) + " seconds, pull of " + str(num_patients * files_per_patient // 2) + " transcripts " + str(round(results[run]["pull_seconds"], 2)) + " seconds, files " + ("correct" if results[run]["match"] else "WRONG"))
+	capped_rate = results["capped"]["mb"] / results["capped"]["push_seconds"]
+	cap_match = capped_rate <= bandwidth_mb * 1.05
+	print("capped push: " + str(round(capped_rate, 2)) + " MB/s against a cap of " + str(bandwidth_mb) + " (" + ("within" if cap_match else "OVER") + "), files " + ("correct" if results["capped"]["match"] else "WRONG"))
+	print("push with dropped connections: " + str(results["dropped"]["connections"]) + " connections made, files " + ("correct" if results["dropped"]["match"] else "WRONG"))
+	print("concurrent push " + str(round(results["sequential"]["push_seconds"] / results["concurrent"]["push_seconds"], 1)) + "x and pull " + str(round(results["sequential"]["pull_seconds"] / results["concurrent"]["pull_seconds"], 1)) + "x faster than one at a time, with " + str(num_channels) + " channels")
+	all_match = all([results[run]["match"] for run in results]) and cap_match and results["dropped"]["connections"] > num_channels
+	print("SFTP transfers regression check " + ("passed" if all_match else "FAILED"))
+	return all_match
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	checks = {"pause_detect": check_pause_detect, "fused_vad": check_fused_vad, "nn_filter": check_nn_filter, "pause_assembly": check_pause_assembly, "os_filter": check_os_filter, "lld_format": check_lld_format, "feature_store": check_feature_store, "pause_store": check_pause_store, "spectrograms": check_spectrograms, "vad_backends": check_vad_backends, "chunked_vad": check_chunked_vad, "float32": check_float32, "filemap": check_filemap, "filemap_timezone": check_filemap_timezone, "qc_index": check_qc_index, "sftp_push": check_sftp_push, "sftp_transfers": check_sftp_transfers}
+	if len(sys.argv) < 2 or sys.argv[1] not in checks:
+		print("Specify one of the available checks: " + ", ".join(checks.keys()))
+		sys.exit(1)
+	passed = checks[sys.argv[1]](sys.argv[2:])
+	if passed is False:
+		sys.exit(1)
@@ -0,0 +1,99 @@
+# set of functions for sharing decoded diary audio across the processing stages that run in one python process
+# each WAV is decoded once (as float32) and held in an in-memory buffer, so audio QC, VAD, and pause-derived QC don't each read and decode the same file again
+# the buffer has a memory budget, and the least recently used audio is dropped when adding a new file would go over it - a dropped file is simply decoded again if needed
+
+# prevent librosa from logging a warning every time it is imported
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import time
+import collections
+import numpy as np
+import soundfile as sf
+import librosa
+
+# default memory budget for decoded audio, in MB - a week of diaries for a patient is typically well under this
+DEFAULT_BUDGET_MB = 2048
+
+# numeric precision the stages compute in - float64 gives the original outputs, float32 halves the memory of the audio arrays, spectrograms, and masks along the way
+# (decoding is always to float32, which holds 16 and 24 bit PCM samples exactly, so this only changes the arithmetic done on them)
+numeric_settings = {"dtype": np.float64}
+
+def set_audio_dtype(dtype_name):
+	numeric_settings["dtype"] = np.dtype(dtype_name).type
+
+def audio_dtype():
+	return numeric_settings["dtype"]
+
+# buffer state is kept at module level, as it is meant to be shared by whichever stage functions get called in the process
+audio_buffer = collections.OrderedDict() # absolute path -> (data, sample rate)
+buffer_settings = {"budget_bytes": DEFAULT_BUDGET_MB * 1024 * 1024, "used_bytes": 0}
+# per-stage stats - number of buffer hits, number of decodes, and seconds spent decoding
+stage_stats = collections.OrderedDict()
+
+def set_buffer_budget(budget_mb):
+	buffer_settings["budget_bytes"] = int(float(budget_mb) * 1024 * 1024)
+	evict_to_fit(0)
+
+def evict_to_fit(new_bytes):
+	while len(audio_buffer) > 0 and buffer_settings["used_bytes"] + new_bytes > buffer_settings["budget_bytes"]:
+		old_path, (old_data, old_sr) = audio_buffer.popitem(last=False)
+		buffer_settings["used_bytes"] = buffer_settings["used_bytes"] - old_data.nbytes
+
+def record_stat(stage, key, value):
+	if stage not in stage_stats:
+		stage_stats[stage] = {"hits": 0, "decodes": 0, "decode_seconds": 0.0}
+	stage_stats[stage][key] = stage_stats[stage][key] + value
+
+# returns (data, sample rate) for the input WAV at its own sample rate, in the same layout sf.read gives (1D for mono, samples x channels otherwise) but as float32
+# the returned array is shared with other stages, so it is marked read-only - copy it first if it needs to be modified
+# stage is just a label for the timing stats
+def load_audio(filename, stage="other"):
+	path = os.path.abspath(filename)
+	if path in audio_buffer:
+		audio_buffer.move_to_end(path)
+		record_stat(stage, "hits", 1)
+		return audio_buffer[path]
+
+	start_time = time.time()
+	data, sr = sf.read(path, dtype="float32")
+	record_stat(stage, "decode_seconds", time.time() - start_time)
+	record_stat(stage, "decodes", 1)
+	data.setflags(write=False)
+
+	# anything bigger than the whole budget is handed back without being kept
+	if data.nbytes <= buffer_settings["budget_bytes"]:
+		evict_to_fit(data.nbytes)
+		audio_buffer[path] = (data, sr)
+		buffer_settings["used_bytes"] = buffer_settings["used_bytes"] + data.nbytes
+	return (data, sr)
+
+# same as librosa.load(filename, sr=target_sr) - mixed down to mono and resampled - but working from the buffered decode
+# the resampled version is not kept in the buffer, as only VAD uses it
+def load_audio_resampled(filename, target_sr=22050, stage="other"):
+	data, sr = load_audio(filename, stage=stage)
+	if data.ndim > 1:
+		y = librosa.to_mono(data.T)
+	else:
+		y = data
+	if sr != target_sr:
+		y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+	return (y, target_sr)
+
+# drops a file from the buffer once no later stage will need it
+def release_audio(filename):
+	path = os.path.abspath(filename)
+	if path in audio_buffer:
+		old_data, old_sr = audio_buffer.pop(path)
+		buffer_settings["used_bytes"] = buffer_settings["used_bytes"] - old_data.nbytes
+
+# prints the per-stage buffer stats, including an estimate of the decode time saved by buffer hits
+def report_buffer_stats():
+	total_decodes = sum([stage_stats[s]["decodes"] for s in stage_stats])
+	total_seconds = sum([stage_stats[s]["decode_seconds"] for s in stage_stats])
+	mean_decode = (total_seconds / total_decodes) if total_decodes > 0 else 0.0
+	for stage in stage_stats:
+		cur = stage_stats[stage]
+		print(stage + " audio loading: " + str(cur["decodes"]) + " files decoded in " + str(round(cur["decode_seconds"], 3)) + " seconds, " + str(cur["hits"]) + " served from buffer (about " + str(round(cur["hits"] * mean_decode, 3)) + " seconds of decoding saved)")
+	print("Audio buffer currently holding " + str(len(audio_buffer)) + " files, " + str(round(buffer_settings["used_bytes"] / 1e6, 2)) + " MB of " + str(round(buffer_settings["budget_bytes"] / 1e6, 2)) + " MB budget")
@@ -0,0 +1,250 @@
+# set of functions for a per-patient columnar feature store, used in place of reading, concatenating, dropping duplicates from, and rewriting the whole incremental output CSV on every run
+# each table is a folder of partitions - .npz archives with one array per column - plus a small manifest, and saving new diaries only writes the new rows as a new partition
+# newer partitions are merged together once they add up to the size of the one before (like a binary counter), so there are only ever about log2(rows) of them and each row is rewritten only a handful of times
+# rows are keyed (e.g. on OLID and filename), and a row saved with a key that is already in the table replaces the old one
+# the CSV the table stands in for is kept up to date as an export view, as DPDash and later steps of the pipeline read the CSVs - new rows are appended to it, and it is only rewritten in full when existing rows change
+# tables that are always read one diary at a time (pause times) can instead be partitioned on a column, with one .npz per value (e.g. per diary filename) - saving a diary's rows then replaces all of its old rows,
+# and reading one diary's rows only touches that diary's file
+# the store for a CSV is kept in a feature_store folder next to it, in a subfolder named after the CSV, so the CSV outputs themselves stay exactly where and how they were
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# saves a DataFrame as an .npz archive with one array per column, written under a temporary name and renamed once complete
+# text columns are stored as fixed width strings (plus a mask of any missing values), so loading never needs pickle
+def save_columns(df, path):
+	arrays = {"columns": np.array([str(c) for c in df.columns])}
+	for i, col in enumerate(df.columns):
+		values = df[col]
+		if pd.api.types.is_numeric_dtype(values):
+			arrays["column" + str(i)] = values.to_numpy()
+			continue
+		missing = values.isna().to_numpy()
+		arrays["column" + str(i)] = np.array(values.astype(str).tolist(), dtype=str)
+		if missing.any():
+			arrays["missing" + str(i)] = missing
+	np.savez_compressed(path + ".tmp.npz", **arrays)
+	os.rename(path + ".tmp.npz", path)
+
+# loads an archive saved by save_columns as a DataFrame - if columns is given only those columns are read from disk
+def load_columns(path, columns=None):
+	data = {}
+	with np.load(path, allow_pickle=False) as archive:
+		names = archive["columns"].tolist()
+		wanted = names if columns is None else [c for c in names if c in columns]
+		for col in wanted:
+			i = names.index(col)
+			values = archive["column" + str(i)]
+			if values.dtype.kind == "U":
+				values = values.astype(object)
+				if ("missing" + str(i)) in archive.files:
+					values[archive["missing" + str(i)]] = np.nan
+			data[col] = values
+	return pd.DataFrame(data, columns=wanted)
+
+# folder holding the store for the input CSV path
+def store_folder(csv_path):
+	csv_path = os.path.abspath(csv_path)
+	return os.path.join(os.path.dirname(csv_path), "feature_store", os.path.splitext(os.path.basename(csv_path))[0])
+
+def load_manifest(folder):
+	with open(os.path.join(folder, "manifest.json")) as f:
+		return json.load(f)
+
+def save_manifest(folder, manifest):
+	manifest_path = os.path.join(folder, "manifest.json")
+	with open(manifest_path + ".tmp", "w") as f:
+		json.dump(manifest, f)
+	os.rename(manifest_path + ".tmp", manifest_path)
+
+# writes rows as the next partition of a table, adding it to the manifest (which the caller still needs to save)
+def write_partition(folder, manifest, rows):
+	partition_name = "part" + str(manifest["next_partition"]).zfill(6) + ".npz"
+	save_columns(rows, os.path.join(folder, partition_name))
+	manifest["partitions"].append({"name": partition_name, "rows": int(rows.shape[0])})
+	manifest["next_partition"] = manifest["next_partition"] + 1
+
+# combines partitions of a table in order, dropping any rows replaced by a later partition
+def combine_partitions(folder, manifest, partitions, columns=None):
+	if len(partitions) == 0:
+		return pd.DataFrame(columns=manifest["columns"] if columns is None else columns)
+	combined = pd.concat([load_columns(os.path.join(folder, p["name"]), columns=columns) for p in partitions], ignore_index=True)
+	if len(partitions) > 1:
+		combined.drop_duplicates(subset=manifest["key"], keep="last", inplace=True)
+		combined.reset_index(drop=True, inplace=True)
+	return combined
+
+# set of the key tuples stored in a partition - reads just the key arrays, without building a DataFrame
+def partition_keys(path, key_cols):
+	with np.load(path, allow_pickle=False) as archive:
+		names = archive["columns"].tolist()
+		return set(zip(*[archive["column" + str(names.index(k))].tolist() for k in key_cols]))
+
+# file holding the rows for one value of a partitioned table
+def value_partition_path(folder, value):
+	return os.path.join(folder, str(value) + ".npz")
+
+# whether there is anything saved yet for the input CSV path, in the CSV or the store
+def table_exists(csv_path):
+	return os.path.isfile(csv_path) or os.path.isfile(os.path.join(store_folder(csv_path), "manifest.json"))
+
+# loads the full table stored for the input CSV path, with any replaced rows dropped - rows are in the order they were first saved, except that a replaced row moves to where its replacement was saved
+# if columns is given only those (plus the key columns) are read
+# falls back on the CSV itself if there is no store for it yet, raising an error if neither exists just as pd.read_csv would
+def load_table(csv_path, columns=None):
+	folder = store_folder(csv_path)
+	if not os.path.isfile(os.path.join(folder, "manifest.json")):
+		table = pd.read_csv(csv_path)
+		return table if columns is None else table[[c for c in table.columns if c in columns]]
+	manifest = load_manifest(folder)
+	if "partition_col" in manifest:
+		if len(manifest["partitions"]) == 0:
+			table = pd.DataFrame(columns=manifest["columns"])
+		else:
+			table = pd.concat([load_columns(value_partition_path(folder, v), columns=columns) for v in manifest["partitions"]], ignore_index=True)
+		return table if columns is None else table[[c for c in table.columns if c in columns]]
+	read_columns = None if columns is None else list(columns) + [k for k in manifest["key"] if k not in columns]
+	table = combine_partitions(folder, manifest, manifest["partitions"], columns=read_columns)
+	if columns is not None:
+		table = table[[c for c in table.columns if c in columns]]
+	return table
+
+# saves new rows to the store for the input CSV path, replacing any stored rows with the same values in key_cols, and brings the CSV export up to date
+# the first time a table is saved to, any rows already in the CSV (from before the store existed) become its first partition
+# if the CSV is deleted or edited by hand it is written out again in full from the store - to start a table over, delete its feature_store subfolder along with the CSV
+def upsert_rows(csv_path, new_rows, key_cols):
+	csv_path = os.path.abspath(csv_path)
+	folder = store_folder(csv_path)
+	if os.path.isfile(os.path.join(folder, "manifest.json")):
+		manifest = load_manifest(folder)
+	else:
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		manifest = {"key": list(key_cols), "columns": new_rows.columns.tolist(), "partitions": [], "next_partition": 0, "csv_bytes": None}
+		if os.path.isfile(csv_path):
+			old_rows = pd.read_csv(csv_path)
+			old_rows.drop_duplicates(subset=key_cols, inplace=True)
+			write_partition(folder, manifest, old_rows)
+			manifest["columns"] = old_rows.columns.tolist()
+			manifest["csv_bytes"] = os.path.getsize(csv_path)
+
+	new_rows = new_rows.drop_duplicates(subset=key_cols, keep="last")
+	if new_rows.shape[0] == 0:
+		if not os.path.isfile(csv_path): # still want the CSV to exist, same as before the store
+			new_rows.to_csv(csv_path, index=False)
+			manifest["csv_bytes"] = os.path.getsize(csv_path)
+		save_manifest(folder, manifest)
+		return
+
+	# only the key columns of the existing partitions need to be read to know whether any rows are being replaced
+	new_keys = set(zip(*[new_rows[k].tolist() for k in key_cols]))
+	replacing = False
+	for partition in manifest["partitions"]:
+		if len(new_keys & partition_keys(os.path.join(folder, partition["name"]), key_cols)) > 0:
+			replacing = True
+			break
+
+	# the CSV can just be appended to if it is exactly as the store last left it and nothing in it is changing
+	csv_current = os.path.isfile(csv_path) and manifest["csv_bytes"] == os.path.getsize(csv_path) and manifest["columns"] == new_rows.columns.tolist()
+	write_partition(folder, manifest, new_rows)
+	manifest["csv_bytes"] = None # marks the CSV as out of date until it has been updated, in case this gets interrupted
+	save_manifest(folder, manifest)
+	if csv_current and not replacing:
+		new_rows.to_csv(csv_path, mode="a", header=False, index=False)
+	else:
+		table = load_table(csv_path)
+		table.to_csv(csv_path + ".tmp", index=False)
+		os.rename(csv_path + ".tmp", csv_path)
+		manifest["columns"] = table.columns.tolist()
+	manifest["csv_bytes"] = os.path.getsize(csv_path)
+
+	# merge the newest partitions together while they add up to at least the size of the one before them
+	merge_from = len(manifest["partitions"]) - 1
+	merge_rows = manifest["partitions"][-1]["rows"]
+	while merge_from > 0 and merge_rows >= manifest["partitions"][merge_from - 1]["rows"]:
+		merge_from = merge_from - 1
+		merge_rows = merge_rows + manifest["partitions"][merge_from]["rows"]
+	old_partitions = []
+	if merge_from < len(manifest["partitions"]) - 1:
+		old_partitions = manifest["partitions"][merge_from:]
+		merged = combine_partitions(folder, manifest, old_partitions)
+		manifest["partitions"] = manifest["partitions"][:merge_from]
+		write_partition(folder, manifest, merged)
+	save_manifest(folder, manifest)
+	for partition in old_partitions:
+		os.remove(os.path.join(folder, partition["name"]))
+
+# loads just the rows with the input value in partition_col (e.g. one diary's pause times) from the store for the input CSV path, partitioned on that column by upsert_partitions
+# only that value's file is read, so the cost doesn't grow with the rest of the table - an empty DataFrame is returned if there are no rows for the value
+# if the table hasn't been saved in the partitioned layout yet the whole table is read and filtered instead, raising an error if there is nothing saved at all just as pd.read_csv would
+def load_partition(csv_path, partition_col, value):
+	folder = store_folder(csv_path)
+	if os.path.isfile(value_partition_path(folder, value)):
+		return load_columns(value_partition_path(folder, value))
+	if os.path.isfile(os.path.join(folder, "manifest.json")):
+		manifest = load_manifest(folder)
+		if manifest.get("partition_col") == partition_col:
+			return pd.DataFrame(columns=manifest["columns"])
+	table = load_table(csv_path)
+	return table[table[partition_col] == value]
+
+# saves new rows to the store for the input CSV path partitioned on partition_col - all rows for each value in the new rows replace any previously saved for that value
+# new values only add files, and are appended to the CSV export, which is only rewritten in full when a value's rows are replaced (or the CSV has been changed outside of the store)
+# the first time a table is saved in this layout, any rows already saved (in the CSV, or in the store as saved by upsert_rows) are split up into the partitions
+def upsert_partitions(csv_path, new_rows, partition_col):
+	csv_path = os.path.abspath(csv_path)
+	folder = store_folder(csv_path)
+	manifest = None
+	if os.path.isfile(os.path.join(folder, "manifest.json")):
+		manifest = load_manifest(folder)
+	if manifest is None or manifest.get("partition_col") != partition_col:
+		old_rows = None
+		old_files = []
+		csv_bytes = None
+		if manifest is not None:
+			old_rows = load_table(csv_path)
+			old_files = [p["name"] for p in manifest["partitions"]]
+			csv_bytes = manifest["csv_bytes"]
+		elif os.path.isfile(csv_path):
+			old_rows = pd.read_csv(csv_path)
+			csv_bytes = os.path.getsize(csv_path)
+		if not os.path.isdir(folder):
+			os.makedirs(folder)
+		manifest = {"partition_col": partition_col, "columns": new_rows.columns.tolist() if old_rows is None else old_rows.columns.tolist(), "partitions": [], "csv_bytes": csv_bytes}
+		if old_rows is not None:
+			for value, rows in old_rows.groupby(partition_col, sort=False):
+				save_columns(rows, value_partition_path(folder, value))
+				manifest["partitions"].append(str(value))
+		save_manifest(folder, manifest)
+		for name in old_files:
+			os.remove(os.path.join(folder, name))
+
+	if new_rows.shape[0] == 0:
+		if not os.path.isfile(csv_path): # still want the CSV to exist, same as before the store
+			new_rows.to_csv(csv_path, index=False)
+			manifest["csv_bytes"] = os.path.getsize(csv_path)
+			save_manifest(folder, manifest)
+		return
+
+	stored_values = set(manifest["partitions"])
+	new_values = [str(v) for v in pd.unique(new_rows[partition_col])]
+	replacing = any(v in stored_values for v in new_values)
+	csv_current = os.path.isfile(csv_path) and manifest["csv_bytes"] == os.path.getsize(csv_path) and manifest["columns"] == new_rows.columns.tolist()
+	manifest["csv_bytes"] = None # marks the CSV as out of date until it has been updated, in case this gets interrupted
+	save_manifest(folder, manifest)
+	for value, rows in new_rows.groupby(partition_col, sort=False):
+		save_columns(rows, value_partition_path(folder, value))
+	manifest["partitions"].extend([v for v in new_values if v not in stored_values])
+	save_manifest(folder, manifest)
+
+	if csv_current and not replacing:
+		new_rows.to_csv(csv_path, mode="a", header=False, index=False)
+	else:
+		table = load_table(csv_path)
+		table.to_csv(csv_path + ".tmp", index=False)
+		os.rename(csv_path + ".tmp", csv_path)
+		manifest["columns"] = table.columns.tolist()
+	manifest["csv_bytes"] = os.path.getsize(csv_path)
+	save_manifest(folder, manifest)
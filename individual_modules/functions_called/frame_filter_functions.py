@@ -0,0 +1,29 @@
+# set of functions for applying time intervals (e.g. pauses) to frame-level feature tables, like the 10 ms OpenSMILE low level descriptors
+# frames are matched to intervals with a sorted search instead of checking every frame against every interval, so the cost is O((frames + intervals) log intervals)
+
+import numpy as np
+
+# returns a boolean array marking each frame that falls entirely within at least one of the intervals - i.e. frame start >= interval start and frame stop <= interval stop
+# frames and intervals are given as arrays of start and stop times (in the same units), and neither needs to be sorted or non-overlapping
+# NaN frame times never match, in line with comparisons against NaN being False
+def frames_in_intervals(frame_starts, frame_stops, interval_starts, interval_stops):
+	frame_starts = np.asarray(frame_starts, dtype=float)
+	frame_stops = np.asarray(frame_stops, dtype=float)
+	if len(interval_starts) == 0:
+		return np.zeros(frame_starts.shape, dtype=bool)
+
+	# sort intervals by start, so for any frame the intervals starting at or before it are a prefix - the frame is then inside one of them if the furthest stop in that prefix reaches the frame stop
+	order = np.argsort(np.asarray(interval_starts, dtype=float), kind="stable")
+	sorted_starts = np.asarray(interval_starts, dtype=float)[order]
+	furthest_stops = np.maximum.accumulate(np.asarray(interval_stops, dtype=float)[order])
+	last_started = np.searchsorted(sorted_starts, frame_starts, side="right") - 1
+	inside = np.zeros(frame_starts.shape, dtype=bool)
+	has_started = last_started >= 0
+	inside[has_started] = furthest_stops[last_started[has_started]] >= frame_stops[has_started]
+	return inside
+
+# returns a boolean array marking the rows of a frame-level feature df that fall entirely within one of the pauses
+# pause start and stop times are in seconds, frame start times are taken from time_col, and each frame is frame_length seconds long (0.01 for OpenSMILE LLDs)
+def pause_frame_mask(features_df, pause_start_times, pause_stop_times, time_col="frameTime", frame_length=0.01):
+	frame_starts = features_df[time_col].to_numpy(dtype=float)
+	return frames_in_intervals(frame_starts, frame_starts + frame_length, pause_start_times, pause_stop_times)
@@ -0,0 +1,66 @@
+# set of functions for producing, saving, and loading the OpenSMILE low level descriptor (LLD) outputs
+# LLDs can come from the OpenSMILE command line tool (semicolon separated CSV), or be computed in process from already loaded audio using the opensmile python package
+# in process outputs are saved in a compact binary columnar format (a numpy .npz archive with one array per column, as used by the feature store), with the CSV optionally still written for compatibility
+# every consumer should go through load_lld, which reads whichever of the two is available and returns the same DataFrame either way
+
+import os
+import numpy as np
+import pandas as pd
+
+from feature_store_functions import save_columns, load_columns
+
+# the opensmile python package is only needed for the in process engine, so it is optional
+try:
+	import opensmile
+except ImportError:
+	opensmile = None
+
+# GeMAPS low level descriptors, in the order the command line tool writes them
+LLD_FEATURES = ["Loudness_sma3", "alphaRatio_sma3", "hammarbergIndex_sma3", "slope0-500_sma3", "slope500-1500_sma3", "F0semitoneFrom27.5Hz_sma3nz", "jitterLocal_sma3nz",
+				"shimmerLocaldB_sma3nz", "HNRdBACF_sma3nz", "logRelF0-H1-H2_sma3nz", "logRelF0-H1-A3_sma3nz", "F1frequency_sma3nz", "F1bandwidth_sma3nz",
+				"F1amplitudeLogRelF0_sma3nz", "F2frequency_sma3nz", "F2amplitudeLogRelF0_sma3nz", "F3frequency_sma3nz", "F3amplitudeLogRelF0_sma3nz"]
+
+# sets up the in process OpenSMILE engine for the GeMAPSv01a LLDs - the same feature set as the config the command line tool is run with
+# raises an ImportError if the opensmile python package is not installed
+def lld_engine():
+	if opensmile is None:
+		raise ImportError("the opensmile python package is needed for in process OpenSMILE (pip install opensmile)")
+	return opensmile.Smile(feature_set=opensmile.FeatureSet.GeMAPSv01a, feature_level=opensmile.FeatureLevel.LowLevelDescriptors)
+
+# computes the LLDs for the input audio (samples, or samples x channels as from sf.read) at sample rate sr, using an engine from lld_engine
+# returns a DataFrame laid out the same way as the command line tool's CSV - name, frameTime (10 ms frame start in seconds), then the features
+def extract_lld(engine, data, sr):
+	if data.ndim > 1:
+		data = np.mean(data, axis=1) # mix down to mono, like the command line wave input does
+	result = engine.process_signal(np.asarray(data, dtype=np.float32), sr)
+	lld = pd.DataFrame()
+	lld["frameTime"] = np.round(result.index.get_level_values("start").total_seconds().to_numpy(), 6)
+	for feature in LLD_FEATURES:
+		lld[feature] = result[feature].to_numpy(dtype=np.float64)
+	lld.insert(0, "name", "'unknown'")
+	return lld
+
+# paths for a diary's LLD outputs, given the output path without extension (e.g. opensmile_feature_extraction/<diary name>)
+def lld_paths(out_root):
+	return (out_root + ".npz", out_root + ".csv")
+
+def lld_exists(out_root):
+	npz_path, csv_path = lld_paths(out_root)
+	return os.path.isfile(npz_path) or os.path.isfile(csv_path)
+
+# saves an LLD DataFrame in the binary columnar format, and also as the command line tool style CSV if save_csv is True
+# each file is written under a temporary name and renamed once complete, so an interrupted run can't leave a partial output behind
+def save_lld(lld, out_root, save_csv=True):
+	npz_path, csv_path = lld_paths(out_root)
+	save_columns(lld, npz_path)
+	if save_csv:
+		lld.to_csv(csv_path + ".tmp", sep=";", index=False)
+		os.rename(csv_path + ".tmp", csv_path)
+
+# loads a diary's LLDs as a DataFrame, preferring the binary version and falling back to the CSV (e.g. for diaries processed by the command line tool)
+# raises an error if neither exists or the file can't be read, same as pd.read_csv would
+def load_lld(out_root):
+	npz_path, csv_path = lld_paths(out_root)
+	if not os.path.isfile(npz_path):
+		return pd.read_csv(csv_path, sep=';')
+	return load_columns(npz_path)
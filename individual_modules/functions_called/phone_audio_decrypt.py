@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+# decrypts all new raw audio diaries for a study inside a single python process, using the cryptease library directly
+# this replaces the old approach of calling the crypt_exp expect helper once per file, which spawned a fresh crypt.py interpreter (and redid the passphrase key derivation) for every single diary
+# new is now defined by the study's processing ledger - any diary that hasn't completed all the required processing stages yet
+
+import os
+import sys
+import glob
+import time
+import tempfile
+import subprocess
+import multiprocessing
+import pandas as pd
+import cryptease as crypt
+
+from phone_audio_ledger import register_raw_files, processed_diaries, tracked_diaries, mark_stage, find_duplicate_raw_files, REQUIRED_STAGES
+from opensmile_functions import lld_exists
+from worker_pool_functions import available_cores
+
+# sample rate that the VAD code loads audio at (librosa default), used when decoding straight to WAV in streaming mode
+# writing the WAV at this rate (and mono) means later stages don't need to resample
+DOWNSTREAM_SR = 22050
+
+# gets the set of decrypted names (date+time) that the ETFileMap assigns to a study day, i.e. the first recording submitted in each day
+# any other recording will later be rejected as a secondary submission by the audio selection step, so there is no need to process it at all
+# returns None if the ETFileMap isn't available, so the caller can fall back to processing everything
+def load_primary_recordings(study, OLID):
+	filemap_path = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID, "phone/processed/audio", study + "_" + OLID + "_phone_audio_ETFileMap.csv")
+	try:
+		filemap = pd.read_csv(filemap_path)
+	except:
+		return None
+	# days with no recording have an empty filename, drop those
+	return set(filemap["new_filename"].dropna().astype(str).tolist())
+
+# gets list of (raw encrypted path, decrypted output path) pairs that need to be decrypted for the input patient
+# output path is the intermediate mp4, for streaming mode the extension is swapped to wav when the job is set up
+# mirrors the file selection logic the bash module used to do: check both audio_recordings folder depths, and skip anything already decrypted for this batch
+# anything the ledger has as fully processed is also skipped - diaries processed before the ledger existed are recognized by their OpenSMILE output and backfilled into it
+# if primary_only is True, also skips any recording that isn't the first of its study day according to the ETFileMap
+def find_new_raw_audio(study, OLID, primary_only=False):
+	patient_root = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID)
+	decrypted_folder = os.path.join(patient_root, "phone/processed/audio/decrypted_files")
+	opensmile_folder = os.path.join(patient_root, "phone/processed/audio/opensmile_feature_extraction")
+
+	primary_names = None
+	if primary_only:
+		primary_names = load_primary_recordings(study, OLID)
+		if primary_names is None:
+			print("No ETFileMap available for " + OLID + ", so decrypting secondary same-day recordings as well")
+	num_secondary = 0
+
+	# some raw files are directly in audio_recordings subfolder, some are under an additional subfolder - sort each so the order matches the bash glob order used previously
+	raw_files = sorted(glob.glob(os.path.join(patient_root, "phone/raw/*/audio_recordings/*.mp4.lock")))
+	raw_files.extend(sorted(glob.glob(os.path.join(patient_root, "phone/raw/*/audio_recordings/*/*.mp4.lock"))))
+
+	# get metadata info from the Beiwe name, which is "<date> <time>.mp4.lock"
+	raw_entries = []
+	for raw_path in raw_files:
+		name = os.path.basename(raw_path).split(".")[0]
+		try:
+			date_str = name.split(" ")[0]
+			time_str = name.split(" ")[1]
+		except:
+			print("Name formatted incorrectly for: " + raw_path + ", skipping")
+			continue
+		raw_entries.append((raw_path, date_str + "+" + time_str))
+
+	# check for byte-identical copies of the same raw file before doing any decryption work, and report them rather than processing them twice
+	duplicates = find_duplicate_raw_files(study, [r[0] for r in raw_entries])
+	if len(duplicates) > 0:
+		save_duplicate_report(study, OLID, duplicates)
+		raw_entries = [r for r in raw_entries if r[0] not in duplicates]
+
+	# update the ledger with the current raw files, then look up what is already done
+	register_raw_files(study, OLID, raw_entries)
+	processed = processed_diaries(study, OLID)
+	tracked = tracked_diaries(study, OLID)
+	legacy = []
+
+	jobs = []
+	assigned_names = {}
+	for raw_path, out_name in raw_entries:
+		# don't redecrypt if already decrypted for this batch (in case resuming code after some disruption for example)
+		# exact copies were already removed above, so reaching this means two different files got the same name
+		if out_name in assigned_names:
+			print("Different raw files " + assigned_names[out_name] + " and " + raw_path + " have the same name, only the first will be used")
+			continue
+		if os.path.exists(os.path.join(decrypted_folder, out_name + ".mp4")) or os.path.exists(os.path.join(decrypted_folder, out_name + ".wav")):
+			continue
+
+		# decrypt only if new
+		if out_name in processed:
+			continue
+		if out_name not in tracked and lld_exists(os.path.join(opensmile_folder, out_name)):
+			legacy.append(out_name)
+			continue
+
+		# and only if it will actually be used, when in primary only mode
+		if primary_names is not None and out_name not in primary_names:
+			num_secondary = num_secondary + 1
+			continue
+
+		assigned_names[out_name] = raw_path
+		jobs.append((raw_path, os.path.join(decrypted_folder, out_name + ".mp4")))
+
+	if len(legacy) > 0:
+		for stage in REQUIRED_STAGES:
+			mark_stage(study, OLID, [(name, "done") for name in legacy], stage)
+		print("Recorded " + str(len(legacy)) + " previously processed diaries in the processing ledger")
+	if num_secondary > 0:
+		print("Skipped " + str(num_secondary) + " secondary same-day recordings (not the first diary submitted in their study day)")
+
+	return jobs
+
+# logs the byte-identical raw files found for a patient, and saves them to a CSV in the patient's processed audio folder (replaced each run, as the ledger caches the hashes)
+def save_duplicate_report(study, OLID, duplicates):
+	patient_root = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID)
+	dup_paths = sorted(duplicates.keys())
+	print("Found " + str(len(dup_paths)) + " raw files for " + OLID + " that are exact copies of another raw file, these will not be decrypted:")
+	for dup_path in dup_paths:
+		print(dup_path.split(patient_root + "/")[-1] + " (copy of " + duplicates[dup_path].split(patient_root + "/")[-1] + ")")
+	report = pd.DataFrame()
+	report["duplicate_raw_path"] = dup_paths
+	report["original_raw_path"] = [duplicates[d] for d in dup_paths]
+	report.to_csv(os.path.join(patient_root, "phone/processed/audio", study + "_" + OLID + "_phone_audio_rawDuplicates.csv"), index=False)
+
+# reads the salt out of the cryptease header for an encrypted file
+# Lochness encrypts an entire study using one key, so in practice every file shares a salt and the expensive PBKDF2 derivation only needs to happen once per run
+def read_salt(raw_path):
+	with open(raw_path, "rb") as f:
+		header, _ = crypt.read_header(f)
+	return header["kdf"]["params"]["salt"]
+
+# worker function for the decryption pool - input is a (raw path, output path, key) tuple, key being the already derived cryptease Key
+# returns output path, number of decrypted bytes, seconds spent, and an error message (empty string if decryption worked)
+def decrypt_job(job):
+	raw_path, out_path, key = job
+	start_time = time.time()
+	try:
+		with open(raw_path, "rb") as f:
+			# cryptease writes to a temporary file and renames at the end, so an interrupted run won't leave a partial mp4 behind
+			crypt.decrypt(f, key, filename=out_path)
+		num_bytes = os.path.getsize(out_path)
+	except Exception as e:
+		return (out_path, 0, time.time() - start_time, str(e))
+	return (out_path, num_bytes, time.time() - start_time, "")
+
+# runs ffmpeg to convert input (a path, or pipe:0 when decrypted bytes are provided) to a mono WAV at the downstream sample rate
+# output is written under a temporary (non .wav) name and only renamed to the final WAV path once ffmpeg finishes successfully, so an interrupted run can't leave a truncated WAV for later steps to pick up
+def ffmpeg_to_wav(input_arg, out_path, input_bytes=None):
+	tmp_path = out_path + ".tmp"
+	cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", input_arg, "-ac", "1", "-ar", str(DOWNSTREAM_SR), "-f", "wav", tmp_path]
+	result = subprocess.run(cmd, input=input_bytes, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+	if result.returncode != 0:
+		try:
+			os.remove(tmp_path)
+		except:
+			pass
+		return result.stderr.decode(errors="ignore").strip()
+	os.rename(tmp_path, out_path)
+	return ""
+
+# streaming version of the worker function - decrypted bytes are kept in memory and piped directly into ffmpeg, so only the final WAV is written to disk
+# same input and output conventions as decrypt_job, except output path is the WAV
+def decrypt_stream_job(job):
+	raw_path, out_path, key = job
+	start_time = time.time()
+	try:
+		with open(raw_path, "rb") as f:
+			decrypted = b"".join(crypt.decrypt(f, key))
+	except Exception as e:
+		return (out_path, 0, time.time() - start_time, str(e))
+
+	error = ffmpeg_to_wav("pipe:0", out_path, input_bytes=decrypted)
+	if error != "":
+		# Beiwe mp4s often have their index (moov atom) at the end of the file, which ffmpeg can't read from a non-seekable pipe
+		# in that case fall back to a temporary file on local scratch space (in memory where available), so the mp4 still never touches PHOENIX
+		scratch_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+		try:
+			with tempfile.NamedTemporaryFile(dir=scratch_dir, suffix=".mp4") as tmp:
+				tmp.write(decrypted)
+				tmp.flush()
+				error = ffmpeg_to_wav(tmp.name, out_path)
+		except Exception as e:
+			error = str(e)
+	if error != "":
+		return (out_path, 0, time.time() - start_time, error)
+	return (out_path, len(decrypted), time.time() - start_time, "")
+
+# decrypts all new audio for every patient in the input study, using a pool of worker processes sized to the available cores unless num_workers is given
+# if stream is True, decrypted bytes are piped directly into ffmpeg and only the final WAV is written, instead of writing the mp4 for the bash module to convert afterwards
+# if primary_only is True, only the first recording of each study day (per the ETFileMap) is decrypted, as that is the only one the pipeline will use
+def decrypt_new_audio(study, password, stream=False, primary_only=False, num_workers=None):
+	try:
+		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study)
+	except:
+		print("Problem with study argument " + study + ", exiting")
+		return
+
+	# gather the jobs across the entire study first, so the pool can stay busy across patient boundaries
+	all_jobs = []
+	patients = sorted(os.listdir("."))
+	for OLID in patients:
+		# check that it is truly an OLID, that has phone data
+		if not os.path.isdir(os.path.join(OLID, "phone")):
+			continue
+		print("On participant " + OLID)
+		# create temporary folder for the decrypted files
+		try:
+			os.mkdir(os.path.join(OLID, "phone/processed/audio/decrypted_files"))
+		except:
+			pass
+		patient_jobs = find_new_raw_audio(study, OLID, primary_only=primary_only)
+		if len(patient_jobs) == 0:
+			print("No new audio diary submissions for this participant")
+		all_jobs.extend(patient_jobs)
+
+	if len(all_jobs) == 0:
+		return
+
+	# derive keys once per unique salt up front, instead of once per file
+	keys = {}
+	pool_jobs = []
+	for raw_path, out_path in all_jobs:
+		try:
+			salt = read_salt(raw_path)
+			if salt not in keys:
+				with open(raw_path, "rb") as f:
+					keys[salt] = crypt.key_from_file(f, password)
+		except:
+			print("Could not read encryption header for " + raw_path + ", skipping")
+			continue
+		if stream:
+			out_path = out_path[:-len(".mp4")] + ".wav"
+		pool_jobs.append((raw_path, out_path, keys[salt]))
+
+	if num_workers is None:
+		num_workers = available_cores()
+	num_workers = max(1, min(int(num_workers), len(pool_jobs)))
+	print("Decrypting " + str(len(pool_jobs)) + " files using " + str(num_workers) + " worker processes")
+	if stream:
+		print("(streaming directly to " + str(DOWNSTREAM_SR) + " Hz mono WAV)")
+		job_function = decrypt_stream_job
+	else:
+		job_function = decrypt_job
+
+	total_bytes = 0
+	ledger_updates = {}
+	wall_start = time.time()
+	with multiprocessing.Pool(processes=num_workers) as pool:
+		for out_path, num_bytes, seconds, error in pool.imap_unordered(job_function, pool_jobs):
+			# report the path relative to the study folder, so the patient is clear in the logs
+			display_path = out_path.split("/PROTECTED/" + study + "/")[-1]
+			OLID = display_path.split("/")[0]
+			if OLID not in ledger_updates:
+				ledger_updates[OLID] = []
+			if error != "":
+				# (note a wrong passphrase will not be caught here, cryptease will just produce unusable output - that shows up as broken audio in later steps)
+				print("Decryption failed for " + display_path + " (" + error + ")")
+				ledger_updates[OLID].append((os.path.basename(out_path), "failed"))
+				continue
+			ledger_updates[OLID].append((os.path.basename(out_path), "done"))
+			rate = (num_bytes / seconds) if seconds > 0 else 0.0
+			print("Decrypted " + display_path + " - " + str(round(num_bytes / 1e6, 2)) + " MB in " + str(round(seconds, 3)) + " seconds (" + str(round(rate / 1e6, 2)) + " MB/s)")
+			total_bytes = total_bytes + num_bytes
+	wall_seconds = time.time() - wall_start
+	for OLID in ledger_updates:
+		mark_stage(study, OLID, ledger_updates[OLID], "decrypt")
+	overall_rate = (total_bytes / wall_seconds) if wall_seconds > 0 else 0.0
+	print("Decrypted " + str(round(total_bytes / 1e6, 2)) + " MB total in " + str(round(wall_seconds, 2)) + " seconds (" + str(round(overall_rate / 1e6, 2)) + " MB/s overall)")
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# the passphrase is read from the password environment variable set by the wrapping bash script, rather than passed on the command line where it would be visible in the process list
+	try:
+		stream_inp = (sys.argv[2] == "Y")
+	except:
+		stream_inp = False
+	try:
+		primary_inp = (sys.argv[3] == "Y")
+	except:
+		primary_inp = False
+	try:
+		workers_inp = sys.argv[4]
+	except:
+		workers_inp = None
+	decrypt_new_audio(sys.argv[1], os.environ.get("password", ""), stream=stream_inp, primary_only=primary_inp, num_workers=workers_inp)
@@ -6,6 +6,8 @@ import glob
 import pandas as pd
 import numpy as np
 
+from qc_index_functions import qc_row_by_day, qc_row_by_filename
+
 def get_email_summary_stats(study, lab_email_path, transcribeme_email_path):
 	# get paths of interest for all patients in this study
 	os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study)
@@ -45,25 +47,18 @@ def get_email_summary_stats(study, lab_email_path, transcribeme_email_path):
 	num_short = len([x for x in decrypted_paths_list if x[0] == "1"])
 	num_quiet = len([x for x in decrypted_paths_list if x[0] == "2"])
 
-	# loop through all NEW pending (i.e. successfully pushed this run) audio paths, load DPDash audio QC CSV for each patient to count up the total length in minutes
+	# loop through all NEW pending (i.e. successfully pushed this run) audio paths, look up each in the DPDash audio QC CSV for its patient to count up the total length in minutes
 	num_minutes = 0.0
 	for filep in pending_paths_list:
 		# find dpdash path from file path
 		filen = filep.split("/")[-1]
 		OLID = filen.split("_")[1]
-		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio")
-		dpdash_name_format = study + "-" + OLID + "-phoneAudioQC-day1to*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		# get day number from file name, to assist in lookup of df
+		# get day number from file name, to look it up in the patient's DPDash CSV (only loaded the first time, see qc_index_functions.py)
 		day_num = int(filen.split("day")[1].split(".")[0])
 		# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-		cur_row = dpdash_qc[dpdash_qc["day"]==day_num] 
+		cur_row = qc_row_by_day(study, OLID, day_num)
 		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length(minutes)"].tolist()[0])
+		cur_count = float(cur_row["length(minutes)"])
 
 		# update total count across the entire study
 		num_minutes = num_minutes + cur_count
@@ -74,19 +69,12 @@ def get_email_summary_stats(study, lab_email_path, transcribeme_email_path):
 		# find dpdash path from file path
 		filen = filep.split("/")[-1]
 		OLID = filen.split("_")[1]
-		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio")
-		dpdash_name_format = study + "-" + OLID + "-phoneAudioQC-day1to*.csv"
-		dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-		dpdash_qc = pd.read_csv(dpdash_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		# get day number from file name, to assist in lookup of df
+		# get day number from file name, to look it up in the patient's DPDash CSV (only loaded the first time, see qc_index_functions.py)
 		day_num = int(filen.split("day")[1].split(".")[0])
 		# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-		cur_row = dpdash_qc[dpdash_qc["day"]==day_num] 
+		cur_row = qc_row_by_day(study, OLID, day_num)
 		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length(minutes)"].tolist()[0])
+		cur_count = float(cur_row["length(minutes)"])
 
 		# update total count across the entire study
 		num_minutes_unsent = num_minutes_unsent + cur_count
@@ -98,15 +86,10 @@ def get_email_summary_stats(study, lab_email_path, transcribeme_email_path):
 		# find dpdash path from file path
 		filen = filep.split("/")[-1]
 		OLID = decrypted_pt_match_list[index_counter]
-		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio")
-		audio_qc_raw_name = study + "_" + OLID + "_phone_audioQC_output.csv"
-		audio_qc_df = pd.read_csv(audio_qc_raw_name) 
-		# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-		# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
-
-		cur_row = audio_qc_df[audio_qc_df["filename"]==filep.split("err")[-1]] # remove error code from filename and then match in audio QC spreadsheets 
+		# the patient's audio QC output is only loaded the first time, see qc_index_functions.py
+		cur_row = qc_row_by_filename(study, OLID, filep.split("err")[-1], source="raw") # remove error code from filename and then match in audio QC spreadsheets 
 		# then get total time of that particular recording (in minutes)
-		cur_count = float(cur_row["length(minutes)"].tolist()[0])
+		cur_count = float(cur_row["length(minutes)"])
 
 		# update total count across the entire study
 		num_minutes_bad = num_minutes_bad + cur_count
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import sqlite3
+import hashlib
+import datetime
+
+# study-wide record of which processing stages have completed for each audio diary
+# diaries are identified by patient plus the decrypted name (date+time, same as the OpenSMILE output name), and linked back to the raw encrypted file(s) along with their size and mtime
+# if a raw file changes on disk its stage history is cleared, so the diary will be processed again from the start
+# this replaces checking the filesystem for OpenSMILE outputs (or foreground audio, filtered OpenSMILE, etc.) to work out what still needs doing,
+# and means a diary that hit a problem partway through will be picked up again on the next run at the stage that didn't finish
+
+# all stages tracked, in pipeline order
+LEDGER_STAGES = ["decrypt", "prescreen", "qc", "opensmile", "vad", "pause_qc", "selection"]
+# stages that need to be complete for a diary to be considered fully processed (i.e. not decrypted again on the next run)
+REQUIRED_STAGES = ["qc", "opensmile", "vad", "pause_qc"]
+# a stage that has failed this many times is given up on, so a truly broken diary doesn't get decrypted again every week
+MAX_ATTEMPTS = 3
+
+def ledger_path(study):
+	return "/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + study + "_phone_audio_processing_ledger.db"
+
+# opens the ledger for the study, creating the tables the first time
+def connect_ledger(study):
+	conn = sqlite3.connect(ledger_path(study), timeout=60)
+	conn.execute("CREATE TABLE IF NOT EXISTS raw_files (raw_path TEXT PRIMARY KEY, OLID TEXT, diary TEXT, size INTEGER, mtime REAL)")
+	conn.execute("CREATE INDEX IF NOT EXISTS raw_files_diary ON raw_files (OLID, diary)")
+	conn.execute("CREATE TABLE IF NOT EXISTS stages (OLID TEXT, diary TEXT, stage TEXT, status TEXT, attempts INTEGER, updated TEXT, PRIMARY KEY (OLID, diary, stage))")
+	conn.execute("CREATE TABLE IF NOT EXISTS raw_hashes (raw_path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT)")
+	conn.commit()
+	return conn
+
+# diary names are stored without extension, but the stage functions generally work with the WAV filename
+def diary_name(filename):
+	return filename.split(".")[0]
+
+# records the raw file(s) for a patient's diaries, input is a list of (raw path, diary name) pairs
+# any raw file whose size or mtime differs from what was previously recorded has the stage history for its diary cleared
+def register_raw_files(study, OLID, raw_entries):
+	conn = connect_ledger(study)
+	known = {}
+	for raw_path, size, mtime in conn.execute("SELECT raw_path, size, mtime FROM raw_files WHERE OLID = ?", (OLID,)):
+		known[raw_path] = (size, mtime)
+	num_changed = 0
+	for raw_path, diary in raw_entries:
+		try:
+			stat = os.stat(raw_path)
+		except:
+			continue
+		if raw_path in known:
+			if known[raw_path] == (stat.st_size, stat.st_mtime):
+				continue
+			conn.execute("DELETE FROM stages WHERE OLID = ? AND diary = ?", (OLID, diary))
+			num_changed = num_changed + 1
+		conn.execute("INSERT OR REPLACE INTO raw_files VALUES (?, ?, ?, ?, ?)", (raw_path, OLID, diary, stat.st_size, stat.st_mtime))
+	conn.commit()
+	conn.close()
+	if num_changed > 0:
+		print(str(num_changed) + " raw files for " + OLID + " changed since they were last processed, these will be processed again")
+
+# records the outcome of a stage, input is a list of (diary name or WAV filename, status) pairs
+# status should be one of done, skipped (stage deliberately not run, e.g. pre-screen reject), or failed
+def mark_stage(study, OLID, updates, stage):
+	if len(updates) == 0:
+		return
+	now = datetime.datetime.now().isoformat(timespec="seconds")
+	conn = connect_ledger(study)
+	for filename, status in updates:
+		diary = diary_name(filename)
+		row = conn.execute("SELECT attempts FROM stages WHERE OLID = ? AND diary = ? AND stage = ?", (OLID, diary, stage)).fetchone()
+		attempts = 0 if row is None else row[0]
+		if status == "failed":
+			attempts = attempts + 1
+			if attempts == MAX_ATTEMPTS:
+				print(stage + " stage has now failed " + str(MAX_ATTEMPTS) + " times for " + OLID + " diary " + diary + ", will not be retried")
+		conn.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)", (OLID, diary, stage, status, attempts, now))
+	conn.commit()
+	conn.close()
+
+# returns the set of diary names for the patient that don't need the input stage run again - done, skipped, or failed too many times
+def completed_diaries(study, OLID, stage):
+	if not os.path.isfile(ledger_path(study)):
+		return set()
+	conn = connect_ledger(study)
+	rows = conn.execute("SELECT diary FROM stages WHERE OLID = ? AND stage = ? AND (status != 'failed' OR attempts >= ?)", (OLID, stage, MAX_ATTEMPTS)).fetchall()
+	conn.close()
+	return set([r[0] for r in rows])
+
+# returns the set of diary names for the patient that are finished - every required stage is complete, or some stage has run out of retries
+def processed_diaries(study, OLID):
+	if not os.path.isfile(ledger_path(study)):
+		return set()
+	conn = connect_ledger(study)
+	counts = {}
+	given_up = set()
+	for diary, stage, status, attempts in conn.execute("SELECT diary, stage, status, attempts FROM stages WHERE OLID = ?", (OLID,)):
+		if status == "failed" and attempts >= MAX_ATTEMPTS:
+			given_up.add(diary)
+		elif status != "failed" and stage in REQUIRED_STAGES:
+			counts[diary] = counts.get(diary, 0) + 1
+	conn.close()
+	finished = set([d for d in counts if counts[d] == len(REQUIRED_STAGES)])
+	return finished.union(given_up)
+
+# returns the set of diary names for the patient that have any stage history at all
+def tracked_diaries(study, OLID):
+	if not os.path.isfile(ledger_path(study)):
+		return set()
+	conn = connect_ledger(study)
+	rows = conn.execute("SELECT DISTINCT diary FROM stages WHERE OLID = ?", (OLID,)).fetchall()
+	conn.close()
+	return set([r[0] for r in rows])
+
+# clears the stage history for one diary, so that it is processed from scratch on the next run
+# stages can be given as a list to clear just those, leaving the rest of the history alone
+def reset_diary(study, OLID, diary, stages=None):
+	conn = connect_ledger(study)
+	if stages is None:
+		conn.execute("DELETE FROM stages WHERE OLID = ? AND diary = ?", (OLID, diary_name(diary)))
+	else:
+		for stage in stages:
+			conn.execute("DELETE FROM stages WHERE OLID = ? AND diary = ? AND stage = ?", (OLID, diary_name(diary), stage))
+	conn.commit()
+	conn.close()
+
+def sha256_file(path, chunk_size=1048576):
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		chunk = f.read(chunk_size)
+		while chunk:
+			digest.update(chunk)
+			chunk = f.read(chunk_size)
+	return digest.hexdigest()
+
+# finds raw files that are byte-identical copies of another raw file in the input list (e.g. the same diary under both audio_recordings folder depths, or under two prompt/device folders)
+# returns a dict of duplicate raw path -> raw path it duplicates, where the earliest file in the input order is the one kept
+# only files that share their exact size with another file can be identical, so only those are hashed - hashes are cached in the ledger by path, size and mtime, so each file is read at most once unless it changes
+def find_duplicate_raw_files(study, raw_paths):
+	sizes = {}
+	stats = {}
+	for raw_path in raw_paths:
+		try:
+			stat = os.stat(raw_path)
+		except:
+			continue
+		stats[raw_path] = stat
+		if stat.st_size not in sizes:
+			sizes[stat.st_size] = []
+		sizes[stat.st_size].append(raw_path)
+	candidates = []
+	for size in sizes:
+		if len(sizes[size]) > 1:
+			candidates.extend(sizes[size])
+	if len(candidates) == 0:
+		return {}
+
+	conn = connect_ledger(study)
+	hashes = {}
+	for raw_path in candidates:
+		stat = stats[raw_path]
+		row = conn.execute("SELECT size, mtime, sha256 FROM raw_hashes WHERE raw_path = ?", (raw_path,)).fetchone()
+		if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime:
+			hashes[raw_path] = row[2]
+			continue
+		try:
+			hashes[raw_path] = sha256_file(raw_path)
+		except:
+			print("Could not read " + raw_path + " to check for duplicates")
+			continue
+		conn.execute("INSERT OR REPLACE INTO raw_hashes VALUES (?, ?, ?, ?)", (raw_path, stat.st_size, stat.st_mtime, hashes[raw_path]))
+	conn.commit()
+	conn.close()
+
+	# go back through in input order so the first copy of each file is the one kept
+	first_seen = {}
+	duplicates = {}
+	for raw_path in raw_paths:
+		if raw_path not in hashes:
+			continue
+		if hashes[raw_path] in first_seen:
+			duplicates[raw_path] = first_seen[hashes[raw_path]]
+		else:
+			first_seen[hashes[raw_path]] = raw_path
+	return duplicates
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# usage: phone_audio_ledger.py study OLID completed stage (prints the WAV names not needing that stage, one per line, for use in bash)
+	#        phone_audio_ledger.py study OLID reset diary_name
+	if sys.argv[3] == "completed":
+		for diary in sorted(completed_diaries(sys.argv[1], sys.argv[2], sys.argv[4])):
+			print(diary + ".wav")
+	elif sys.argv[3] == "reset":
+		reset_diary(sys.argv[1], sys.argv[2], sys.argv[4])
+	else:
+		print("Unknown ledger command " + sys.argv[3])
@@ -6,6 +6,8 @@ import glob
 import pandas as pd
 import numpy as np
 
+from qc_index_functions import qc_row_by_day
+
 def audio_length_check(study, length_limit):
 	try:
 		length_limit = float(length_limit) # convert to a valid number
@@ -25,7 +27,7 @@ def audio_length_check(study, length_limit):
 	for folder in send_folders_list:
 		send_paths_list.extend(os.listdir(folder))
 
-	# loop through all file to send audio paths, load DPDash audio QC CSV for each patient to count up the total length in minutes
+	# loop through all file to send audio paths, look up each in the DPDash audio QC CSV for its patient to count up the total length in minutes
 	num_minutes = 0.0
 	for filep in send_paths_list:
 		# find dpdash path from file path
@@ -39,17 +41,8 @@ def audio_length_check(study, length_limit):
 			continue # skip in case any improperly formatted filenames come around
 
 		try:
-			os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio")
-		except:
-			print("Problem with processed audio folder for " + OLID + ", continuing")
-			continue
-
-		dpdash_name_format = study + "-" + OLID + "-phoneAudioQC-day1to*.csv"
-		try:
-			dpdash_name = glob.glob(dpdash_name_format)[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
-			dpdash_qc = pd.read_csv(dpdash_name) 
-			# technically reloading this CSV for each file instead of for each patient, but should be a fast operation because CSV is small
-			# also shouldn't be repeated that much in a normal run, as there cannot be more new uploads for a single patient than the number of days since the last run of the pipeline
+			# each patient's DPDash CSV is only loaded the first time one of their files is looked up, see qc_index_functions.py
+			dpdash_row = qc_row_by_day(study, OLID, day_num)
 		except:
 			# patient should always have a dpdash CSV if has files in to_send, but to prevent overall crashing skip over patients in case DPDash part does fail
 			print("Problem with DPDash CSV for " + OLID + ", continuing")
@@ -57,9 +50,8 @@ def audio_length_check(study, length_limit):
 	
 		try:
 			# should always be exactly one matching entry, as only allowing one file into DPDash per day (first submitted)
-			cur_row = dpdash_qc[dpdash_qc["day"]==day_num] 
 			# then get total time of that particular recording (in minutes)
-			cur_count = float(cur_row["length(minutes)"].tolist()[0])
+			cur_count = float(dpdash_row["length(minutes)"])
 		except:
 			# again should never reach the error as should always be a day in the DPDash CSV for a day found here, but just to be safe!
 			print(filen + " is missing a record in  the DPDash CSV for " + OLID + ", continuing")
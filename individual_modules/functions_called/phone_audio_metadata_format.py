@@ -2,37 +2,158 @@
 
 import pandas as pd
 import numpy as np
-import math
 import os
 import sys
-from datetime import date, timedelta, datetime
-import pytz
+import json
+import time
 
-# https://stackoverflow.com/questions/2881025/python-daylight-savings-time -> I do assume he is always in eastern time! could eventuall work in gps for travel accounting but not worth it now. I dont think he travels a lot anyway
-def is_dst(dt, timezone="US/Eastern"):
-    timezone = pytz.timezone(timezone)
-    timezone_aware_date = timezone.localize(dt, is_dst=None)
-    return timezone_aware_date.tzinfo._dst.seconds != 0
+# raw recording names follow Beiwe convention - "YYYY-MM-DD hh_mm_ss" in UTC, sometimes followed by a plus sign and a two digit code, and then the file extension
+RECORDING_NAME_PATTERN = r"^(\d+)-(\d+)-(\d+) (\d+)_(\d+)_(\d+)(.*)$"
+# recordings submitted before this hour (local time) count as the previous day! -> hours in the ETFileMap range from 4 to 27 instead of 0 to 23
+DAY_START_HOUR = 4
+# lookups for formatting hours, minutes and seconds, much quicker than formatting each time
+HOUR_STRINGS = np.array([str(h) for h in range(28)], dtype=object)
+TWO_DIGIT_STRINGS = np.array([str(m).zfill(2) for m in range(60)], dtype=object)
 
-def create_eastern_time_filemap(study, OLID):
-	oneday=timedelta(days=1)
-	days = {}
-	cur_day = ""
-	cur_recording_number = 1
+# lists the folder at path, reusing the listing saved by the last run if the folder's modification time hasn't changed since (adding or removing a file changes it)
+# old_folders maps folder path -> [modification time in ns, entries] from the last run, and the listing used is recorded the same way in new_folders
+# raises the same errors as os.listdir if the folder can't be listed
+def cached_listdir(path, old_folders, new_folders):
+	mtime = os.stat(path).st_mtime_ns
+	if path in old_folders and old_folders[path][0] == mtime:
+		entries = old_folders[path][1]
+	else:
+		entries = os.listdir(path)
+	# a file landing within the same instant as the listing might not change the modification time again, so don't trust listings of folders changed in the last couple seconds
+	if time.time() - mtime / 1e9 < 2:
+		mtime = None
+	new_folders[path] = [mtime, entries]
+	return entries
 
+# loads the raw listing saved with the patient's ETFileMap by the last run, if there is one
+# the listing can only be resumed from if the ETFileMap it was saved with is still there, otherwise only its folder listings are kept
+def load_raw_listing(listing_path, map_path):
 	try:
-		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/raw")
+		with open(listing_path) as f:
+			listing = json.load(f)
+		listing["folders"] # make sure it is complete
+	except:
+		return {"folders": {}}
+	if not os.path.isfile(map_path):
+		return {"folders": listing["folders"]}
+	return listing
+
+# checks how the raw recordings found now differ from those in the saved listing, given their file names and their paths relative to the raw folder
+# returns the paths of the new recordings (in the order the full build would process them) if the last run can be picked up from, otherwise None for a full rebuild -
+# which is needed if there is no usable listing, if any previously seen recording is gone, or if a new recording sorts before the last one already mapped (so recording numbers and same-day choices could change)
+# the ETFileMap is also rebuilt in full if it was last built for a different timezone
+def new_raw_recordings(listing, files, files_absolute, OLID, timezone):
+	if "last_file" not in listing:
+		return None
+	if listing.get("timezone") != timezone:
+		print("ETFileMap for OLID " + OLID + " was last built with a different timezone setting, rebuilding it in full")
+		return None
+	old_paths = set(listing["files"])
+	if not old_paths.issubset(set(files_absolute)):
+		print("Raw audio recordings were removed or moved since the last ETFileMap update for OLID " + OLID + ", rebuilding it in full")
+		return None
+	new_indices = [i for i in range(len(files)) if files_absolute[i] not in old_paths]
+	if len([i for i in new_indices if files[i] <= listing["last_file"]]) > 0:
+		print("New raw audio recordings for OLID " + OLID + " date from before the last one already mapped, rebuilding the ETFileMap in full")
+		return None
+	new_indices.sort(key=lambda k: files[k])
+	return [files_absolute[i] for i in new_indices]
+
+# works out the study day and the local submission time of each recording, in the given timezone, for the recording paths (relative to the raw folder) in the order they are to be numbered in
+# recordings are numbered from first_recording_number, counting any that are badly named - these are reported and left out of the returned DataFrame,
+# which has the columns iso_date, ET_time_formatted_string (local hour on the 4 to 27 scale, then the minutes and seconds), original_filepath, new_filename, and recording_number
+def parse_recordings(file_paths, first_recording_number, timezone):
+	recordings = pd.DataFrame({"original_filepath": pd.Series(file_paths, dtype=object)})
+	recordings["recording_number"] = np.arange(first_recording_number, first_recording_number + len(file_paths))
+	files = recordings["original_filepath"].str.split("/").str[-1] # remove the absolute path info for following part
+	names = files.str.split(".").str[0]
+	parts = names.str.extract(RECORDING_NAME_PATTERN)
+	utc_times = pd.to_datetime(pd.DataFrame({"year": parts[0], "month": parts[1], "day": parts[2], "hour": parts[3], "minute": parts[4], "second": parts[5]}).astype(float), errors="coerce", utc=True)
+	for file in files[utc_times.isna()]:
+		print("Name formatted incorrectly for: " + file + ", ignoring") # even for pipeline purposes will want to know if a file is found in raw not matching expected naming conventions
+	good = utc_times.notna()
+	recordings = recordings[good].copy()
+	names = names[good]
+	# convert to local (wall clock) time, then move the start of the day to DAY_START_HOUR - the shifted time's date is then the study day
+	shifted = utc_times[good].dt.tz_convert(timezone).dt.tz_localize(None) - pd.Timedelta(hours=DAY_START_HOUR)
+	recordings["iso_date"] = shifted.values.astype("datetime64[D]").astype(str)
+	recordings["ET_time_formatted_string"] = HOUR_STRINGS[shifted.dt.hour.values + DAY_START_HOUR] + "_" + TWO_DIGIT_STRINGS[shifted.dt.minute.values] + "_" + TWO_DIGIT_STRINGS[shifted.dt.second.values] + parts[6][good].values.astype(str)
+	recordings["new_filename"] = names.str.replace(" ", "+", n=1)
+	return recordings[["iso_date", "ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]]
+
+# keeps only the first recording of each study day - any recording on the same day as the recording before it (starting from prev_day) is skipped
+# duplicate days are not logged here, as that will be clear from other steps of pipeline
+def first_per_day(recordings, prev_day=""):
+	return recordings[recordings["iso_date"] != recordings["iso_date"].shift(1, fill_value=prev_day)]
+
+# builds the ETFileMap table from one row per study day with a recording (as from first_per_day), adding an empty row for each day without a recording
+# rows run from first_day (an iso date string, defaulting to the first day with a recording) through the last day with a recording
+def filemap_table(day_rows, first_day=None):
+	df_columns = ["iso_date", "year_int", "month_int", "day_int", "survey_answer_available", "ET_hour_int_formatted", "ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]
+	if len(day_rows) == 0:
+		return pd.DataFrame(columns=df_columns)
+	day_rows = day_rows.drop_duplicates("iso_date", keep="last")
+	day_rows = day_rows.set_index(pd.DatetimeIndex(pd.to_datetime(day_rows["iso_date"], format="%Y-%m-%d")))
+	all_days = pd.date_range(day_rows.index.min() if first_day is None else pd.Timestamp(first_day), day_rows.index.max(), freq="D")
+	day_rows = day_rows.reindex(all_days)
+
+	map_csv = pd.DataFrame(index=all_days)
+	map_csv["iso_date"] = all_days.values.astype("datetime64[D]").astype(str)
+	map_csv["year_int"] = all_days.year
+	map_csv["month_int"] = all_days.month
+	map_csv["day_int"] = all_days.day
+	map_csv["survey_answer_available"] = day_rows["original_filepath"].notna().astype(int)
+	# the hour and recording number columns are floats once there is a day without a recording (NaN)
+	map_csv["ET_hour_int_formatted"] = pd.to_numeric(day_rows["ET_time_formatted_string"].str.split("_").str[0])
+	for col in ["ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]:
+		map_csv[col] = day_rows[col]
+	return map_csv[df_columns].reset_index(drop=True)
+
+# reads the rows of an existing ETFileMap for days with a recording back in, in the form filemap_table takes them
+def read_filemap_rows(map_path):
+	map_csv = pd.read_csv(map_path, dtype={"iso_date": str, "ET_time_formatted_string": str, "original_filepath": str, "new_filename": str})
+	day_rows = map_csv[map_csv["survey_answer_available"] == 1][["iso_date", "ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]].copy()
+	day_rows["recording_number"] = day_rows["recording_number"].astype(int)
+	return day_rows
+
+# saves the raw listing used for this run, along with where the build left off, the timezone used, and the last day in the ETFileMap (and whether it has any days without a recording), so the next incremental run can resume from it
+def save_raw_listing(listing_path, folders, files, files_absolute, timezone, cur_day, cur_recording_number, last_day, has_gaps):
+	indices_sorted = sorted(range(len(files)), key=lambda k: files[k])
+	listing = {"folders": folders, "files": [files_absolute[i] for i in indices_sorted], "last_file": files[indices_sorted[-1]], "timezone": timezone, "cur_day": cur_day, "next_recording_number": cur_recording_number, "last_day": last_day, "has_gaps": has_gaps}
+	with open(listing_path + ".tmp", "w") as f:
+		json.dump(listing, f)
+	os.replace(listing_path + ".tmp", listing_path)
+
+# maps each study day to its first recording (if any), with the submission time in the given timezone (any name pytz/zoneinfo accept - US/Eastern by default, despite the function and column names)
+# if incremental is True, the raw listing saved by the last run is used to skip listing folders that haven't changed, and to only add recordings that are new since then to the existing ETFileMap
+# (falling back to a full rebuild whenever the earlier history may have changed) - either way the ETFileMap is the same as a full rebuild from scratch gives
+# root can be changed from the PHOENIX protected folder for testing
+def create_eastern_time_filemap(study, OLID, incremental=False, timezone="US/Eastern", root="/data/sbdp/PHOENIX/PROTECTED/"):
+	try:
+		os.chdir(root + study + "/" + OLID + "/phone/raw")
 	except:
 		# either patient has no phone data, or something is wrong with the input - just exit if so
 		print("No raw phone data exists for input OLID " + OLID + ", continuing") # provide info on why function exited, in case called from outside pipeline
 		return
 
-	folders=os.listdir(".")
+	map_path = root + study + "/" + OLID + "/phone/processed/audio/" + study + "_" + OLID + "_phone_audio_ETFileMap.csv"
+	listing_path = root + study + "/" + OLID + "/phone/processed/audio/" + study + "_" + OLID + "_phone_audio_ETFileMap_listing.json"
+	listing = {"folders": {}}
+	if incremental:
+		listing = load_raw_listing(listing_path, map_path)
+	folders_listed = {}
+
+	folders=cached_listdir(".", listing["folders"], folders_listed)
 	files = []
 	files_absolute = []
 	for folder in folders:
 		try: # some phones have no audio recording at all! prevent script from crashing though in case another phone does have some files
-			files_test = os.listdir(os.path.join(folder,"audio_recordings"))
+			files_test = cached_listdir(os.path.join(folder,"audio_recordings"), listing["folders"], folders_listed)
 		except:
 			continue
 		files_true = [x for x in files_test if x.endswith(".lock")]
@@ -42,112 +163,74 @@ def create_eastern_time_filemap(study, OLID):
 		# this does assume that anything not ending in .lock is a folder, but that historically holds true for Beiwe audio, shouldn't be a problem
 		subfolders_true = [x for x in files_test if not x.endswith(".lock")] 
 		for subfolder in subfolders_true:
-			files_sub = os.listdir(os.path.join(folder,"audio_recordings",subfolder))
+			files_sub = cached_listdir(os.path.join(folder,"audio_recordings",subfolder), listing["folders"], folders_listed)
 			files.extend(files_sub)
 			files_sub_absolute = [os.path.join(folder,"audio_recordings",subfolder,x) for x in files_sub]
 			files_absolute.extend(files_sub_absolute) 
 	if len(files) == 0:
 		print("No phone audio data exists for input OLID " + OLID + ", continuing") # provide info on why function exited, in case called from outside pipeline
 		return
-	indices_sorted = sorted(range(len(files)), key=lambda k: files[k])
-	file_paths_final = [files_absolute[i] for i in indices_sorted]
-	
-	for f in range(len(file_paths_final)):
-		file_real = file_paths_final[f]
-		file = file_paths_final[f].split("/")[-1] # remove the absolute path info for following part
-		try:
-			name = file.split(".")[0]
-			date_str = name.split(" ")[0]
-			year = int(date_str.split("-")[0])
-			month = int(date_str.split("-")[1])
-			day = int(date_str.split("-")[2])
-			time = name.split(" ")[1]
-			hour = int(time.split("_")[0])
-			minsec = time.split("_")[1] + "_" + time.split("_")[2]
-			try: 
-				dst_bool = is_dst(datetime(year=year,month=month,day=day,hour=hour))
-				if dst_bool:
-					hour = hour - 4
-				else:
-					hour = hour - 5
-			except:
-				hour = hour - 4
-			hour_date = hour - 4 # if answers prior to 4 am, count it as previous day! -> hours will range from 4 to 27 instead of 0 to 23
-			date_form = date(year,month,day)
-			if hour_date < 0:
-				hour = hour + 24
-				true_date = date_form - oneday
-				date_str = true_date.isoformat()	
-		except:
-			print("Name formatted incorrectly for: " + file + ", ignoring") # even for pipeline purposes will want to know if a file is found in raw not matching expected naming conventions
-			cur_recording_number = cur_recording_number + 1
-			continue
-
-		if cur_day == date_str:
-			# duplicate days also means we need to skip over it - but no need to log that info here, will be clear from other steps of pipeline.
-			cur_recording_number = cur_recording_number + 1
-			continue
 
-		if cur_day != "":
-			year = int(date_str.split("-")[0])
-			month = int(date_str.split("-")[1])
-			day = int(date_str.split("-")[2])
-			date_form = date(year,month,day)
-			prev_year = int(cur_day.split("-")[0])
-			prev_month = int(cur_day.split("-")[1])
-			prev_day = int(cur_day.split("-")[2])
-			prev_date_form = date(prev_year,prev_month,prev_day)
-			if date_form - prev_date_form != oneday:
-				days_gap = int((date_form - prev_date_form).days)
-				for d in range(1,days_gap):
-					missing_day = prev_date_form + timedelta(days=d)
-					missing_day_str = missing_day.isoformat()
-					days[missing_day_str] = 0
-		cur_day = date_str
-		days[cur_day] = (str(hour)+"_"+minsec, file_real, cur_recording_number)
-		cur_recording_number = cur_recording_number + 1
+	new_paths = None
+	if incremental:
+		new_paths = new_raw_recordings(listing, files, files_absolute, OLID, timezone)
+	if new_paths is not None and len(new_paths) == 0:
+		print("No new raw audio recordings for OLID " + OLID + ", ETFileMap is up to date")
+		save_raw_listing(listing_path, folders_listed, files, files_absolute, timezone, listing["cur_day"], listing["next_recording_number"], listing["last_day"], listing["has_gaps"])
+		return
+	if new_paths is None:
+		indices_sorted = sorted(range(len(files)), key=lambda k: files[k])
+		recordings = parse_recordings([files_absolute[i] for i in indices_sorted], 1, timezone)
+		prev_day = ""
+		cur_recording_number = len(files) + 1
+	else:
+		# pick up the build where the last run left off - day_rows then only holds the days the new recordings add or change
+		recordings = parse_recordings(new_paths, listing["next_recording_number"], timezone)
+		prev_day = listing["cur_day"]
+		cur_recording_number = listing["next_recording_number"] + len(new_paths)
+	cur_day = recordings["iso_date"].iloc[-1] if len(recordings) > 0 else prev_day
+	day_rows = first_per_day(recordings, prev_day)
 
-	df_columns = ["iso_date", "year_int", "month_int", "day_int", "survey_answer_available", "ET_hour_int_formatted", "ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]
-	iso_dates = list(days.keys())
-	iso_dates.sort()
-	years = []
-	months = []
-	days_list = []
-	surveys_available = []
-	hours_int_list = []
-	time_str_list = []
-	files_list = []
-	filenames = []
-	recording_numbers = []
-	for d in iso_dates:
-		years.append(int(d.split("-")[0]))
-		months.append(int(d.split("-")[1]))
-		days_list.append(int(d.split("-")[2]))
-		if days[d] == 0:
-			surveys_available.append(0)
-			hours_int_list.append(np.nan)
-			time_str_list.append("")
-			files_list.append("")
-			filenames.append("")
-			recording_numbers.append(np.nan)
+	map_csv = None
+	if new_paths is None:
+		map_csv = filemap_table(day_rows)
+	elif len(day_rows) > 0:
+		append_csv = None
+		if day_rows["iso_date"].min() > listing["last_day"]:
+			# usual case - new recordings only add days after the end of the ETFileMap, so their rows (and those of any days without a recording before them) can just be appended
+			first_day = None if listing["last_day"] == "" else (pd.Timestamp(listing["last_day"]) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+			append_csv = filemap_table(day_rows, first_day=first_day)
+		if append_csv is not None and (listing["has_gaps"] or (append_csv["survey_answer_available"] == 1).all()):
+			# the hour and recording number columns are floats once the ETFileMap has a day without a recording, so the new rows need to match
+			if listing["has_gaps"]:
+				append_csv["ET_hour_int_formatted"] = append_csv["ET_hour_int_formatted"].astype(float)
+				append_csv["recording_number"] = append_csv["recording_number"].astype(float)
+			append_csv.to_csv(map_path, mode="a", header=False, index=False)
+			last_day = append_csv["iso_date"].iloc[-1]
+			has_gaps = listing["has_gaps"]
 		else:
-			surveys_available.append(1)
-			ans_tuple = days[d]
-			hours_int_list.append(int(ans_tuple[0].split("_")[0]))
-			time_str_list.append(ans_tuple[0])
-			files_list.append(ans_tuple[1])
-			file_formatted = ans_tuple[1].split("/")[-1].split(".")[0]
-			filenames.append(file_formatted.split(" ")[0] + "+" + file_formatted.split(" ")[1])
-			recording_numbers.append(ans_tuple[2])
-	df_vals = [iso_dates, years, months, days_list, surveys_available, hours_int_list, time_str_list, files_list, filenames, recording_numbers]
-
-	map_csv = pd.DataFrame()
-	for i in range(len(df_columns)):
-		label = df_columns[i]
-		value = df_vals[i]
-		map_csv[label] = value
-	map_csv.to_csv("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/" + study + "_" + OLID + "_phone_audio_ETFileMap.csv", index=False)
+			# otherwise (including the first day without a recording, which turns the earlier rows' hours and recording numbers to floats) merge the changed days into the existing ones and write it all out again
+			map_csv = filemap_table(pd.concat([read_filemap_rows(map_path), day_rows]))
+	else:
+		# e.g. only same-day repeat recordings were added, which leaves the ETFileMap unchanged
+		last_day = listing["last_day"]
+		has_gaps = listing["has_gaps"]
+	if map_csv is not None:
+		map_csv.to_csv(map_path, index=False)
+		last_day = map_csv["iso_date"].iloc[-1] if len(map_csv) > 0 else ""
+		has_gaps = bool((map_csv["survey_answer_available"] == 0).any())
+	# listing is saved only after the ETFileMap, so an interrupted run is simply redone from the previous listing next time
+	save_raw_listing(listing_path, folders_listed, files, files_absolute, timezone, cur_day, cur_recording_number, last_day, has_gaps)
 
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
-    create_eastern_time_filemap(sys.argv[1], sys.argv[2])
+    # optional third argument of Y builds the ETFileMap incrementally from the last run's raw listing, and optional fourth argument is the timezone (defaults to US/Eastern)
+    try:
+        incremental_inp = sys.argv[3] == "Y"
+    except:
+        incremental_inp = False
+    try:
+        timezone_inp = sys.argv[4]
+    except:
+        timezone_inp = "US/Eastern"
+    create_eastern_time_filemap(sys.argv[1], sys.argv[2], incremental=incremental_inp, timezone=timezone_inp)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+# runs OpenSMILE on all newly decrypted audio diaries for a study, with several SMILExtract processes going at once
+# this replaces looping over patients and files in bash, which ran one SMILExtract at a time (each only using a single core) and sent all of its output to /dev/null
+# each run has a timeout, and the output of any run that fails is kept in a per-patient CSV so problems can actually be looked into
+# alternatively OpenSMILE can be run in process with the opensmile python package (diary_opensmile), working from the shared decoded audio buffer instead of re-reading each WAV,
+# and saving the features in a compact binary format alongside (or instead of) the CSV
+
+import os
+import sys
+import time
+import subprocess
+import multiprocessing.pool
+import pandas as pd
+import soundfile as sf
+
+from phone_audio_ledger import completed_diaries, mark_stage, diary_name
+from worker_pool_functions import available_cores
+from audio_buffer_functions import load_audio
+from opensmile_functions import lld_engine, extract_lld, save_lld
+
+# OpenSMILE config used for feature extraction - GeMAPS low level descriptors
+OPENSMILE_CONFIG = "/data/sbdp/opensmile/opensmile-2.3.0/config/gemaps/GeMAPSv01a.conf"
+
+# gets list of (OLID, WAV path, output CSV path) jobs for every decrypted diary in the study that still needs OpenSMILE run, according to the processing ledger
+# (diaries that failed the pre-screen or already finished in an earlier run are skipped)
+# note that each OpenSMILE CSV output is named using the input WAV filename as is - so it will reflect naming convention used in decrypted_files
+def find_opensmile_jobs(study):
+	jobs = []
+	study_root = "/data/sbdp/PHOENIX/PROTECTED/" + study
+	for OLID in sorted(os.listdir(study_root)):
+		audio_folder = os.path.join(study_root, OLID, "phone/processed/audio")
+		# check that it is truly an OLID, that has decrypted phone audio this round
+		try:
+			cur_files = sorted(os.listdir(os.path.join(audio_folder, "decrypted_files")))
+		except:
+			continue
+		cur_files = [f for f in cur_files if f.endswith(".wav")]
+		if len(cur_files) == 0:
+			continue
+
+		already_done = completed_diaries(study, OLID, "opensmile")
+		new_files = [f for f in cur_files if diary_name(f) not in already_done]
+		print("OpenSMILE on patient " + OLID + " - " + str(len(new_files)) + " new diaries")
+		if len(new_files) == 0:
+			continue
+		if not os.path.isdir(os.path.join(audio_folder, "opensmile_feature_extraction")):
+			os.mkdir(os.path.join(audio_folder, "opensmile_feature_extraction")) # make subfolder in case it doesn't already exist
+		for filename in new_files:
+			jobs.append((OLID, os.path.join(audio_folder, "decrypted_files", filename), os.path.join(audio_folder, "opensmile_feature_extraction", diary_name(filename) + ".csv")))
+	return jobs
+
+# worker function for the OpenSMILE pool - input is an (OLID, WAV path, output CSV path, timeout in seconds) tuple
+# returns OLID, WAV path, status (done, failed, or timeout), SMILExtract return code, seconds spent, audio seconds in the file, and SMILExtract's output if it didn't finish successfully
+def opensmile_job(job):
+	OLID, wav_path, out_path, timeout = job
+	try:
+		audio_seconds = sf.info(wav_path).duration
+	except:
+		audio_seconds = 0.0
+	cmd = ["SMILExtract", "-C", OPENSMILE_CONFIG, "-I", wav_path, "--lldcsvoutput", out_path, "-nologfile"]
+	start_time = time.time()
+	try:
+		# each process writes only its own output, as they would otherwise all share one smile.log
+		result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+	except subprocess.TimeoutExpired as e:
+		output = e.output.decode(errors="ignore") if e.output is not None else ""
+		status, return_code = ("timeout", None)
+	except Exception as e:
+		output = str(e)
+		status, return_code = ("failed", None)
+	else:
+		output = result.stdout.decode(errors="ignore")
+		return_code = result.returncode
+		status = "done" if (return_code == 0 and os.path.isfile(out_path)) else "failed"
+	seconds = time.time() - start_time
+
+	if status == "done":
+		return (OLID, wav_path, status, return_code, seconds, audio_seconds, "")
+	# don't leave a partial output behind for later steps to pick up
+	try:
+		os.remove(out_path)
+	except:
+		pass
+	# the end of the output is where SMILExtract reports what went wrong
+	return (OLID, wav_path, status, return_code, seconds, audio_seconds, "\n".join(output.strip().split("\n")[-20:]))
+
+# saves the failed OpenSMILE runs for a patient to a CSV in their processed audio folder, concatenating with the existing CSV if there is one
+def save_opensmile_failures(study, OLID, failures):
+	output_path = "/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/" + study + "_" + OLID + "_phone_audio_opensmileFailures.csv"
+	new_df = pd.DataFrame(failures, columns=["filename", "status", "return_code", "seconds", "failed_at", "smilextract_output"])
+	if os.path.isfile(output_path): # concatenate first if necessary
+		old_df = pd.read_csv(output_path)
+		join_csv = pd.concat([old_df, new_df])
+		join_csv.reset_index(drop=True, inplace=True)
+		join_csv.to_csv(output_path, index=False)
+	else:
+		new_df.to_csv(output_path, index=False)
+
+# runs OpenSMILE on all new audio for every patient in the input study, using a pool of workers sized to the available cores unless num_workers is given
+# any single SMILExtract run taking longer than timeout seconds is stopped and counted as failed
+def study_opensmile(study, timeout=600, num_workers=None):
+	try:
+		jobs = find_opensmile_jobs(study)
+	except:
+		print("Problem with study argument " + study + ", exiting")
+		return
+	if len(jobs) == 0:
+		print("No new audio to run OpenSMILE on")
+		return
+
+	if num_workers is None:
+		num_workers = available_cores()
+	num_workers = max(1, min(int(num_workers), len(jobs)))
+	print("Running OpenSMILE on " + str(len(jobs)) + " files using " + str(num_workers) + " workers (timeout " + str(timeout) + " seconds per file)")
+
+	# SMILExtract does the work in its own process, so threads are enough to keep several running at once
+	ledger_updates = {}
+	failures = {}
+	total_audio_seconds = 0.0
+	total_job_seconds = 0.0
+	num_failed = 0
+	wall_start = time.time()
+	pool = multiprocessing.pool.ThreadPool(processes=num_workers)
+	for OLID, wav_path, status, return_code, seconds, audio_seconds, output in pool.imap_unordered(opensmile_job, [(j[0], j[1], j[2], timeout) for j in jobs]):
+		filename = os.path.basename(wav_path)
+		if OLID not in ledger_updates:
+			ledger_updates[OLID] = []
+			failures[OLID] = []
+		total_job_seconds = total_job_seconds + seconds
+		if status != "done":
+			print("OpenSMILE " + ("timed out" if status == "timeout" else "failed") + " for " + OLID + " " + filename + " after " + str(round(seconds, 1)) + " seconds")
+			ledger_updates[OLID].append((filename, "failed"))
+			failures[OLID].append((filename, status, return_code, round(seconds, 3), time.strftime("%Y-%m-%d %H:%M:%S"), output))
+			num_failed = num_failed + 1
+			continue
+		ledger_updates[OLID].append((filename, "done"))
+		total_audio_seconds = total_audio_seconds + audio_seconds
+	pool.close()
+	pool.join()
+	wall_seconds = time.time() - wall_start
+
+	# record the outcomes in the ledger, and keep the output of anything that failed
+	for OLID in ledger_updates:
+		mark_stage(study, OLID, ledger_updates[OLID], "opensmile")
+		if len(failures[OLID]) > 0:
+			save_opensmile_failures(study, OLID, failures[OLID])
+
+	# throughput summary - audio seconds processed per second of wall time, along with how busy the workers were kept
+	throughput = (total_audio_seconds / wall_seconds) if wall_seconds > 0 else 0.0
+	utilization = (total_job_seconds / (wall_seconds * num_workers)) if wall_seconds > 0 else 0.0
+	print("OpenSMILE finished " + str(len(jobs) - num_failed) + " of " + str(len(jobs)) + " files (" + str(round(total_audio_seconds / 60.0, 2)) + " minutes of audio) in " + str(round(wall_seconds, 2)) + " seconds")
+	print("Throughput " + str(round(throughput, 2)) + " audio seconds per wall second, workers busy " + str(round(utilization * 100, 1)) + "% of the time")
+	if num_failed > 0:
+		print(str(num_failed) + " files failed, see the " + study + "_[subjectID]_phone_audio_opensmileFailures.csv files for the OpenSMILE output")
+
+# runs OpenSMILE in process on the new audio for one patient, using the opensmile python package (GeMAPSv01a low level descriptors, same as the command line config)
+# audio comes from the shared decoded audio buffer, so when called from the VAD module after audio QC each diary is still only decoded once
+# features are saved as <diary>.npz in opensmile_feature_extraction, plus the usual semicolon separated CSV if save_csv is True - later steps read either through load_lld
+# the feature values can differ slightly from those of the OpenSMILE 2.3.0 command line tool, as the python package is built on a newer OpenSMILE release
+def diary_opensmile(study, OLID, save_csv=True):
+	print("Running in process OpenSMILE for patient " + OLID)
+	try:
+		engine = lld_engine()
+	except ImportError as e:
+		print(str(e) + ", exiting")
+		return
+	try:
+		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/decrypted_files")
+	except:
+		print("Problem with input arguments, or haven't decrypted any audio files yet for this patient") # should never reach this error if calling via bash module
+		return
+
+	cur_files = sorted([f for f in os.listdir(".") if f.endswith(".wav")])
+	already_done = completed_diaries(study, OLID, "opensmile")
+	new_files = [f for f in cur_files if diary_name(f) not in already_done]
+	if len(new_files) == 0:
+		print("No new files for this patient, skipping")
+		return
+	if not os.path.isdir("../opensmile_feature_extraction"):
+		os.mkdir("../opensmile_feature_extraction") # make subfolder in case it doesn't already exist
+
+	ledger_updates = []
+	total_audio_seconds = 0.0
+	wall_start = time.time()
+	for filename in new_files:
+		try:
+			data, fs = load_audio(filename, stage="opensmile")
+			lld = extract_lld(engine, data, fs)
+			save_lld(lld, "../opensmile_feature_extraction/" + diary_name(filename), save_csv=save_csv)
+		except Exception as e:
+			print("OpenSMILE failed for " + filename + " (" + str(e) + ")")
+			ledger_updates.append((filename, "failed"))
+			continue
+		ledger_updates.append((filename, "done"))
+		total_audio_seconds = total_audio_seconds + data.shape[0] / float(fs)
+	wall_seconds = time.time() - wall_start
+	mark_stage(study, OLID, ledger_updates, "opensmile")
+
+	num_done = len([u for u in ledger_updates if u[1] == "done"])
+	throughput = (total_audio_seconds / wall_seconds) if wall_seconds > 0 else 0.0
+	print("OpenSMILE finished " + str(num_done) + " of " + str(len(new_files)) + " files (" + str(round(total_audio_seconds / 60.0, 2)) + " minutes of audio) in " + str(round(wall_seconds, 2)) + " seconds, " + str(round(throughput, 2)) + " audio seconds per wall second")
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# optional second argument is the timeout in seconds for each file, optional third argument the number of workers (defaults to the available cores)
+	# optional fourth argument python runs OpenSMILE in process patient by patient instead of with SMILExtract (timeout and workers are then ignored), optional fifth argument N skips also saving the CSV
+	try:
+		timeout_inp = float(sys.argv[2])
+	except:
+		timeout_inp = 600
+	try:
+		workers_inp = int(sys.argv[3])
+	except:
+		workers_inp = None
+	try:
+		engine_inp = sys.argv[4]
+	except:
+		engine_inp = "smilextract"
+	try:
+		save_csv_inp = (sys.argv[5] != "N")
+	except:
+		save_csv_inp = True
+	if engine_inp == "python":
+		for OLID in sorted(os.listdir("/data/sbdp/PHOENIX/PROTECTED/" + sys.argv[1])):
+			if os.path.isdir("/data/sbdp/PHOENIX/PROTECTED/" + sys.argv[1] + "/" + OLID + "/phone/processed/audio/decrypted_files"):
+				diary_opensmile(sys.argv[1], OLID, save_csv=save_csv_inp)
+	else:
+		study_opensmile(sys.argv[1], timeout=timeout_inp, num_workers=workers_inp)
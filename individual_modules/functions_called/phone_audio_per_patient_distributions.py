@@ -6,6 +6,7 @@ import numpy as np
 import glob
 import sys
 from viz_helper_functions import distribution_plots
+from opensmile_functions import load_lld
 
 # note that this function adds to the study distribution by concatenation and then dropping duplicates
 # this will work well except in the case that new features are added - will need to rerun from scratch if so
@@ -91,7 +92,8 @@ def audio_dist(study, OLID):
 	except:
 		print("No OpenSMILE results yet for " + OLID + ", skipping")
 		return
-	OS_files = os.listdir(".")
+	# a diary may have a CSV, a binary .npz (from the in process OpenSMILE engine), or both - each diary should only be counted once, and load_lld reads whichever is there
+	OS_files = list(set([f.split(".")[0] for f in os.listdir(".") if f.endswith(".csv") or f.endswith(".npz")]))
 	if len(OS_files) == 0:
 		print("No OpenSMILE results yet for " + OLID + ", skipping")
 		return
@@ -99,7 +101,7 @@ def audio_dist(study, OLID):
 	OS_files.sort()
 	for OS_name in OS_files:
 		# setup metadata for this file first
-		name_match = OS_name.split(".")[0] + ".wav"
+		name_match = OS_name + ".wav"
 		match_df = filemap[filemap["filename"] == name_match]
 		try:
 			cur_day = match_df["day"].tolist()[0]
@@ -114,7 +116,7 @@ def audio_dist(study, OLID):
 
 		# now look at OpenSMILE results
 		try:
-			cur_df = pd.read_csv(OS_name,sep=';')
+			cur_df = load_lld(OS_name)
 			if cur_df.empty:
 				continue
 		except:
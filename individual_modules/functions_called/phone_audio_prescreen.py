@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import soundfile as sf
+
+from phone_audio_ledger import mark_stage, completed_diaries, reset_diary, diary_name
+from feature_store_functions import upsert_rows
+
+# quick pre-screen of newly decrypted diaries against the same length and volume criteria used by the audio selection step
+# length comes straight from the WAV header, and volume is computed from a blockwise RMS so the file never needs to be fully loaded
+# any diary failing the pre-screen is recorded (with the reason) in a per-patient CSV, and marked in the processing ledger so the expensive OpenSMILE and VAD steps skip it
+# note audio QC is still run on every file, as the QC CSV is what the DPDash formatting and audio selection steps use
+# diaries the ledger already has a pre-screen result for are not screened again - reset them in the ledger to have them rescreened (e.g. after lowering the cutoffs)
+def diary_prescreen(study, OLID, length_cutoff, db_cutoff, block_size=65536):
+	print("Pre-screening new phone audio for patient " + OLID)
+
+	# static setting for converting from rms to db - same as used by audio QC
+	ref_rms=float(2*(10**(-5)))
+
+	try:
+		length_cutoff = float(length_cutoff)
+		db_cutoff = float(db_cutoff)
+	except:
+		print("Problem with cutoff arguments, skipping pre-screen")
+		return
+
+	try:
+		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/decrypted_files")
+	except:
+		print("Problem with input arguments, or haven't decrypted any audio files yet for this patient") # should never reach this error if calling via bash module
+		return
+
+	# setup for output df - one row per file
+	df_cols = ["filename","length(minutes)","overall_db","prescreen_pass","prescreen_reason"]
+	filenames = []
+	lengths = []
+	dbs = []
+	passes = []
+	reasons = []
+	df_vals = [filenames, lengths, dbs, passes, reasons]
+
+	already_screened = completed_diaries(study, OLID, "prescreen")
+	cur_files = os.listdir(".")
+	cur_files.sort()
+	for filename in cur_files:
+		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
+			continue
+		if diary_name(filename) in already_screened:
+			continue
+
+		# get length info from the header
+		try:
+			info = sf.info(filename)
+		except:
+			# broken audio would fail all the later steps anyway
+			filenames.append(filename)
+			lengths.append(np.nan)
+			dbs.append(np.nan)
+			passes.append(0)
+			reasons.append("broken")
+			continue
+		length_seconds = float(info.frames)/info.samplerate
+
+		# compute RMS block by block - only the first channel is considered, in line with audio QC
+		sum_squares = 0.0
+		num_samples = 0
+		try:
+			for block in sf.blocks(filename, blocksize=block_size, dtype="float64", always_2d=True):
+				chan1 = block[:,0]
+				sum_squares = sum_squares + np.dot(chan1, chan1)
+				num_samples = num_samples + chan1.shape[0]
+		except:
+			filenames.append(filename)
+			lengths.append(length_seconds/60.0)
+			dbs.append(np.nan)
+			passes.append(0)
+			reasons.append("broken")
+			continue
+
+		filenames.append(filename)
+		lengths.append(length_seconds/60.0)
+		if num_samples == 0:
+			dbs.append(np.nan)
+			passes.append(0)
+			reasons.append("empty")
+			continue
+		rms = np.sqrt(sum_squares/num_samples)
+		if rms > 0:
+			cur_db = 20 * np.log10(rms/ref_rms)
+		else:
+			cur_db = -np.inf
+		dbs.append(cur_db)
+
+		# check criteria in the same order as the audio selection step, so the recorded reason matches the eventual error code
+		if length_seconds < length_cutoff:
+			passes.append(0)
+			reasons.append("short")
+		elif cur_db < db_cutoff:
+			passes.append(0)
+			reasons.append("quiet")
+		else:
+			passes.append(1)
+			reasons.append("")
+
+	if len(filenames) == 0:
+		print("No new files for this patient, skipping")
+		return
+
+	new_csv = pd.DataFrame()
+	for i in range(len(df_cols)):
+		new_csv[df_cols[i]] = df_vals[i]
+	num_rejected = len([x for x in passes if x == 0])
+	print(str(num_rejected) + " of " + str(len(filenames)) + " new diaries rejected by pre-screen, these will skip OpenSMILE and VAD")
+
+	# now save CSV in the patient's processed audio folder
+	os.chdir("..")
+	output_path = study + "_" + OLID + "_phone_audio_prescreen_output.csv"
+	upsert_rows(output_path, new_csv, ["filename"]) # a rescreened file replaces its earlier result
+
+	# finally update the ledger - rejected files count as complete for the stages they skip
+	mark_stage(study, OLID, [(f, "done") for f in filenames], "prescreen")
+	rejects = [(filenames[i], "skipped") for i in range(len(filenames)) if passes[i] == 0]
+	for stage in ["opensmile", "vad", "pause_qc"]:
+		mark_stage(study, OLID, rejects, stage)
+	# a file passing now may have been rejected on an earlier screen, so clear any skips left over from that
+	for i in range(len(filenames)):
+		if passes[i] == 1:
+			reset_diary(study, OLID, filenames[i], stages=["opensmile", "vad", "pause_qc"])
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	diary_prescreen(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
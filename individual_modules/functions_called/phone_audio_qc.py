@@ -12,6 +12,10 @@ import soundfile as sf
 import librosa
 import sys
 
+from phone_audio_ledger import completed_diaries, diary_name, mark_stage
+from audio_buffer_functions import load_audio, audio_dtype
+from feature_store_functions import upsert_rows
+from stage_profile_functions import profile_diary
 
 def diary_qc(study, OLID):
 	print("Computing new phone audio QC for patient " + OLID)
@@ -39,15 +43,23 @@ def diary_qc(study, OLID):
 	if len(cur_files) == 0: # decrypted_audio folder may exist without any audio files in it when called from the feature extraction script, so add a check for that
 		print("No new files for this patient, skipping") # should never reach this error if calling via bash module
 		return
+	# skip anything already QCed in a previous (interrupted) run, outcomes are recorded in the ledger once the CSV is saved
+	already_done = completed_diaries(study, OLID, "qc")
+	ledger_updates = []
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
 			continue
+		if diary_name(filename) in already_done:
+			continue
+		profile_diary("qc", filename)
 
 		try:
-			data, fs = sf.read(filename)
+			# decoded audio is buffered, so if VAD runs in the same process afterwards it won't need to read the file again
+			data, fs = load_audio(filename, stage="qc")
 		except:
 			# ignore bad audio - will want to log this for pipeline
 			print(filename + " audio is broken, skipping")
+			ledger_updates.append((filename, "failed"))
 			continue 
 
 		# get length info
@@ -55,7 +67,9 @@ def diary_qc(study, OLID):
 		if ns == 0:
 			# ignore empty audio - will want to log this for pipeline
 			print(filename + " audio is empty, skipping")
+			ledger_updates.append((filename, "skipped"))
 			continue
+		ledger_updates.append((filename, "done"))
 
 		# add metadata info to lists for CSV
 		patients.append(OLID)
@@ -74,21 +88,15 @@ def diary_qc(study, OLID):
 			else:
 				ster_bools.append(0)
 				chan1 = data.flatten()
-			vol = np.sqrt(np.mean(np.square(chan1)))
-			gains.append(vol)
-			stds.append(np.nanstd(chan1))
-			spec_flat = librosa.feature.spectral_flatness(y=chan1)
-			mean_flats.append(np.mean(spec_flat))
-			max_flats.append(np.amax(spec_flat))
 		except: # now it is definitely mono
 			ster_bools.append(0)
 			chan1 = data.flatten()
-			vol = np.sqrt(np.mean(np.square(chan1)))
-			gains.append(vol)
-			stds.append(np.nanstd(chan1))
-			spec_flat = librosa.feature.spectral_flatness(y=chan1)
-			mean_flats.append(np.mean(spec_flat))
-			max_flats.append(np.amax(spec_flat))
+		vol, std, mean_flat, max_flat = qc_metrics(chan1)
+		gains.append(vol)
+		stds.append(std)
+		mean_flats.append(mean_flat)
+		max_flats.append(max_flat)
+	profile_diary("qc", None)
 		
 	# now prepare to save new CSV for this patient (or update existing CSV if there is one)
 	os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio")
@@ -105,16 +113,18 @@ def diary_qc(study, OLID):
 		vals = values[i]
 		new_csv[h] = vals
 
-	# now save CSV
+	# now save - the feature store only writes the new rows (replacing any for the same file, in case audio got decrypted a second time), and keeps the CSV up to date
 	output_path = study+"_"+OLID+"_phone_audioQC_output.csv"
-	if os.path.isfile(output_path): # concatenate first if necessary
-		old_df = pd.read_csv(output_path)
-		join_csv=pd.concat([old_df, new_csv])
-		join_csv.reset_index(drop=True, inplace=True)
-		join_csv.drop_duplicates(subset=["OLID", "filename"],inplace=True) # drop any duplicates in case audio got decrypted a second time
-		join_csv.to_csv(output_path,index=False)
-	else:
-		new_csv.to_csv(output_path,index=False)
+	upsert_rows(output_path, new_csv, ["OLID", "filename"])
+	mark_stage(study, OLID, ledger_updates, "qc")
+
+# computes the QC metrics for one channel of diary audio, in the numeric precision set in audio_buffer_functions (float64 unless set otherwise)
+# returns (RMS, standard deviation, mean spectral flatness, max spectral flatness)
+def qc_metrics(chan1):
+	chan1 = chan1.astype(audio_dtype())
+	vol = np.sqrt(np.mean(np.square(chan1)))
+	spec_flat = librosa.feature.spectral_flatness(y=chan1)
+	return (vol, np.nanstd(chan1), np.mean(spec_flat), np.amax(spec_flat))
 
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+# renders the spectrogram images queued by VAD and pause-derived QC for all patients in a study, with a pool of processes
+# VAD only queues the (already reduced) spectrogram data for each image, so its compute loop never waits on matplotlib - this is the separate stage that draws and saves them
+# images are saved to the same vad_spectrogram_comparisons paths as always, and each job is removed from the patient's spectrogram_queue folder once its image is saved (failed jobs are left to be retried)
+
+import os
+import sys
+import time
+import glob
+import multiprocessing
+
+from spectrogram_functions import render_spectrogram_job
+from worker_pool_functions import available_cores
+
+# renders every queued spectrogram image in the input study, using a pool of worker processes sized to the available cores unless num_workers is given
+def study_spectrograms(study, num_workers=None):
+	jobs = sorted(glob.glob("/data/sbdp/PHOENIX/PROTECTED/" + study + "/*/phone/processed/audio/spectrogram_queue/*.npz"))
+	jobs = [j for j in jobs if not j.endswith(".tmp.npz")] # skip anything still being written
+	if len(jobs) == 0:
+		print("No queued spectrogram images to render")
+		return
+
+	if num_workers is None:
+		num_workers = available_cores()
+	num_workers = max(1, min(int(num_workers), len(jobs)))
+	print("Rendering " + str(len(jobs)) + " spectrogram images using " + str(num_workers) + " workers")
+
+	# matplotlib holds the GIL while drawing, so this needs processes rather than threads
+	start_time = time.time()
+	num_failed = 0
+	pool = multiprocessing.Pool(processes=num_workers)
+	for job_path, success, error in pool.imap_unordered(render_spectrogram_job, jobs):
+		if not success:
+			print("Problem rendering " + os.path.basename(job_path) + " (" + error + "), leaving it queued")
+			num_failed = num_failed + 1
+	pool.close()
+	pool.join()
+	print("Rendered " + str(len(jobs) - num_failed) + " of " + str(len(jobs)) + " spectrogram images in " + str(round(time.time() - start_time, 2)) + " seconds")
+
+if __name__ == '__main__':
+	# Map command line arguments to function arguments.
+	# optional second argument is the number of workers (defaults to the available cores)
+	try:
+		workers_inp = int(sys.argv[2])
+	except:
+		workers_inp = None
+	study_spectrograms(sys.argv[1], num_workers=workers_inp)
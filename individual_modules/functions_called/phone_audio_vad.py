@@ -4,26 +4,54 @@
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# need to import matplotlib a specific way for use on cluster
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-plt.ioff()
-
 # rest of imports
 import os
 import numpy as np
 import librosa
-import librosa.display
 import sys
+import argparse
 import soundfile as sf
 import pandas as pd
 import datetime
+import time
+import io
+
+from phone_audio_ledger import completed_diaries, diary_name, mark_stage
+from audio_buffer_functions import load_audio, load_audio_resampled, release_audio, set_buffer_budget, report_buffer_stats, set_audio_dtype, audio_dtype
+from phone_audio_qc import diary_qc
+from vad_engine_functions import nn_filter_engines, vad_backends, window_pause_periods
+from frame_filter_functions import pause_frame_mask
+from opensmile_functions import lld_exists, load_lld
+from feature_store_functions import upsert_rows, upsert_partitions, load_partition, table_exists
+from phone_audio_opensmile import diary_opensmile
+from spectrogram_functions import queue_spectrogram, pool_time_points, FIGURE_DPI
+from stage_profile_functions import enable_profiling, profile_diary, save_profile
 
 # function that runs procedure specified in librosa documentation here: https://librosa.org/librosa_gallery/auto_examples/plot_vocal_separation.html#sphx-glr-auto-examples-plot-vocal-separation-py
-def diary_vad(study, OLID):
+# if fused is True, pause detection is also done here directly on the in-memory foreground, instead of by diary_pause_detect reading back the saved foreground audio
+# in that case the foreground audio is only written to disk if save_foreground is True, and pause_spectrogram chooses what the pauses are detected on:
+# "resynthesized" reproduces the spectrogram of the saved foreground WAV (without touching disk), so gives exactly the same pause times as the separate pause detection step
+# "foreground" uses the foreground magnitude spectrogram as is, skipping the inverse and forward transforms - note the default threshold was tuned on the resynthesized version, so it would need retuning for this
+# nn_engine chooses the nearest neighbor filter implementation used for foreground separation (see vad_engine_functions.py) - librosa is the original, approximate is much faster on long diaries
+# spectrograms set to False skips the foreground/background spectrogram comparison images - otherwise they are queued for phone_audio_spectrograms.py to render, rather than drawn here
+# vad_backend of separation (the default) is all of the above, any other is one of the lightweight backends in vad_engine_functions.vad_backends, which find pauses straight from the diary spectrogram
+# a lightweight backend always detects pauses here (as if fused), and has no foreground to save or foreground/background image to queue
+# chunk_sec above 0 runs the separation in chunks of that many seconds with overlap_sec of context either side (see chunked_separation), so peak memory stays bounded on very long diaries
+# the other optional arguments are passed to pause detection
+def diary_vad(study, OLID, fused=False, save_foreground=True, pause_spectrogram="resynthesized", nn_engine="librosa", spectrograms=True, vad_backend="separation", chunk_sec=0, overlap_sec=125, spec_thres=0.03, window_sec=0.25, slide_sec=0.05):
 	print("Running VAD on new phone audio for patient " + OLID)
 
+	# check the engine names up front, as an error in foreground separation would otherwise be taken to mean the diary is too short
+	if nn_engine not in nn_filter_engines:
+		print("Unknown nearest neighbor filter engine " + str(nn_engine) + ", available engines are: " + ", ".join(nn_filter_engines.keys()))
+		return
+	if vad_backend != "separation" and vad_backend not in vad_backends:
+		print("Unknown VAD backend " + str(vad_backend) + ", available backends are: separation, " + ", ".join(vad_backends.keys()))
+		return
+	if vad_backend != "separation":
+		fused = True
+		save_foreground = False
+
 	# will run VAD on all audio files currently in this patient's decrypted_files folder
 	try:
 		os.chdir("/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/decrypted_files")
@@ -47,11 +75,24 @@ def diary_vad(study, OLID):
 		print("No metadata for this patient yet") # should never reach this error if calling via pipeline
 		return
 
+	# skip files that already finished VAD in a previous run, or that failed the pre-screen (they will be rejected by audio selection anyway)
+	already_done = completed_diaries(study, OLID, "vad")
+	ledger_updates = []
+
+	# setup for pause times df when running pause detection here - same columns as in diary_pause_detect
+	pause_cols = ["filename","pause_number","pause_start_bin","pause_stop_bin","pause_length_seconds"]
+	pause_vals = [[], [], [], [], []]
+	pause_times_output_path = "/data/sbdp/PHOENIX/PROTECTED/" + study + "/" + OLID + "/phone/processed/audio/" + study + "_" + OLID + "_phone_audioVAD_pauseTimesOutput.csv"
+
 	# loop through the list of diaries
 	cur_files.sort()
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
 			continue
+		if diary_name(filename) in already_done:
+			release_audio(filename) # won't be needed by pause QC either
+			continue
+		profile_diary("vad", filename)
 
 		# get metadata/setup filepaths for this diary
 		diary_root = filename.split(".")[0]
@@ -59,7 +100,7 @@ def diary_vad(study, OLID):
 		fore_audio_out_path = "foreground_audio/" + diary_root + ".wav"
 		# this will be used for pause detection, then cleared by pipeline
 
-		if os.path.isfile(fore_audio_out_path):
+		if not fused and os.path.isfile(fore_audio_out_path):
 			# skip the file if it was already processed before
 			# this shouldn't occur if run from pipeline, but because VAD can be a bit slow to run, added this for addressing backlog with potential code interruptions
 			continue 
@@ -78,56 +119,251 @@ def diary_vad(study, OLID):
 			# however will still get pause times, in line with convention for raw audio QC and OpenSMILE outputs
 			image_out_path = ""
 		
-		# load the audio
+		# load the audio - equivalent to librosa.load, but using the shared buffer in case audio QC already decoded this file
 		try:
-			y, sr = librosa.load(filename)
+			y, sr = load_audio_resampled(filename, stage="vad")
 		except:
 			# ignore bad audio - will want to log this for pipeline
 			print(filename + " audio is broken, skipping")
+			ledger_updates.append((filename, "failed"))
 			continue 
 
 		# compute VAD
-		S_full, phase = librosa.magphase(librosa.stft(y))
-		try:
-			# this will fail if file is too short
-			S_filter = librosa.decompose.nn_filter(S_full,aggregate=np.median,metric='cosine',width=int(librosa.time_to_frames(2, sr=sr)))
-		except:
-			print(filename + " is too short, skipping")
-			continue
-		S_filter = np.minimum(S_full, S_filter)
-		margin_i, margin_v = 2, 10
-		power = 2
-		mask_i = librosa.util.softmask(S_filter,margin_i * (S_full - S_filter),power=power)
-		mask_v = librosa.util.softmask(S_full - S_filter,margin_v * S_filter,power=power)
-		S_foreground = mask_v * S_full
-		S_background = mask_i * S_full
-
-		# generate figure comparing original with foreground and background spectrograms for our core audios
-		if image_out_path != "":
-			plt.figure(figsize=(12, 8))
-			plt.subplot(3, 1, 1)
-			librosa.display.specshow(librosa.amplitude_to_db(S_full, ref=np.max),y_axis='log', sr=sr)
-			plt.title('Full spectrum')
-			plt.colorbar()
-			plt.subplot(3, 1, 2)
-			librosa.display.specshow(librosa.amplitude_to_db(S_background, ref=np.max),y_axis='log', sr=sr)
-			plt.title('Background')
-			plt.colorbar()
-			plt.subplot(3, 1, 3)
-			librosa.display.specshow(librosa.amplitude_to_db(S_foreground, ref=np.max),y_axis='log', x_axis='time', sr=sr)
-			plt.title('Foreground')
-			plt.colorbar()
-			plt.tight_layout()
-			plt.savefig(image_out_path)
-			plt.close()
-
-		# finally invert the filtered spectrogram to get back foreground audio, and save it
-		foreground = librosa.core.istft(S_foreground)
-		sf.write(fore_audio_out_path,foreground,sr)
+		if vad_backend != "separation":
+			S_full, phase = librosa.magphase(librosa.stft(y))
+			pause_periods = vad_backends[vad_backend](S_full, sr, window_sec=window_sec, slide_sec=slide_sec)
+		elif chunk_sec > 0:
+			# same steps as below, a chunk at a time - the image panels are averaged down to the figure width as they go
+			image_width_px = int(12 * FIGURE_DPI) if (image_out_path != "" and spectrograms) else 0
+			try:
+				foreground, frame_max, image_panels, image_factor = chunked_separation(y, sr, nn_engine=nn_engine, chunk_sec=chunk_sec, overlap_sec=overlap_sec, keep_foreground=(save_foreground or (fused and pause_spectrogram == "resynthesized")),
+																						foreground_max=(fused and pause_spectrogram == "foreground"), image_width_px=image_width_px)
+			except:
+				print(filename + " is too short, skipping")
+				ledger_updates.append((filename, "skipped"))
+				continue
+			if image_width_px > 0:
+				queue_spectrogram("../spectrogram_queue", image_out_path, [("Full spectrum", image_panels[0], None), ("Background", image_panels[1], None), ("Foreground", image_panels[2], "time")], sr, figsize=(12, 8), hop_length=512 * image_factor)
+			if save_foreground:
+				sf.write(fore_audio_out_path,foreground,sr)
+			if not fused:
+				continue
+			if pause_spectrogram != "foreground":
+				frame_max = resynthesized_max(foreground, sr, int(librosa.time_to_frames(chunk_sec, sr=sr)))
+			pause_periods = detect_pauses_from_max(frame_max, sr, spec_thres=spec_thres, window_sec=window_sec, slide_sec=slide_sec)
+		else:
+			S_full, phase = librosa.magphase(librosa.stft(y))
+			try:
+				# this will fail if file is too short
+				S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=nn_engine)
+			except:
+				print(filename + " is too short, skipping")
+				ledger_updates.append((filename, "skipped"))
+				continue
+
+			# queue figure comparing original with foreground and background spectrograms for our core audios, to be rendered after VAD
+			if image_out_path != "" and spectrograms:
+				queue_spectrogram("../spectrogram_queue", image_out_path, [("Full spectrum", S_full, None), ("Background", S_background, None), ("Foreground", S_foreground, "time")], sr, figsize=(12, 8))
+
+			# finally invert the filtered spectrogram to get back foreground audio, and save it if requested
+			if save_foreground or (fused and pause_spectrogram == "resynthesized"):
+				foreground = librosa.core.istft(S_foreground)
+			if save_foreground:
+				sf.write(fore_audio_out_path,foreground,sr)
+			if not fused:
+				continue
+
+			# now detect pauses for this diary
+			if pause_spectrogram == "foreground":
+				S_pause = S_foreground
+			else:
+				S_pause = resynthesized_magnitude(foreground, sr)
+			pause_periods = detect_pauses(S_pause, sr, spec_thres=spec_thres, window_sec=window_sec, slide_sec=slide_sec)
+		# pause times index into the original WAV, which may be at a different sample rate than the VAD was run at
+		sr_ratio = float(sf.info(filename).samplerate) / sr
+		add_pause_rows(pause_vals, filename, pause_periods, sr, sr_ratio)
+		ledger_updates.append((filename, "done"))
 		
-	# once done looping through this patient's audio can simply return
+	profile_diary("vad", None)
+
+	# once done looping through this patient's audio save the pause times if they were detected here, and record the outcomes in the ledger
+	# (when not fused, successful files are instead marked done by pause detection, once their pause times are saved)
+	if fused:
+		save_pause_times(pause_times_output_path, pause_cols, pause_vals)
+	mark_stage(study, OLID, ledger_updates, "vad")
 	return
 
+# finds the pause periods in a magnitude spectrogram (frequency bins x time points, as from librosa.stft), computed from audio at sample rate fs
+# takes the max across frequency bins at each time point, then thresholds the RMS of that over a sliding window - any window below the threshold is considered pause
+# returns a list of (first spectrogram time index, last spectrogram time index, number of time indices) for each continuous pause, in order
+# this gives exactly the same result as the original nested loop implementation (kept in tests/reference_functions.py for the regression tests), but vectorized
+def detect_pauses(S_full, fs, spec_thres=0.03, window_sec=0.25, slide_sec=0.05, samples_per_spec_bin=512):
+	if S_full.shape[1] == 0:
+		return []
+	return detect_pauses_from_max(np.max(S_full, axis=0), fs, spec_thres=spec_thres, window_sec=window_sec, slide_sec=slide_sec, samples_per_spec_bin=samples_per_spec_bin)
+
+# same as detect_pauses, but given just the max across frequency bins at each spectrogram time point - which is all pause detection uses, so it can be built up a chunk at a time
+def detect_pauses_from_max(frame_max, fs, spec_thres=0.03, window_sec=0.25, slide_sec=0.05, samples_per_spec_bin=512):
+	num_timepoints = len(frame_max)
+	# figure out window length - need to adjust for how many samples go into a given spectrogram bin by default (not an optional setting)
+	window_len = int((float(fs)/samples_per_spec_bin) * window_sec)
+	slide_len = int((float(fs)/samples_per_spec_bin) * slide_sec)
+	window_starts = np.arange(0, num_timepoints, slide_len)
+	if num_timepoints == 0 or window_len == 0:
+		return []
+
+	# squared max across frequency bins at each time point
+	max_squared = frame_max**2
+	# RMS of each full length window, taking the windows as strided views rather than copying them out
+	diary_summary = np.empty(len(window_starts), dtype=max_squared.dtype)
+	num_full = 0
+	if num_timepoints >= window_len:
+		full_windows = np.lib.stride_tricks.sliding_window_view(max_squared, window_len)[::slide_len]
+		num_full = full_windows.shape[0]
+		diary_summary[:num_full] = np.sqrt(np.mean(full_windows, axis=1))
+	# at the very end of the file the last few windows are cut short
+	for k in range(num_full, len(window_starts)):
+		diary_summary[k] = np.sqrt(np.mean(max_squared[window_starts[k]:]))
+
+	# the pauses are the continuous runs of spectrogram indices covered by a window that doesn't meet threshold
+	return window_pause_periods(window_starts[diary_summary < spec_thres], window_len, num_timepoints)
+
+# splits a magnitude spectrogram into foreground (voice) and background parts, using nearest neighbor filtering and soft masks as in the librosa vocal separation example
+# returns (foreground, background) magnitude spectrograms - raises an error if the audio is too short for the nearest neighbor filter
+# nn_engine is the name of the nearest neighbor filter implementation to use, from vad_engine_functions.nn_filter_engines
+def separate_foreground(S_full, sr, nn_engine="librosa"):
+	S_filter = nn_filter_engines[nn_engine](S_full, sr)
+	S_filter = np.minimum(S_full, S_filter)
+	margin_i, margin_v = 2, 10
+	power = 2
+	mask_i = librosa.util.softmask(S_filter,margin_i * (S_full - S_filter),power=power)
+	mask_v = librosa.util.softmask(S_full - S_filter,margin_v * S_filter,power=power)
+	S_foreground = mask_v * S_full
+	S_background = mask_i * S_full
+	return (S_foreground, S_background)
+
+# adds the rows for one diary's pauses to the lists for the pause times df (filenames, pause numbers, starts, stops, lengths)
+# pause periods are as returned by detect_pauses, from a spectrogram of audio at sample rate fs - sr_ratio is the original WAV sample rate over fs
+def add_pause_rows(df_vals, filename, pause_periods, fs, sr_ratio, samples_per_spec_bin=512):
+	filenames, pause_ids, pause_starts, pause_stops, pause_lengths = df_vals
+	cur_count = 1
+	for pause_first, pause_last, pause_bins in pause_periods:
+		filenames.append(filename)
+		pause_ids.append(cur_count)
+		pause_starts.append(int(pause_first*samples_per_spec_bin*sr_ratio)) # convert back to wav file index - need to account for the sample rate of original audio vs foreground
+		pause_stops.append(int(pause_last*samples_per_spec_bin*sr_ratio)) # convert back to wav file index - need to account for the sample rate of original audio vs foreground
+		# note for the stop conversion it is technically cutting the identified pause slightly short because it includes only the first true index of the final spectrogram bin
+		# however already did all testing with this setup, and it is quite a miniscule difference so going forward as is for the internal code. could switch in the release code
+		# (not to mention that if anything the pauses were extending a bit too long, so not concerned with extending further)
+		pause_lengths.append(pause_bins*samples_per_spec_bin/float(fs)) # account for spectrogram timepoint length in calculating pause time as well - can just use this file sample rate though as was calculated in this file
+		# note that pause length uses the number of spectrogram bins in the pause, so it includes the full indices of the final bin which are not reflected in the stop time
+		# therefore pause length is always ~23 ms longer than the file clipping for that pause will actually be - could somewhat add up over many pauses, but shouldn't matter much for our purposes
+		cur_count = cur_count + 1
+
+# boolean mask over the samples of a diary's WAV marking those within a pause, from the pause start/stop sample indices in the pause times CSV (stop is exclusive, as in slicing)
+# taking audio[mask] gives the same signal as concatenating audio[start:stop] for each pause, as pauses are in order and never overlap, but in one step
+def pause_sample_mask(num_samples, pause_starts, pause_stops):
+	starts = np.clip(np.asarray(pause_starts, dtype=np.int64), 0, num_samples)
+	stops = np.clip(np.asarray(pause_stops, dtype=np.int64), 0, num_samples)
+	keep = stops > starts
+	edges = np.zeros(num_samples + 1, dtype=np.int64)
+	np.add.at(edges, starts[keep], 1)
+	np.add.at(edges, stops[keep], -1)
+	return np.cumsum(edges[:-1]) > 0
+
+# saves the pause times df built up by add_pause_rows to the patient's feature store, which also keeps the CSV up to date
+# pause times are stored with one partition per diary, so this code (which only processes newest files) only writes the new diaries, and pause-derived QC can read back one diary at a time
+# saving a diary again (in case audio got decrypted a second time) replaces all of its old pauses
+def save_pause_times(pause_times_output_path, df_cols, df_vals):
+	new_df = pd.DataFrame()
+	for i in range(len(df_cols)):
+		col = df_cols[i]
+		vals = df_vals[i]
+		new_df[col] = vals
+	upsert_partitions(pause_times_output_path, new_df, "filename")
+
+# magnitude spectrogram of the foreground audio exactly as pause detection sees it when reading the saved foreground WAV back in - 
+# the foreground is encoded to 16-bit WAV in memory rather than on disk, so the values match what the foreground_audio file would give
+# (it is read back in the numeric precision set in audio_buffer_functions, float64 as sf.read gives by default unless set otherwise)
+def resynthesized_magnitude(foreground, sr):
+	wav_buffer = io.BytesIO()
+	sf.write(wav_buffer, foreground, sr, format="WAV")
+	wav_buffer.seek(0)
+	data, fs = sf.read(wav_buffer, dtype=np.dtype(audio_dtype()).name)
+	S_resynth, phase = librosa.magphase(librosa.stft(data))
+	return S_resynth
+
+# STFT time points first to stop-1 of audio y, exactly as librosa.stft(y) (with its default settings) would give them, but computed from only the audio those time points cover
+# y_padded is y with n_fft//2 zeros added to each end, as librosa.stft pads it
+def stft_frames(y_padded, first, stop, n_fft=2048, hop_length=512):
+	return librosa.stft(y_padded[first*hop_length:(stop-1)*hop_length + n_fft], n_fft=n_fft, hop_length=hop_length, center=False)
+
+# foreground separation for a long diary in chunks of chunk_sec, so the spectrograms in memory at once are bounded by the chunk size (plus context) rather than the diary length
+# each chunk keeps the separation for its own time points, computed with overlap_sec of spectrogram either side as context for the nearest neighbor filter - all other steps work time point by time point,
+# so with the approximate engine (which only searches 2 minutes either side) and enough overlap this gives the same result as separating the whole diary at once, barring ties in similarity
+# librosa and blocked engines use more neighbours the longer the spectrogram, so for them the chunked result is close to but not the same as the whole diary (a diary no longer than a chunk is always the same)
+# the chunks are stitched back together as:
+#	the foreground audio, if keep_foreground is True (the inverse transform for a chunk's samples only needs the time points overlapping them, so this matches the whole diary inverse)
+#	the max across frequency of the foreground magnitude at each time point, if foreground_max is True (for pause detection directly on the foreground spectrogram)
+#	the full, background, and foreground spectrograms averaged over groups of time points, if image_width_px is above 0 - at most that many groups, for queuing an image
+# returns (foreground audio or None, foreground max or None, list of the 3 pooled image spectrograms or None, number of time points pooled into each image column)
+# raises an error if the diary is too short for the nearest neighbor filter, as separate_foreground would
+def chunked_separation(y, sr, nn_engine="librosa", chunk_sec=240, overlap_sec=125, keep_foreground=True, foreground_max=False, image_width_px=0, n_fft=2048, hop_length=512):
+	num_frames = 1 + len(y) // hop_length
+	chunk_len = max(1, int(librosa.time_to_frames(chunk_sec, sr=sr, hop_length=hop_length)))
+	context_len = max(n_fft // hop_length, int(librosa.time_to_frames(overlap_sec, sr=sr, hop_length=hop_length)))
+	image_factor = 1
+	if image_width_px > 0:
+		# line the chunks up with the image columns, so each column is pooled within a single chunk
+		image_factor = int(np.ceil(num_frames / float(image_width_px)))
+		chunk_len = int(np.ceil(chunk_len / float(image_factor))) * image_factor
+
+	y_padded = np.pad(y, n_fft // 2)
+	foreground = np.zeros(hop_length * (num_frames - 1), dtype=y.dtype) if keep_foreground else None
+	frame_max = np.zeros(num_frames) if foreground_max else None
+	image_panels = [[], [], []] if image_width_px > 0 else None
+	for first in range(0, num_frames, chunk_len):
+		stop = min(num_frames, first + chunk_len)
+		context_first = max(0, first - context_len)
+		context_stop = min(num_frames, stop + context_len)
+		S_full = np.abs(stft_frames(y_padded, context_first, context_stop, n_fft=n_fft, hop_length=hop_length)) # same magnitude as librosa.magphase, without also keeping the phase
+		S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=nn_engine)
+		keep_first = first - context_first
+		keep_stop = stop - context_first
+
+		if frame_max is not None:
+			frame_max[first:stop] = np.max(S_foreground[:,keep_first:keep_stop], axis=0)
+		if image_panels is not None:
+			for panel, S in zip(image_panels, [S_full, S_background, S_foreground]):
+				panel.append(pool_time_points(S[:,keep_first:keep_stop], image_factor))
+		if foreground is not None:
+			# the samples from this chunk's first time point to the next chunk's are overlapped by its own time points and the few before it (time points are n_fft samples long)
+			# in the padded audio - the output of the inverse transform is the padded audio without its padding
+			istft_first = max(0, first - (n_fft // hop_length - 1))
+			chunk_audio = librosa.istft(S_foreground[:,istft_first - context_first:keep_stop], n_fft=n_fft, hop_length=hop_length, center=False)
+			out_first = max(0, first * hop_length - n_fft // 2)
+			out_stop = len(foreground) if stop == num_frames else stop * hop_length - n_fft // 2
+			offset = n_fft // 2 - istft_first * hop_length
+			foreground[out_first:out_stop] = chunk_audio[out_first + offset:out_stop + offset]
+
+	if image_panels is not None:
+		image_panels = [np.concatenate(panel, axis=1) for panel in image_panels]
+	return (foreground, frame_max, image_panels, image_factor)
+
+# max across frequency of the magnitude spectrogram of the foreground audio at each time point, exactly as resynthesized_magnitude would give it, but transforming the audio chunk_len time points at a time
+def resynthesized_max(foreground, sr, chunk_len, n_fft=2048, hop_length=512):
+	wav_buffer = io.BytesIO()
+	sf.write(wav_buffer, foreground, sr, format="WAV")
+	wav_buffer.seek(0)
+	data, fs = sf.read(wav_buffer, dtype=np.dtype(audio_dtype()).name)
+	num_frames = 1 + len(data) // hop_length
+	data_padded = np.pad(data, n_fft // 2)
+	frame_max = np.zeros(num_frames)
+	for first in range(0, num_frames, chunk_len):
+		stop = min(num_frames, first + chunk_len)
+		frame_max[first:stop] = np.max(np.abs(stft_frames(data_padded, first, stop, n_fft=n_fft, hop_length=hop_length)), axis=0)
+	return frame_max
+
 # function that uses saved foreground audio from the diary_vad function to detect pause times in the diary
 # it uses a sliding window, with some threshold on the total summary (RMS) across all the bins in that window
 # optional arguments to change the threshold, the size of the window, and the amount moved each time step can be provided
@@ -158,109 +394,66 @@ def diary_pause_detect(study, OLID, spec_thres=0.03, window_sec=0.25, slide_sec=
 		return
 
 	cur_files.sort() # go in order, although can also always sort CSV later.
+	ledger_updates = []
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
 			continue
+		profile_diary("pause_detect", filename)
 
 		# now load the foreground audio
 		try:
-			data, fs = sf.read(filename)
+			data, fs = sf.read(filename, dtype=np.dtype(audio_dtype()).name)
 		except:
 			# ignore bad audio - will want to log this for pipeline
 			print(filename + " audio is broken, skipping")
+			ledger_updates.append((filename, "failed"))
 			continue 
 
-		# compute spectrogram
-		S_full, phase = librosa.magphase(librosa.stft(data))
-		num_timepoints = S_full.shape[1]
+		# foreground audio is saved at the rate librosa loaded it at, which may not match the rate of the original WAV the pause times will index into
+		# (legacy decryption left WAVs at 44.1 kHz, so this ratio is 2 for those, but it is 1 for WAVs decoded directly to the VAD rate)
+		try:
+			orig_fs = sf.info("../" + filename).samplerate
+		except:
+			print("original audio for " + filename + " is missing, skipping")
+			ledger_updates.append((filename, "failed"))
+			continue
+		sr_ratio = float(orig_fs) / fs
 
-		# figure out window length - need to adjust for how many samples go into a given spectrogram bin by default (not an optional setting)
+		# compute spectrogram and find the pauses in it
+		S_full, phase = librosa.magphase(librosa.stft(data))
 		samples_per_spec_bin = 512
-		window_len = int((float(fs)/samples_per_spec_bin) * window_sec)
-		slide_len = int((float(fs)/samples_per_spec_bin) * slide_sec)
-
-		# get max across frequency bins at each time point, then do RMS over the window size
-		diary_summary = []
-		for i in range(0, num_timepoints, slide_len):
-			window_max = []
-			for j in range(i, i+window_len):
-				try:
-					cur_time = S_full[:,j].flatten()
-				except:
-					continue # at very end of file will encounter a short window, so j index won't always exist in cur_time
-				cur_max = np.max(cur_time)
-				window_max.append(cur_max)
-			window_max = np.array(window_max)
-			cur_RMS = np.sqrt(np.mean(window_max**2))
-			diary_summary.append(cur_RMS)
-
-		# find indices that don't meet threshold
-		diary_summary = np.array(diary_summary)
-		low_indices = np.where(diary_summary < spec_thres)[0]
-
-		# each index will correspond to that point in range(0, num_timepoints, slide_len), convert it to actual pause indexes in the spectrogram instead
-		pause_indices = []
-		timepoints_list = list(range(0, num_timepoints, slide_len))
-		for ind in low_indices:
-			start_point = timepoints_list[ind]
-			pause_indices.extend(range(start_point, start_point+window_len))
-		pause_indices = list(set(pause_indices)) # remove duplicates
-		pause_indices.sort() # make sure pause indices are in ascending order
-
-		# check if there are no pauses, skip the current file if so to avoid code crashing
-		if len(pause_indices) == 0:
-			# no need to even print a message as that is covered by the QC function below
-			continue
+		pause_periods = detect_pauses(S_full, fs, spec_thres=spec_thres, window_sec=window_sec, slide_sec=slide_sec, samples_per_spec_bin=samples_per_spec_bin)
 
-		# now convert pause indices to be a list of lists where each internal list is a continuous set of indices
-		pause_periods = np.split(pause_indices, np.where(np.diff(pause_indices) != 1)[0]+1)
+		# no need to do anything else (or even print a message) if there are no pauses, as that is covered by the QC function below
+		ledger_updates.append((filename, "done"))
 
 		# finally use the pause list to add this diary's pauses to the lists for the df
-		cur_count = 1
-		for pause in pause_periods:
-			if len(pause) < 2:
-				# I don't think this should be possible to reach, but just in case avoid adding any pauses that are too short to list
-				continue
-			filenames.append(filename)
-			pause_ids.append(cur_count)
-			pause_starts.append(pause[0]*samples_per_spec_bin*2) # convert back to wav file index - double sample rate for original audio vs foreground, so also need to multiply by 2
-			pause_stops.append(pause[-1]*samples_per_spec_bin*2) # convert back to wav file index - double sample rate for original audio vs foreground, so also need to multiply by 2
-			# note for the stop conversion it is technically cutting the identified pause slightly short because it includes only the first true index of the final spectrogram bin
-			# however already did all testing with this setup, and it is quite a miniscule difference so going forward as is for the internal code. could switch in the release code
-			# (not to mention that if anything the pauses were extending a bit too long, so not concerned with extending further)
-			pause_lengths.append(len(pause)*samples_per_spec_bin/float(fs)) # account for spectrogram timepoint length in calculating pause time as well - can just use this file sample rate though as was calculated in this file
-			# note that pause length uses the number of spectrogram bins in the pause, so it includes the full indices of the final bin which are not reflected in the stop time
-			# therefore pause length is always ~23 ms longer than the file clipping for that pause will actually be - could somewhat add up over many pauses, but shouldn't matter much for our purposes
-			cur_count = cur_count + 1
+		add_pause_rows(df_vals, filename, pause_periods, fs, sr_ratio, samples_per_spec_bin=samples_per_spec_bin)
+	profile_diary("pause_detect", None)
 		
-	# once done looping through this patient's diaries compile DF of pause times across them
-	new_df = pd.DataFrame()
-	for i in range(len(df_cols)):
-		col = df_cols[i]
-		vals = df_vals[i]
-		new_df[col] = vals
-
-	# then save CSV
-	if os.path.isfile(pause_times_output_path): # concatenate first if necessary - this code only processes newest files, so can't just overwrite
-		old_df = pd.read_csv(pause_times_output_path)
-		join_csv = pd.concat([old_df, new_df])
-		join_csv.reset_index(drop=True, inplace=True)
-		join_csv.drop_duplicates(subset=["filename", "pause_number"],inplace=True) # drop any duplicates in case audio got decrypted a second time
-		join_csv.to_csv(pause_times_output_path,index=False)
-	else:
-		new_df.to_csv(pause_times_output_path,index=False)
+	# once done looping through this patient's diaries save CSV of pause times across them
+	save_pause_times(pause_times_output_path, df_cols, df_vals)
+	mark_stage(study, OLID, ledger_updates, "vad")
 
 	# then this function is complete
 	return
 
+# decibel level (relative to ref_rms) and mean spectral flatness of the pause-only audio for a diary, as saved in the pause-derived QC output - flatness is NaN if it can't be computed
+def pause_audio_metrics(pauses_only, ref_rms=float(2*(10**(-5)))):
+	pauses_rms = np.sqrt(np.mean(np.square(pauses_only)))
+	pause_only_db = 20 * np.log10(pauses_rms/ref_rms)
+	try:
+		pause_flatness = np.mean(librosa.feature.spectral_flatness(y=pauses_only))
+	except:
+		pause_flatness = np.nan
+	return (pause_only_db, pause_flatness)
+
 # function to use pause times for generation of various outputs for QC
 # includes spectrograms of pause-only and speech-only audios for each diary, a table of pause-derived QC metrics per diary, and filtered OpenSMILE outputs for each diary
-def diary_pause_qc(study, OLID):
+# the spectrogram images are queued for phone_audio_spectrograms.py to render, or skipped entirely if spectrograms is False
+def diary_pause_qc(study, OLID, spectrograms=True):
 	print("Using pause times to generate additional QC outputs from new phone audio for patient " + OLID)
 
-	# static setting for converting from rms to db later
-	ref_rms=float(2*(10**(-5)))
-
 	# setup for output df that will contain QC features (one row per file)
 	df_cols = ["OLID","filename","total_speech_minutes","number_of_pauses","max_pause_seconds","mean_pause_seconds","pause_db","pause_flatness"]
 	patients = []
@@ -291,10 +484,12 @@ def diary_pause_qc(study, OLID):
 		print("No new files for this patient, skipping") # should never reach this error if calling via pipeline
 		return
 
-	# now load pause times CSV and metadata summaries, also necessary
-	# pause times used for everything, metadata for OpenSMILE and spectrogram image file organization
+	# now check for pause times and load metadata summaries, also necessary
+	# pause times used for everything (loaded one diary at a time below), metadata for OpenSMILE and spectrogram image file organization
+	pause_times_path = "../" + study + "_" + OLID + "_phone_audioVAD_pauseTimesOutput.csv"
 	try:
-		pause_times = pd.read_csv("../" + study + "_" + OLID + "_phone_audioVAD_pauseTimesOutput.csv")
+		if not table_exists(pause_times_path):
+			raise FileNotFoundError(pause_times_path)
 		audio_metadata = pd.read_csv("../" + study + "_" + OLID + "_phone_audio_ETFileMap.csv")
 		study_metadata = pd.read_csv("/data/sbdp/PHOENIX/GENERAL/" + study + "/" + study + "_metadata.csv")
 		patient_metadata = study_metadata[study_metadata["Subject ID"] == OLID]
@@ -304,11 +499,20 @@ def diary_pause_qc(study, OLID):
 		print("No metadata and/or pause times for this patient yet") # should never reach this error if calling via pipeline
 		return
 
+	# skip files already finished in a previous run, and files that failed the pre-screen (those have no pause times or OpenSMILE output to work with)
+	already_done = completed_diaries(study, OLID, "pause_qc")
+	# also need VAD to be finished for a file before its pause-derived outputs can be computed
+	vad_done = completed_diaries(study, OLID, "vad")
+	ledger_updates = []
+
 	# can loop through decrypted files now to do actual computations
 	cur_files.sort() # go in order, although can also always sort CSV later.
 	for filename in cur_files:
 		if not filename.endswith(".wav"): # skip any non-audio files (and folders)
 			continue
+		if diary_name(filename) in already_done or diary_name(filename) not in vad_done:
+			continue
+		profile_diary("pause_qc", filename)
 
 		# get metadata/setup filepaths specific for this diary
 		diary_root = filename.split(".")[0]
@@ -328,6 +532,7 @@ def diary_pause_qc(study, OLID):
 			if os.path.isfile(os_filter_out_path):
 				# OpenSMILE filtering is the last part, so if already have this file none of the computation should need to be rerun on current diary, can skip to next
 				# should never reach this condition if running through pipeline, but added to help with addressing backlog, in case code gets interrupted
+				ledger_updates.append((filename, "done"))
 				continue
 		except:
 			# if can't find a filename, it means the audio was a secondary submission, won't save spectrograms or opensmile outputs here
@@ -336,19 +541,23 @@ def diary_pause_qc(study, OLID):
 			speech_image_out_path = ""
 			os_filter_out_path = ""
 
-		# now load the audio
+		# now load the audio - this is the last stage that uses it, so it can be dropped from the shared buffer afterwards
 		try:
-			data, fs = sf.read(filename)
+			data, fs = load_audio(filename, stage="pause_qc")
+			release_audio(filename)
 		except:
 			# ignore bad audio - will want to log this for pipeline
 			print(filename + " audio is broken, skipping")
+			ledger_updates.append((filename, "failed"))
 			continue 
+		# from here on the file counts as done unless the OpenSMILE filtering has a problem, as the other ways of stopping early don't change on a rerun
+		ledger_updates.append((filename, "done"))
 
 		# data will always be mono for audio diaries
 		chan1 = data.flatten()
 
-		# get corresponding pause times for this file
-		cur_pauses = pause_times[pause_times["filename"]==filename]
+		# get corresponding pause times for this file - only this diary's partition of the pause times is read
+		cur_pauses = load_partition(pause_times_path, "filename", filename)
 
 		# for now just skip over any file that didn't find pauses - but log this
 		if cur_pauses.empty:
@@ -373,93 +582,82 @@ def diary_pause_qc(study, OLID):
 		speech_lengths.append(speech_minutes)
 
 		# then do db of pause audio
-		# first will create an audio signal that is only the pause times concatenated
-		pauses_only = np.array([])
+		# first will create an audio signal that is only the pause times concatenated, by taking the samples marked in a pause mask all at once
+		# (in the numeric precision set in audio_buffer_functions - float64 by default, in line with the values this was originally computed from)
 		pause_starts = cur_pauses["pause_start_bin"].tolist()
 		pause_stops = cur_pauses["pause_stop_bin"].tolist()
-		for x in range(len(pause_starts)): # extend numpy array with the audio values from each pause
-			pauses_only = np.append(pauses_only, chan1[pause_starts[x]:pause_stops[x]])
-		pauses_rms = np.sqrt(np.mean(np.square(pauses_only)))
-		pause_only_db = 20 * np.log10(pauses_rms/ref_rms)
+		pause_mask = pause_sample_mask(len(chan1), pause_starts, pause_stops)
+		pauses_only = chan1[pause_mask].astype(audio_dtype())
+		# then the decibel level and mean spectral flatness of this pause-only audio
+		pause_only_db, pause_flatness = pause_audio_metrics(pauses_only)
 		pause_dbs.append(pause_only_db)
-
-		# finally add the mean spectral flatness of this pause-only audio
-		try:
-			pause_spec_flat = librosa.feature.spectral_flatness(y=pauses_only)
-			pause_flatnesses.append(np.mean(pause_spec_flat))
-		except:
-			pause_flatnesses.append(np.nan)
+		pause_flatnesses.append(pause_flatness)
 
 		# now done with pause-derived QC calculations for this file, move on to the other outputs that need to be calculated
 		if pause_image_out_path == "":
 			# nothing else to do with this file if don't have a day-based filename
 			continue
 
-		# need speech only signal as well to save that spectrogram
-		speech_only = np.array([])
-		speech_start = [0]
-		for t in pause_stops:
-			speech_start.append(t)
-		speech_stop = []
-		for t in pause_starts:
-			speech_stop.append(t)
-		speech_stop.append(len(chan1)-1)
-		for x in range(len(speech_start)):
-			speech_only = np.append(speech_only, chan1[speech_start[x]:speech_stop[x]])
-
-		# compute spectrogram of pause signal
-		try:
-			S_full_pause, phase_pause = librosa.magphase(librosa.stft(pauses_only))
-		except:
-			print("pause is too short to create a spectrogram for file (" + filename + "), skipping pause/speech spectrograms and OpenSMILE filtering")
-			continue
-		# plot it
-		plt.figure()
-		librosa.display.specshow(librosa.amplitude_to_db(S_full_pause, ref=np.max), y_axis='log', sr=fs)
-		plt.title('Pause times spectrum')
-		plt.colorbar()
-		plt.tight_layout()
-		plt.savefig(pause_image_out_path)
-		plt.close()
-
-		# now same for speech
-		try:
-			S_full_speech, phase_speech = librosa.magphase(librosa.stft(speech_only))
-		except:
-			# has to be pause times to get to this point, but never checking that there is speech until now
-			# need to do so to prevent function from crashing without processing this patient's other files
-			print("no speech in file (" + filename + "), skipping speech spectrogram and OpenSMILE filtering")
-			continue
-		plt.figure()
-		librosa.display.specshow(librosa.amplitude_to_db(S_full_speech, ref=np.max), y_axis='log', sr=fs)
-		plt.title('Speech times spectrum')
-		plt.colorbar()
-		plt.tight_layout()
-		plt.savefig(speech_image_out_path)
-		plt.close()
+		# spectrograms of the pause and speech signals are queued to be rendered after VAD
+		# (when skipping them, there is no need to build the speech signal or compute either spectrogram at all)
+		if spectrograms:
+			# need speech only signal as well to save that spectrogram - everything outside the pause mask, except for the very last sample (as the speech segments always ended at len-1)
+			speech_mask = ~pause_mask
+			if len(speech_mask) > 0:
+				speech_mask[-1] = False
+			speech_only = chan1[speech_mask].astype(audio_dtype())
+
+			# compute spectrogram of pause signal
+			try:
+				S_full_pause, phase_pause = librosa.magphase(librosa.stft(pauses_only))
+			except:
+				print("pause is too short to create a spectrogram for file (" + filename + "), skipping pause/speech spectrograms and OpenSMILE filtering")
+				continue
+			queue_spectrogram("../spectrogram_queue", pause_image_out_path, [("Pause times spectrum", S_full_pause, None)], fs)
+
+			# now same for speech
+			try:
+				S_full_speech, phase_speech = librosa.magphase(librosa.stft(speech_only))
+			except:
+				# has to be pause times to get to this point, but never checking that there is speech until now
+				# need to do so to prevent function from crashing without processing this patient's other files
+				print("no speech in file (" + filename + "), skipping speech spectrogram and OpenSMILE filtering")
+				continue
+			queue_spectrogram("../spectrogram_queue", speech_image_out_path, [("Speech times spectrum", S_full_speech, None)], fs)
+		else:
+			# without the spectrograms, still skip OpenSMILE filtering for the diaries whose spectrograms would have failed above (no pause or no speech audio), as always
+			if len(pauses_only) == 0:
+				print("pause is too short to create a spectrogram for file (" + filename + "), skipping OpenSMILE filtering")
+				continue
+			if np.count_nonzero(~pause_mask[:-1]) == 0:
+				print("no speech in file (" + filename + "), skipping OpenSMILE filtering")
+				continue
 
 		# last portion is filtering OpenSMILE results
-		raw_os_path = "../opensmile_feature_extraction/" + diary_root + ".csv"
-		if not os.path.isfile(raw_os_path): # if relying on just the VAD module, it is possible OpenSMILE results won't exist, so handle that
+		# (the in process OpenSMILE engine saves a binary version as well as or instead of the CSV, load_lld reads whichever is there)
+		raw_os_path = "../opensmile_feature_extraction/" + diary_root
+		if not lld_exists(raw_os_path): # if relying on just the VAD module, it is possible OpenSMILE results won't exist, so handle that
 			print("no OpenSMILE results yet for this file (" + diary_root + ")") # should never reach this if called from main pipeline however
+			ledger_updates[-1] = (filename, "failed")
 			continue
 		try:
-			raw_os_result = pd.read_csv(raw_os_path,sep=';')
+			raw_os_result = load_lld(raw_os_path)
 		except:
 			print("OpenSMILE results for this file (" + diary_root + ") are corrupted or empty")
+			ledger_updates[-1] = (filename, "failed")
 			continue
 		os_start_times = raw_os_result["frameTime"].tolist() # list of the start times for each 10 ms bin of the audio file, provided in seconds
-		os_stop_times = [t + 0.01 for t in os_start_times] # stop times will always be 10 ms later
-		raw_os_result["frameStop"] = os_stop_times
 		pause_start_times = [b/float(fs) for b in pause_starts] # convert the pause start (and then stop) bin numbers to times in seconds
 		pause_stop_times = [b/float(fs) for b in pause_stops]
-		# nan out only those OS rows that have start and stop time both fall into one of the pause bins
-		for p_start,p_stop in zip(pause_start_times, pause_stop_times): # do for each pause period independently
-			raw_os_result.loc[(raw_os_result["frameTime"] >= p_start) & (raw_os_result["frameStop"] <= p_stop)] = np.nan # nan out all entries in matching df slice
+		# take only the features of interest, and nan out only those OS rows that have start and stop time (10 ms later) both fall into one of the pause bins
+		# matching frames to pauses is done for all pauses at once by a sorted search, see frame_filter_functions.py
+		in_pause = pause_frame_mask(raw_os_result, pause_start_times, pause_stop_times, time_col="frameTime", frame_length=0.01)
+		raw_os_result = raw_os_result[OS_features].copy()
+		raw_os_result.loc[in_pause] = np.nan
 		# final df cleanup and save
-		raw_os_result = raw_os_result[OS_features] # take only the features of interest
 		raw_os_result["frameTime"] = os_start_times # add back the frame start times (want it to exist even in the NaN rows!)
 		raw_os_result.to_csv(os_filter_out_path, index=False)
+	profile_diary("pause_qc", None)
 		
 	# once done looping through this patient's diaries compile DF of pause-derived QC metrics across them and save to CSV
 	new_df = pd.DataFrame()
@@ -468,15 +666,9 @@ def diary_pause_qc(study, OLID):
 		vals = df_vals[i]
 		new_df[col] = vals
 
-	# now save CSV
-	if os.path.isfile(pause_qc_output_path): # concatenate first if necessary - this code only processes newest files, so can't just overwrite
-		old_df = pd.read_csv(pause_qc_output_path)
-		join_csv = pd.concat([old_df, new_df])
-		join_csv.reset_index(drop=True, inplace=True)
-		join_csv.drop_duplicates(subset=["OLID", "filename"],inplace=True) # drop any duplicates in case audio got decrypted a second time
-		join_csv.to_csv(pause_qc_output_path,index=False)
-	else:
-		new_df.to_csv(pause_qc_output_path,index=False)
+	# now save - this code only processes newest files, so only those rows are written to the feature store (replacing any for the same file, in case audio got decrypted a second time), and the CSV is kept up to date
+	upsert_rows(pause_qc_output_path, new_df, ["OLID", "filename"])
+	mark_stage(study, OLID, ledger_updates, "pause_qc")
 
 	# then this function is complete
 	return
@@ -484,8 +676,65 @@ def diary_pause_qc(study, OLID):
 # run VAD functions when this file is called as a script on command line
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
-    diary_vad(sys.argv[1], sys.argv[2])
+    # study and OLID are positional, all the other settings are named options (see run_vad.sh, which passes each under the same name as its setting variable) so they can't shift if one is added or removed
+    parser = argparse.ArgumentParser(description="runs VAD, pause detection, and pause-derived QC (and optionally audio QC and OpenSMILE first) on a participant's newly decrypted diaries")
+    parser.add_argument("study")
+    parser.add_argument("OLID")
+    parser.add_argument("--vad_with_qc", choices=["Y", "N"], default="N", help="Y runs audio QC first in the same process, so each diary is decoded only once across QC, VAD, and pause-derived QC")
+    parser.add_argument("--audio_buffer_mb", type=float, default=None, help="memory budget (in MB) for the shared decoded audio buffer")
+    parser.add_argument("--vad_fused", choices=["Y", "N"], default="Y", help="Y detects pauses within VAD on the in-memory foreground")
+    parser.add_argument("--vad_save_foreground", choices=["Y", "N"], default=None, help="Y still saves the foreground audio in fused mode (always saved otherwise)")
+    parser.add_argument("--vad_pause_spectrogram", choices=["resynthesized", "foreground"], default="resynthesized", help="spectrogram pauses are detected on in fused mode")
+    parser.add_argument("--vad_nn_engine", choices=sorted(nn_filter_engines.keys()), default="librosa", help="nearest neighbor filter engine for VAD")
+    parser.add_argument("--vad_with_opensmile", choices=["Y", "N"], default="N", help="Y runs OpenSMILE in process (opensmile python package) after audio QC, on the same decoded audio")
+    parser.add_argument("--opensmile_save_csv", choices=["Y", "N"], default="Y", help="N skips also saving the in process OpenSMILE CSV")
+    parser.add_argument("--vad_spectrograms", choices=["Y", "N"], default="Y", help="N skips the spectrogram images, otherwise they are queued for phone_audio_spectrograms.py to render")
+    parser.add_argument("--vad_backend", choices=["separation"] + sorted(vad_backends.keys()), default="separation", help="separation, or one of the lightweight backends (which always detect pauses within VAD)")
+    parser.add_argument("--vad_chunk_sec", type=float, default=0, help="above 0 runs the separation in chunks of that many seconds, to bound memory use on very long diaries")
+    parser.add_argument("--audio_dtype", choices=["float64", "float32"], default="float64", help="numeric precision for the audio stages")
+    parser.add_argument("--profile_stages", choices=["Y", "N"], default="N", help="Y records the time and peak memory per diary for each stage, appended to the patient's stage profile CSV")
+    args = parser.parse_args()
+
+    run_qc = (args.vad_with_qc == "Y")
+    if args.audio_buffer_mb is not None:
+        set_buffer_budget(args.audio_buffer_mb)
+    fused_inp = (args.vad_fused == "Y")
+    save_foreground_inp = (args.vad_save_foreground == "Y") if args.vad_save_foreground is not None else not fused_inp
+    pause_spectrogram_inp = args.vad_pause_spectrogram
+    nn_engine_inp = args.vad_nn_engine
+    run_opensmile = (args.vad_with_opensmile == "Y")
+    opensmile_csv_inp = (args.opensmile_save_csv != "N")
+    spectrograms_inp = (args.vad_spectrograms != "N")
+    vad_backend_inp = args.vad_backend
+    chunk_sec_inp = args.vad_chunk_sec
+    set_audio_dtype(args.audio_dtype)
+    if args.profile_stages == "Y":
+        enable_profiling(label=np.dtype(audio_dtype()).name)
+    if vad_backend_inp != "separation":
+        fused_inp = True
+    stage_times = []
+    if run_qc:
+        start_time = time.time()
+        diary_qc(args.study, args.OLID)
+        stage_times.append(("Audio QC", time.time() - start_time))
+    if run_opensmile:
+        start_time = time.time()
+        diary_opensmile(args.study, args.OLID, save_csv=opensmile_csv_inp)
+        stage_times.append(("OpenSMILE", time.time() - start_time))
+    start_time = time.time()
+    diary_vad(args.study, args.OLID, fused=fused_inp, save_foreground=save_foreground_inp, pause_spectrogram=pause_spectrogram_inp, nn_engine=nn_engine_inp, spectrograms=spectrograms_inp, vad_backend=vad_backend_inp, chunk_sec=chunk_sec_inp)
+    stage_times.append(("VAD", time.time() - start_time))
     # in this case have the file run multiple functions that are defined here, as VAD, pause detection, and pause-derived QC + OS are all separate functions
-    diary_pause_detect(sys.argv[1], sys.argv[2])
+    # (pause detection is already done by diary_vad in fused mode)
+    if not fused_inp:
+        start_time = time.time()
+        diary_pause_detect(args.study, args.OLID)
+        stage_times.append(("Pause detection", time.time() - start_time))
     # note these functions need to be run in order if importing them elsewhere
-    diary_pause_qc(sys.argv[1], sys.argv[2])
+    start_time = time.time()
+    diary_pause_qc(args.study, args.OLID, spectrograms=spectrograms_inp)
+    stage_times.append(("Pause-derived QC", time.time() - start_time))
+    for stage, seconds in stage_times:
+        print(stage + " took " + str(round(seconds, 2)) + " seconds")
+    report_buffer_stats()
+    save_profile("/data/sbdp/PHOENIX/PROTECTED/" + args.study + "/" + args.OLID + "/phone/processed/audio/" + args.study + "_" + args.OLID + "_phone_audio_stage_profile.csv")
@@ -1,127 +1,158 @@
 #!/usr/bin/env python
 
-import pysftp
 import os
 import sys
 
+from sftp_session_functions import TRANSCRIBEME_HOST
+from sftp_transfer_functions import open_transfer_pool, run_transfers, close_transfer_pool, transfer_summary
+
 # make sure if paramiko throws an error it will get mentioned in log files
 import logging
 logging.basicConfig()
 
-def transcript_pull(study, OLID, password, pipeline=False, lab_email_path=None):
-	# track transcripts that got properly pulled this time, for use in cleaning up server later
-	successful_transcripts = []
+# name of the file (in the participant's phone/processed/audio folder) that server cleanup warnings are written to when called via pipeline, for the wrapping bash script to move into that participant's section of the email
+CLEANUP_WARNING_NAME = "transcribeme_cleanup_warning.txt"
 
-	# hardcode the basic properties for the transcription service, password is only sftp-related input for now
+# pulls the transcripts available on TranscribeMe for the pending_audio of every participant in the study, then cleans up the server for those pulled
+# transfers run num_channels at a time over separate SFTP sessions (see sftp_transfer_functions.py), with their combined rate capped at bandwidth_mb MB per second if given
+# patients can be given as a list of participant IDs to pull just those, and host and port can be changed from the TranscribeMe server for testing, along with root
+def study_transcript_pull(study, password, pipeline=False, patients=None, num_channels=4, bandwidth_mb=None, host=TRANSCRIBEME_HOST, port=22, root="/data/sbdp/PHOENIX/PROTECTED"):
+	# hardcode the basic properties for the transcription service
 	source_directory = "output" # need to ensure transcribeme is actually putting .txt files into the top level output directory as they are done, consistently!
-	host = "sftp.transcribeme.com"
-	username = "partners_itp"
+	input_directory = "audio"
+	archive_name = study + "_archive"
+	archive_folder = os.path.join(source_directory, archive_name) # archive subfolder of output on their server (organized by study), which pulled transcripts are moved into
+
+	if patients is None:
+		patients = sorted(os.listdir(os.path.join(root, study)))
+
+	# gather the pending audio for all participants up front, so the pulls can be spread over the channels regardless of which participant they are from
+	pending = []
+	for OLID in patients:
+		directory = os.path.join(root, study, OLID, "phone/processed/audio/pending_audio")
+		if not os.path.isdir(directory):
+			continue
+		cur_pending = sorted(os.listdir(directory))
+		if len(cur_pending) == 0:
+			continue
+		if not os.path.isdir(os.path.join(root, study, OLID, "phone/processed/audio/transcripts")):
+			os.mkdir(os.path.join(root, study, OLID, "phone/processed/audio/transcripts"))
+		for filename in cur_pending:
+			pending.append((OLID, filename))
+	if len(pending) == 0:
+		print("No pending audio to check for study " + study)
+		return
 
-	# /data/sbdp/PHOENIX/PROTECTED is also hardcoded pretty much throughout this pipeline - will want to replace with "data_root" variable for future release?
-	directory = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID, "phone/processed/audio/pending_audio")
-	os.chdir(directory) # if this is called by pipeline or even the modular wrapping bash script the directory will definitely exist, so no need to try/catch here
+	try:
+		pool_state = open_transfer_pool(password, host=host, port=port, num_channels=num_channels, bandwidth_mb=bandwidth_mb)
+	except Exception as e:
+		# nothing pulled, so all audio stays pending for the next run
+		print("Could not connect to TranscribeMe (" + str(e) + "), no transcripts pulled")
+		return
+
+	# list the output folder once, instead of trying to download every pending transcript to find out which are done
+	# if the listing fails, fall back to trying them all - any that aren't available yet will just fail
+	listing = run_transfers(pool_state, [{"operation": "listdir", "args": (source_directory,)}], label="listing")[0]
+	available = set(listing["value"]) if listing["success"] else None
 
-	# loop through files in pending, trying to pull corresponding txt files that are in the transcribeme output folder
-	cur_pending = os.listdir(".")
-	for filename in cur_pending:
-		# setup expected source filepath and desired destination filepath
+	# setup expected source filepath and desired destination filepath for each pending audio's transcript
+	tasks = []
+	task_files = []
+	for OLID, filename in pending:
 		rootname = filename.split(".")[0]
 		transname = rootname + ".txt"
-		src_path = os.path.join(source_directory, transname)
-		local_path = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID, "phone/processed/audio/transcripts", transname)
-		# now actually attempt the pull. will hit the except in all cases where the transcript isn't available yet, but don't want that to crash rest of code obviously
-		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.get(src_path, local_path)
-			successful_transcripts.append(transname) # if we reach this line it means transcript has been successfully pulled onto PHOENIX
-			# this audio is no longer pending then, decrypted copy should be deleted from briefcase
-			if pipeline:
-				pending_rename = "done+" + filename # + not used in transcript names, so will make it easy to separate prepended info back out
-				os.rename(filename,pending_rename) # if part of pipeline will just temporarily rename with prepended code, parent script will use this to generate email and then delete
-			else:
-				os.remove(filename) # remove immediately if not part of pipeline
-		except:
-			# nothing to do here, most likely need to just keep waiting on this transcript
+		if available is not None and transname not in available:
+			continue # most likely need to just keep waiting on this transcript
+		local_path = os.path.join(root, study, OLID, "phone/processed/audio/transcripts", transname)
+		tasks.append({"operation": "get", "args": (os.path.join(source_directory, transname), local_path)})
+		task_files.append((OLID, filename, transname, local_path))
+	results = run_transfers(pool_state, tasks, label="download")
+	print(transfer_summary(pool_state))
+
+	# track transcripts that got properly pulled this time, for use in cleaning up server later
+	successful_transcripts = []
+	num_pulled = {}
+	for (OLID, filename, transname, local_path), result in zip(task_files, results):
+		if not result["success"]:
 			# in future could look into detecting types of connection errors, perhaps not always assuming a miss means not transcribed yet
 			# even the current email alerts should make other issues easy to catch over time though, so not a big priority
 			try:
 				# if connection fails though, it may create an empty txt file, remove that to avoid confusion
 				os.remove(local_path)
 			except:
-				pass 
+				pass
+			continue
+		successful_transcripts.append((OLID, transname)) # if we reach this line it means transcript has been successfully pulled onto PHOENIX
+		num_pulled[OLID] = num_pulled.get(OLID, 0) + 1
+		# this audio is no longer pending then, decrypted copy should be deleted from briefcase
+		pending_path = os.path.join(root, study, OLID, "phone/processed/audio/pending_audio", filename)
+		if pipeline:
+			pending_rename = "done+" + filename # + not used in transcript names, so will make it easy to separate prepended info back out
+			os.rename(pending_path, os.path.join(os.path.dirname(pending_path), pending_rename)) # if part of pipeline will just temporarily rename with prepended code, parent script will use this to generate email and then delete
+		else:
+			os.remove(pending_path) # remove immediately if not part of pipeline
 
 	# log some very basic info about success of script
-	print("(" + str(len(successful_transcripts)) + " total transcripts pulled)")
+	for OLID in sorted(set([p[0] for p in pending])):
+		print(OLID + ": (" + str(num_pulled.get(OLID, 0)) + " total transcripts pulled)")
 
 	# now do cleanup on trancribeme server for those transcripts successfully pulled
-	input_directory = "audio"
-	prev_problem = False # for preventing repetitive warning going into the email
-	for transcript in successful_transcripts:
-		# will remove decrypted audio from TranscribeMe's server, as they do not need it anymore
-		match_name = transcript.split(".")[0] 
-		match_audio = match_name + ".wav"
-		remove_path = os.path.join(input_directory, match_audio)
-		# will also move the pulled transcript into an archive subfolder of output on their server (organized by study)
-		cur_path = os.path.join(source_directory, transcript)
-		archive_name = study + "_archive"
-		archive_path = os.path.join(source_directory, archive_name, transcript)
-		archive_folder = os.path.join(source_directory, archive_name) # also need just the folder path so it can be made if doesn't exist yet
-		# actually connect to server to do the updates for current transcript
-		# (note it hasn't been a problem previously to establish new connection each time - 
-		#  but in future may want to refactor so only need to establish connection once per patient instead of per file)
-		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.remove(remove_path) 
-		except:
+	if len(successful_transcripts) > 0:
+		# make the archive folder first if it doesn't exist yet (if the listing failed, just try - failing because it already exists is fine)
+		if available is None or archive_name not in available:
+			run_transfers(pool_state, [{"operation": "mkdir", "args": (archive_folder,)}], label="archive folder")
+		cleanup_tasks = []
+		for OLID, transcript in successful_transcripts:
+			# will remove decrypted audio from TranscribeMe's server, as they do not need it anymore
+			match_audio = transcript.split(".")[0] + ".wav"
+			cleanup_tasks.append({"operation": "remove", "args": (os.path.join(input_directory, match_audio),)})
+			# will also move the pulled transcript into the archive subfolder
+			# split apart the deleting and the moving to archive so one can still happen without the other!
+			cleanup_tasks.append({"operation": "rename", "args": (os.path.join(source_directory, transcript), os.path.join(archive_folder, transcript))})
+		cleanup_results = run_transfers(pool_state, cleanup_tasks, label="server cleanup")
+		warned = set() # for preventing repetitive warning going into the email
+		for i, (task, result) in enumerate(zip(cleanup_tasks, cleanup_results)):
+			if result["success"]:
+				continue
+			OLID, transcript = successful_transcripts[i // 2] # two cleanup tasks per transcript
 			# expect failures here to be rare (if generic connection problems successful_transcripts would likely be empty)
-			print("Error cleaning up TranscribeMe server (audio deletion), please check on file " + match_name)
-			# also add a related warning in this patient's section of email file if this was called via pipeline - but just make it a generic one liner
-			if pipeline and not prev_problem:
-				with open(lab_email_path, 'a') as f:
+			print("Error cleaning up TranscribeMe server (" + ("audio deletion" if task["operation"] == "remove" else "txt archive") + "), please check on file " + transcript.split(".")[0])
+			# also add a related warning for this patient's section of email file if this was called via pipeline - but just make it a generic one liner
+			if pipeline and OLID not in warned:
+				with open(os.path.join(root, study, OLID, "phone/processed/audio", CLEANUP_WARNING_NAME), 'a') as f:
 					# not a particularly urgent problem, but could go unnoticed for a long time if not notified, and best practice is to minimize number of copies/locations with decrypted audio
 					warning_text = "[May have encountered a problem cleaning up completed audios for " + OLID + " on TranscribeMe server, please review manually]"
 					f.write("\n") # add a blank line before the warning
 					f.write(warning_text)
 					f.write("\n") # and add a blank line after
+				warned.add(OLID) # now that it's been added no need to add again if another problem arises
+		print(transfer_summary(pool_state))
 
-				prev_problem = True # now that it's been added no need to add again if another problem arises
-		# split apart the deleting and the moving to archive so one can still happen without the other!
-		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				if not sftp.exists(archive_folder):
-					sftp.mkdir(archive_folder)
-				sftp.rename(cur_path, archive_path)
-		except:
-			# expect failures here to be rare (if generic connection problems successful_transcripts would likely be empty)
-			print("Error cleaning up TranscribeMe server (txt archive), please check on file " + match_name)
-			# also add a related warning in this patient's section of email file if this was called via pipeline - but just make it a generic one liner
-			if pipeline and not prev_problem:
-				with open(lab_email_path, 'a') as f:
-					# not a particularly urgent problem, but could go unnoticed for a long time if not notified, and best practice is to minimize number of copies/locations with decrypted audio
-					warning_text = "[May have encountered a problem cleaning up completed audios for " + OLID + " on TranscribeMe server, please review manually]"
-					f.write("\n") # add a blank line before the warning
-					f.write(warning_text)
-					f.write("\n") # and add a blank line after
+	close_transfer_pool(pool_state)
 
-				prev_problem = True # now that it's been added no need to add again if another problem arises
+# pulls the transcripts available on TranscribeMe for the participant's pending_audio, then cleans up the server for those pulled - see study_transcript_pull
+def transcript_pull(study, OLID, password, pipeline=False, num_channels=4, bandwidth_mb=None, host=TRANSCRIBEME_HOST, port=22, root="/data/sbdp/PHOENIX/PROTECTED"):
+	study_transcript_pull(study, password, pipeline=pipeline, patients=[OLID], num_channels=num_channels, bandwidth_mb=bandwidth_mb, host=host, port=port, root=root)
 
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
+	# second argument is the participant to pull for, or all to pull for every participant in the study
 	try:
-		if sys.argv[4] == "Y":
-			# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion
-			transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3], pipeline=True, lab_email_path=sys.argv[5])
-			# should always expect a 5th argument if here, as that means coming from pipeline. otherwise no need to even enter the lab_email_path setting
-		else:
-			# otherwise just deleting the audio immediately
-			transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3])
+		# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion
+		pipeline_inp = sys.argv[4] == "Y"
 	except:
 		# if pipeline argument never even provided just want to ignore, not crash
-		transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3])
-    
\ No newline at end of file
+		pipeline_inp = False
+	# optional number of concurrent SFTP channels and bandwidth cap (MB per second, 0 for no cap)
+	try:
+		channels_inp = int(sys.argv[5])
+	except:
+		channels_inp = 4
+	try:
+		bandwidth_inp = float(sys.argv[6]) if float(sys.argv[6]) > 0 else None
+	except:
+		bandwidth_inp = None
+	if sys.argv[2] == "all":
+		study_transcript_pull(sys.argv[1], sys.argv[3], pipeline=pipeline_inp, num_channels=channels_inp, bandwidth_mb=bandwidth_inp)
+	else:
+		transcript_pull(sys.argv[1], sys.argv[2], sys.argv[3], pipeline=pipeline_inp, num_channels=channels_inp, bandwidth_mb=bandwidth_inp)
@@ -1,75 +1,97 @@
 #!/usr/bin/env python
 
-import pysftp
 import os
 import shutil
 import sys
 
+from sftp_session_functions import TRANSCRIBEME_HOST
+from sftp_transfer_functions import open_transfer_pool, run_transfers, close_transfer_pool, transfer_summary
+
 # make sure if paramiko throws an error it will get mentioned in log files
 import logging
 logging.basicConfig()
 
-def transcript_push(study, OLID, password, pipeline=False):
-	# currently only expect this to be called from wrapping bash script (possibly via main pipeline), so means there definitely will be some audio to push for this OLID
-	print("Pushing transcripts for participant " + OLID)
-	# print statement useful here because the process can be slow, will give user an idea of how far along we are
-
-	# initialize list to keep track of which audio files will need to be moved at end of patient run
-	push_list = []
+# pushes the WAV files in the to_send folder of every participant in the study to TranscribeMe, moving each one uploaded to pending_audio
+# uploads run num_channels at a time over separate SFTP sessions (see sftp_transfer_functions.py), each only reconnecting if its connection drops, with their combined rate capped at bandwidth_mb MB per second if given
+# patients can be given as a list of participant IDs to push just those, and host and port can be changed from the TranscribeMe server for testing, along with root
+def study_transcript_push(study, password, pipeline=False, patients=None, num_channels=4, bandwidth_mb=None, host=TRANSCRIBEME_HOST, port=22, root="/data/sbdp/PHOENIX/PROTECTED"):
+	if patients is None:
+		patients = sorted(os.listdir(os.path.join(root, study)))
 
-	# hardcode the basic properties for the transcription service, password is only sftp-related input for now
+	# gather the uploads for all participants up front, so they can be spread over the channels regardless of which participant they are from
+	# source filepath is the full path to the WAV, destination is the audio folder of the TranscribeMe server
 	destination_directory = "audio"
-	host = "sftp.transcribeme.com"
-	username = "partners_itp"
-
-	# /data/sbdp/PHOENIX/PROTECTED is also hardcoded pretty much throughout this pipeline - will want to replace with "data_root" variable for future release?
-	directory = os.path.join("/data/sbdp/PHOENIX/PROTECTED", study, OLID, "phone/processed/audio/to_send")
-	os.chdir(directory) # if this is called by pipeline or even the modular wrapping bash script the directory will definitely exist, so no need to try/catch here
-	
-	# loop through the WAV files in to_send, push them to TranscribeMe
-	for filename in os.listdir("."):
-		if not filename.endswith(".wav"):
+	tasks = []
+	task_files = []
+	for OLID in patients:
+		directory = os.path.join(root, study, OLID, "phone/processed/audio/to_send")
+		if not os.path.isdir(directory):
 			continue
-		
-		# source filepath is just filename, setup desired destination path
-		dest_path = os.path.join(destination_directory, filename)
+		cur_files = sorted([f for f in os.listdir(directory) if f.endswith(".wav")])
+		if len(cur_files) > 0:
+			print("Pushing " + str(len(cur_files)) + " transcripts for participant " + OLID)
+		for filename in cur_files:
+			tasks.append({"operation": "put", "args": (os.path.join(directory, filename), os.path.join(destination_directory, filename))})
+			task_files.append((OLID, filename))
+	if len(tasks) == 0:
+		print("No audio to push for study " + study)
+		return
 
-		# now actually attempt the push - should work unless there is an unexpected error, but of course will catch those so entire script doesn't fail
-		try:
-			cnopts = pysftp.CnOpts()
-			cnopts.hostkeys = None # ignore hostkey
-			with pysftp.Connection(host, username=username, password=password, cnopts=cnopts) as sftp:
-				sftp.put(filename, dest_path)
-			push_list.append(filename) # if get to this point push was successful, add to list
-		except:
-			# any files that had problem with push will still be in to_send after this script runs, so can just pass here
-			# in future may try to catch specific types of errors to identify when the problem is incorrect login info versus something else 
-			# (in the past have run out of storage space in the input folder, not sure if that specific issue could be caught by the python errors though)
-			pass 
+	# now actually attempt the pushes - should work unless there is an unexpected error, but of course will catch those so entire script doesn't fail
+	try:
+		pool_state = open_transfer_pool(password, host=host, port=port, num_channels=num_channels, bandwidth_mb=bandwidth_mb)
+	except Exception as e:
+		# all files will still be in to_send after this script runs, for the wrapping bash script to warn about
+		print("Could not connect to TranscribeMe (" + str(e) + "), no files pushed")
+		return
+	results = run_transfers(pool_state, tasks, label="upload")
+	close_transfer_pool(pool_state)
 
 	# now move all the successfully uploaded files from to_send to pending_audio
-	# if this was called via pipeline, also prepend "new-" to name as a temporary marker for email alert generation
-	for filename in push_list:
+	# if this was called via pipeline, also prepend "new+" to name as a temporary marker for email alert generation
+	for (OLID, filename), result in zip(task_files, results):
+		if not result["success"]:
+			# any files that had problem with push will still be in to_send after this script runs, so can just note it here
+			# in future may try to catch specific types of errors to identify when the problem is incorrect login info versus something else 
+			# (in the past have run out of storage space in the input folder, not sure if that specific issue could be caught by the python errors though)
+			print("Problem pushing " + filename + " for " + OLID + " (" + result["error"] + "), leaving it in to_send")
+			continue
+		print("Pushed " + filename + " (" + str(round(result["bytes"] / 1048576.0, 2)) + " MB in " + str(round(result["seconds"], 2)) + " seconds, " + str(round(result["bytes"] / 1048576.0 / max(result["seconds"], 1e-6), 2)) + " MB/s)")
+		directory = os.path.join(root, study, OLID, "phone/processed/audio")
 		# get path to move to in the different cases
 		if pipeline:
 			new_name = "new+" + filename # + not used in transcript names, so will make it easy to separate prepended info back out
 			# switched from - to + to avoid causing issues when the day number is negative 
 			# (although that shouldn't happen in theory it can in practice - email alerts can help with catching this)
-			new_path = "../pending_audio/" + new_name
 		else:
-			new_path = "../pending_audio/" + filename
+			new_name = filename
 		# move the file
-		shutil.move(filename, new_path)
+		shutil.move(os.path.join(directory, "to_send", filename), os.path.join(directory, "pending_audio", new_name))
+
+	print(transfer_summary(pool_state))
+
+# pushes the WAV files in the participant's to_send folder to TranscribeMe, moving each one uploaded to pending_audio - see study_transcript_push
+def transcript_push(study, OLID, password, pipeline=False, num_channels=4, bandwidth_mb=None, host=TRANSCRIBEME_HOST, port=22, root="/data/sbdp/PHOENIX/PROTECTED"):
+	study_transcript_push(study, password, pipeline=pipeline, patients=[OLID], num_channels=num_channels, bandwidth_mb=bandwidth_mb, host=host, port=port, root=root)
 
 if __name__ == '__main__':
 	# Map command line arguments to function arguments.
+	# second argument is the participant to push, or all to push every participant in the study
 	try:
-		if sys.argv[4] == "Y":
-			# if called from main pipeline want to just rename the pulled files in pending_audio here, so email script can use it before deletion
-			transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], pipeline=True)
-		else:
-			# otherwise just deleting the audio immediately
-			transcript_push(sys.argv[1], sys.argv[2], sys.argv[3])
+		pipeline_inp = sys.argv[4] == "Y" # if called from main pipeline want to rename the pushed files in pending_audio, so email script can use them
 	except:
 		# if pipeline argument never even provided just want to ignore, not crash
-		transcript_push(sys.argv[1], sys.argv[2], sys.argv[3])
+		pipeline_inp = False
+	# optional number of concurrent SFTP channels and bandwidth cap (MB per second, 0 for no cap)
+	try:
+		channels_inp = int(sys.argv[5])
+	except:
+		channels_inp = 4
+	try:
+		bandwidth_inp = float(sys.argv[6]) if float(sys.argv[6]) > 0 else None
+	except:
+		bandwidth_inp = None
+	if sys.argv[2] == "all":
+		study_transcript_push(sys.argv[1], sys.argv[3], pipeline=pipeline_inp, num_channels=channels_inp, bandwidth_mb=bandwidth_inp)
+	else:
+		transcript_push(sys.argv[1], sys.argv[2], sys.argv[3], pipeline=pipeline_inp, num_channels=channels_inp, bandwidth_mb=bandwidth_inp)
@@ -8,6 +8,7 @@ import sys
 import glob
 # import helper functions to calculate the features within each transcript and save a summary
 from language_feature_functions import count_number_syllables, calculate_speaking_rate, calculate_wordtovec_transcript, calculate_sentiment, count_keywords, summarize_transcript_stats
+from feature_store_functions import upsert_rows
 
 chosen_keywords=["stress", "depress", "anx"] # hardcoded across all studies for now, really just an example for illustration - will count anything fully containing these letters so can get at variations via roots
 
@@ -86,14 +87,8 @@ def diary_transcript_nlp(study, OLID):
 	# finally compute the summary stats for this pt
 	summary_save = "../../" + study + "_" + OLID + "_" + "phone_transcript_NLPFeaturesSummary.csv"
 	final_summary = summarize_transcript_stats(trans_dfs)
-	if os.path.isfile(summary_save):
-		old_df = pd.read_csv(summary_save)
-		join_csv=pd.concat([old_df, final_summary])
-		join_csv.reset_index(drop=True, inplace=True)
-		join_csv.drop_duplicates(subset=["filename"],inplace=True) # drop any duplicates just in case
-		join_csv.to_csv(summary_save,index=False)
-	else:
-		final_summary.to_csv(summary_save,index=False)
+	# only the new rows are written to the feature store (replacing any for the same transcript just in case), and the CSV is kept up to date
+	upsert_rows(summary_save, final_summary, ["filename"])
 		
 if __name__ == '__main__':
     # Map command line arguments to function arguments.
@@ -0,0 +1,65 @@
+# study-wide index of the per-patient audio QC tables, shared by audio selection (phone_audio_send_prep.py), the transcription length check, and the email writer
+# each patient's table is loaded at most once per process, the first time it is looked up, and indexed by study day and by filename - so looking up a diary is a dictionary access,
+# rather than finding and parsing the patient's CSV again and scanning it for the matching row as each of those scripts used to do for every file
+# two tables are indexed: "dpdash", the DPDash audio QC CSV ([study]-[OLID]-phoneAudioQC-day1to[last day].csv, only has the first diary of each day), and "raw", the audio QC output ([study]_[OLID]_phone_audioQC_output.csv, has every diary)
+
+import os
+import glob
+import pandas as pd
+
+qc_indices = {} # (root, study, OLID, source) -> {"columns": {column name: list of values}, "by_day": {day: row position}, "by_filename": {filename: row position}}, or None if the table couldn't be loaded
+
+# finds the path of the given patient's QC table for source ("dpdash" or "raw"), or None if there isn't one
+def qc_table_path(study, OLID, source="dpdash", root="/data/sbdp/PHOENIX/PROTECTED/"):
+	folder = os.path.join(root, study, OLID, "phone", "processed", "audio")
+	if source == "raw":
+		path = os.path.join(folder, study + "_" + OLID + "_phone_audioQC_output.csv")
+		return path if os.path.isfile(path) else None
+	matches = glob.glob(os.path.join(glob.escape(folder), study + "-" + OLID + "-phoneAudioQC-day1to*.csv"))
+	if len(matches) == 0:
+		return None
+	return matches[0] # DPDash script deletes any older days in this subfolder, so should only get 1 match each time
+
+# returns the index for the given patient's QC table - a dict with the table's "columns" (as lists), and "by_day" and "by_filename", each mapping to a row's position in them
+# where a day or filename appears more than once the first row is kept, as the scripts always took the first match
+# the raw audio QC output has no day column, so its "by_day" is empty
+# raises an IOError if the table can't be found or loaded - this is remembered, so it isn't tried again for every diary
+def patient_qc_index(study, OLID, source="dpdash", root="/data/sbdp/PHOENIX/PROTECTED/"):
+	key = (root, study, OLID, source)
+	if key not in qc_indices:
+		qc_indices[key] = None
+		path = qc_table_path(study, OLID, source=source, root=root)
+		if path is not None:
+			try:
+				qc_df = pd.read_csv(path)
+				columns = {col: qc_df[col].tolist() for col in qc_df.columns}
+				by_day = {}
+				for i, day in enumerate(columns.get("day", [])):
+					by_day.setdefault(day, i)
+				by_filename = {}
+				for i, filename in enumerate(columns["filename"]):
+					by_filename.setdefault(filename, i)
+				qc_indices[key] = {"columns": columns, "by_day": by_day, "by_filename": by_filename}
+			except:
+				pass
+	if qc_indices[key] is None:
+		raise IOError("no usable " + source + " audio QC table for " + OLID)
+	return qc_indices[key]
+
+# gets a row of an index's table as a dict of column name -> value, or None if position is None
+def index_row(qc_index, position):
+	if position is None:
+		return None
+	return {col: values[position] for col, values in qc_index["columns"].items()}
+
+# looks up the row (as a dict of column name -> value) for a study day (as an int) of the given patient's DPDash audio QC table, returning None if the day isn't there
+# raises an IOError if the table itself can't be loaded, see patient_qc_index
+def qc_row_by_day(study, OLID, day, root="/data/sbdp/PHOENIX/PROTECTED/"):
+	qc_index = patient_qc_index(study, OLID, source="dpdash", root=root)
+	return index_row(qc_index, qc_index["by_day"].get(day))
+
+# looks up the row (as a dict of column name -> value) for a diary filename in the given patient's QC table for source, returning None if the file isn't there
+# raises an IOError if the table itself can't be loaded, see patient_qc_index
+def qc_row_by_filename(study, OLID, filename, source="dpdash", root="/data/sbdp/PHOENIX/PROTECTED/"):
+	qc_index = patient_qc_index(study, OLID, source=source, root=root)
+	return index_row(qc_index, qc_index["by_filename"].get(filename))
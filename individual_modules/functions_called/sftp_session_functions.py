@@ -0,0 +1,101 @@
+# set of functions for keeping one authenticated SFTP session open across all the transfers of a run, instead of making a new connection (SSH handshake plus login) for every file
+# built on paramiko directly (pysftp, used by the scripts before, is a thin wrapper around it that no longer imports with current paramiko releases)
+# a session is a dict holding the connection details, the open connection, and counts of the handshakes made and the time they took
+# if the connection drops partway through a run, it is reopened with exponential backoff and the transfer retried - errors about a file itself (e.g. it doesn't exist on the server) are raised as normal
+
+import time
+import socket
+import paramiko
+
+# basic properties for the transcription service, password is the only sftp-related input for now
+TRANSCRIBEME_HOST = "sftp.transcribeme.com"
+TRANSCRIBEME_USERNAME = "partners_itp"
+
+# errors that can mean the connection itself has a problem, so are worth reconnecting for
+# socket.error is left out, as it is the same as OSError and would also match local problems (e.g. a missing file to upload) - only the socket errors for a timeout or a failed host lookup are included
+CONNECTION_ERRORS = (paramiko.SSHException, EOFError, ConnectionError, socket.timeout, socket.gaierror)
+
+# opens a session, raising the last error if it can't connect within max_attempts (waiting backoff_sec, then twice that, and so on between attempts)
+# a wrong password is raised straight away, as retrying won't fix it and could lock the account
+def open_sftp_session(password, host=TRANSCRIBEME_HOST, username=TRANSCRIBEME_USERNAME, port=22, max_attempts=4, backoff_sec=2.0):
+	session = {"host": host, "port": port, "username": username, "password": password, "max_attempts": max_attempts, "backoff_sec": backoff_sec,
+			   "transport": None, "sftp": None, "handshakes": 0, "handshake_seconds": 0.0}
+	connect_session(session)
+	return session
+
+def close_connection(session):
+	if session["transport"] is not None:
+		try:
+			session["transport"].close()
+		except:
+			pass
+	session["transport"] = None
+	session["sftp"] = None
+
+def session_alive(session):
+	return session["transport"] is not None and session["transport"].is_active()
+
+# (re)opens the session's connection, closing any previous one first - see open_sftp_session
+def connect_session(session):
+	close_connection(session)
+	last_error = None
+	for attempt in range(session["max_attempts"]):
+		if attempt > 0:
+			time.sleep(session["backoff_sec"] * 2 ** (attempt - 1))
+		start_time = time.time()
+		transport = None
+		try:
+			transport = paramiko.Transport((session["host"], session["port"]))
+			transport.connect(username=session["username"], password=session["password"]) # host key is not checked, same as the cnopts.hostkeys = None used with pysftp
+			sftp = paramiko.SFTPClient.from_transport(transport)
+		except paramiko.AuthenticationException:
+			if transport is not None:
+				transport.close()
+			raise
+		except CONNECTION_ERRORS as e:
+			if transport is not None:
+				transport.close()
+			print("Problem connecting to SFTP server " + session["host"] + " (" + str(e) + "), attempt " + str(attempt + 1) + " of " + str(session["max_attempts"]))
+			last_error = e
+			continue
+		session["transport"] = transport
+		session["sftp"] = sftp
+		session["handshakes"] = session["handshakes"] + 1
+		session["handshake_seconds"] = session["handshake_seconds"] + time.time() - start_time
+		return
+	raise last_error
+
+# runs the SFTP client method named operation (e.g. "put", "get", "remove") with args (and any keyword args) over the session, returning its result
+# if the connection has dropped (before or during the operation) it is reopened and the operation retried, up to the session's max_attempts times
+def session_call(session, operation, *args, **kwargs):
+	last_error = None
+	for attempt in range(session["max_attempts"]):
+		if not session_alive(session):
+			connect_session(session)
+		try:
+			return getattr(session["sftp"], operation)(*args, **kwargs)
+		except Exception as e:
+			# decided by the connection state rather than the error type, as a dropped connection can surface as a plain OSError (e.g. "Socket is closed")
+			if session_alive(session):
+				raise # connection is fine, so the problem is with this operation itself
+			print("SFTP connection dropped during " + operation + " (" + str(e) + "), reconnecting")
+			last_error = e
+	raise last_error
+
+# uploads local_path to remote_path over the session, returning (bytes uploaded, seconds taken)
+# paramiko pipelines the writes of an upload, so each chunk doesn't wait on the server's reply to the one before
+def session_put(session, local_path, remote_path):
+	start_time = time.time()
+	attrs = session_call(session, "put", local_path, remote_path)
+	return attrs.st_size, time.time() - start_time
+
+def close_sftp_session(session):
+	close_connection(session)
+
+# a one line summary of the handshakes made by the session, and roughly how much handshake time was saved by reusing it for num_transfers transfers rather than connecting for each one
+def session_summary(session, num_transfers):
+	if session["handshakes"] == 0:
+		return "no SFTP connection made"
+	mean_handshake = session["handshake_seconds"] / session["handshakes"]
+	saved = max(0, num_transfers - session["handshakes"]) * mean_handshake
+	return str(num_transfers) + " transfers over " + str(session["handshakes"]) + " SFTP connection(s), " + str(round(mean_handshake, 2)) + " seconds per handshake - about " + str(round(saved, 1)) + " seconds of handshakes saved versus a connection per file"
@@ -0,0 +1,128 @@
+# set of functions for running a batch of SFTP transfers (and other SFTP operations, like the server cleanup after a transcript pull) concurrently, over a bounded pool of sessions
+# each session is a separate connection (see sftp_session_functions.py), opened only when all the others are busy, and reused for any number of transfers - a single connection carries one file at a time, at a rate limited by the round trips to the server, so running a few at once finishes a large batch in a fraction of the time
+# a task is a dict with the "operation" (name of an SFTP client method, e.g. "put", "get", "remove", "rename") and its "args", and gets back a dict with "success", "bytes", "seconds", "error", and "value"
+# progress is printed as each task finishes, and an optional bandwidth cap is shared by all the transfers in the batch
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sftp_session_functions import TRANSCRIBEME_HOST, open_sftp_session, close_sftp_session, session_call, session_alive
+
+# paramiko reads ahead this many 32 KB requests of a download when the bandwidth is capped, so the cap isn't undercut by downloading the whole file before it is paced
+CAPPED_PREFETCH_REQUESTS = 8
+
+# opens a pool of up to num_channels sessions for running batches of tasks over, returning its state - only the first session is opened here, so if that fails (e.g. a wrong password) the error is raised before any task has run
+# a task that fails because of the connection is retried up to max_attempts times (on top of the reconnecting done within the session), while one that fails because of the file itself, e.g. a transcript that isn't on the server, is not
+# bandwidth_mb caps the combined rate of all transfers in MB per second, or None for no cap
+def open_transfer_pool(password, host=TRANSCRIBEME_HOST, port=22, num_channels=4, max_attempts=3, bandwidth_mb=None):
+	first_session = open_sftp_session(password, host=host, port=port)
+	idle_sessions = queue.Queue()
+	idle_sessions.put(first_session)
+	return {"password": password, "host": host, "port": port, "num_channels": max(1, num_channels), "max_attempts": max_attempts,
+			"bytes_per_sec": (bandwidth_mb * 1048576.0 if bandwidth_mb else None), "next_send_time": 0.0,
+			"lock": threading.Lock(), "sessions": [first_session], "idle_sessions": idle_sessions,
+			"label": "transfer", "num_tasks": 0, "tasks_done": 0, "tasks_failed": 0, "bytes_done": 0, "start_time": time.time(), "seconds": 0.0}
+
+# runs tasks (a list of task dicts, see above) over the pool, up to num_channels at once, and returns a list of result dicts in the same order - along with "value", whatever the operation returned (e.g. the names for "listdir")
+# label is used in the progress lines and summary, e.g. "upload" - the counts in them are for this batch
+def run_transfers(pool_state, tasks, label="transfer"):
+	pool_state.update({"label": label, "num_tasks": len(tasks), "tasks_done": 0, "tasks_failed": 0, "bytes_done": 0, "start_time": time.time()})
+	with ThreadPoolExecutor(max_workers=pool_state["num_channels"]) as pool:
+		results = list(pool.map(lambda task: run_task(task, pool_state), tasks))
+	pool_state["seconds"] = time.time() - pool_state["start_time"]
+	return results
+
+def close_transfer_pool(pool_state):
+	for session in pool_state["sessions"]:
+		if session is not None:
+			close_sftp_session(session)
+
+# takes an idle session from the pool, opening a new one if they are all busy and there are fewer than num_channels
+# if a new session can't be opened it just waits for one of the others instead
+def acquire_session(state):
+	try:
+		return state["idle_sessions"].get_nowait()
+	except queue.Empty:
+		pass
+	with state["lock"]:
+		open_new = len(state["sessions"]) < state["num_channels"]
+		if open_new:
+			state["sessions"].append(None) # hold the place while connecting, so no other thread opens one too many
+	if open_new:
+		try:
+			session = open_sftp_session(state["password"], host=state["host"], port=state["port"])
+			with state["lock"]:
+				state["sessions"][state["sessions"].index(None)] = session
+			return session
+		except Exception as e:
+			print("Could not open another SFTP channel (" + str(e) + "), continuing with the ones already open")
+			with state["lock"]:
+				state["sessions"].remove(None)
+	return state["idle_sessions"].get()
+
+def release_session(state, session):
+	state["idle_sessions"].put(session)
+
+# records num_bytes more transferred, and if the bandwidth is capped waits until the batch is back under the cap
+# each call reserves the next num_bytes worth of time at the capped rate, so the pacing is shared across all the threads
+def account_bytes(state, num_bytes):
+	with state["lock"]:
+		state["bytes_done"] = state["bytes_done"] + num_bytes
+		if state["bytes_per_sec"] is None or num_bytes <= 0:
+			return
+		now = time.time()
+		send_time = max(now, state["next_send_time"])
+		state["next_send_time"] = send_time + num_bytes / state["bytes_per_sec"]
+		wait_time = state["next_send_time"] - now
+	if wait_time > 0:
+		time.sleep(wait_time)
+
+# runs one task, retrying it on connection problems, and prints a progress line once it is done
+def run_task(task, state):
+	operation = task["operation"]
+	result = {"success": False, "bytes": 0, "seconds": 0.0, "error": "", "value": None}
+	for attempt in range(state["max_attempts"]):
+		progress = {"bytes": 0}
+		# paramiko calls this with the bytes moved so far as it goes through the file
+		def track(bytes_so_far, total_bytes):
+			account_bytes(state, bytes_so_far - progress["bytes"])
+			progress["bytes"] = bytes_so_far
+		kwargs = {}
+		if operation in ["put", "get"]:
+			kwargs["callback"] = track
+		if operation == "get" and state["bytes_per_sec"] is not None:
+			kwargs["max_concurrent_prefetch_requests"] = CAPPED_PREFETCH_REQUESTS
+		session = acquire_session(state)
+		start_time = time.time()
+		try:
+			value = session_call(session, operation, *task["args"], **kwargs)
+			result = {"success": True, "bytes": progress["bytes"], "seconds": time.time() - start_time, "error": "", "value": value}
+			break
+		except Exception as e:
+			account_bytes(state, -progress["bytes"]) # the bytes of a failed attempt don't count towards the progress, though they did take up bandwidth
+			result["error"] = str(e)
+			if session_alive(session):
+				break # session_call only raises with the connection still up when the problem is with the file itself (e.g. it isn't there, locally or on the server), so retrying won't help
+			if attempt + 1 < state["max_attempts"]:
+				print("Problem with " + operation + " of " + str(task["args"][0]) + " (" + str(e) + "), retrying")
+		finally:
+			release_session(state, session)
+
+	with state["lock"]:
+		state["tasks_done"] = state["tasks_done"] + 1
+		if not result["success"]:
+			state["tasks_failed"] = state["tasks_failed"] + 1
+		elapsed = time.time() - state["start_time"]
+		print(state["label"] + " " + str(state["tasks_done"]) + " of " + str(state["num_tasks"]) + " done (" + os.path.basename(str(task["args"][0])) + ", " + ("ok" if result["success"] else "FAILED") + ") - "
+			  + str(round(state["bytes_done"] / 1048576.0, 1)) + " MB so far at " + str(round(state["bytes_done"] / 1048576.0 / max(elapsed, 1e-6), 2)) + " MB/s over " + str(len(state["sessions"])) + " channel(s)")
+	return result
+
+# a one line summary of the last batch run over the pool, along with the handshakes made by the pool so far
+def transfer_summary(state):
+	handshakes = sum([s["handshakes"] for s in state["sessions"] if s is not None])
+	handshake_seconds = sum([s["handshake_seconds"] for s in state["sessions"] if s is not None])
+	return (str(state["num_tasks"] - state["tasks_failed"]) + " of " + str(state["num_tasks"]) + " " + state["label"] + "s done, " + str(round(state["bytes_done"] / 1048576.0, 1)) + " MB in " + str(round(state["seconds"], 1)) + " seconds ("
+			+ str(round(state["bytes_done"] / 1048576.0 / max(state["seconds"], 1e-6), 2)) + " MB/s) over " + str(len(state["sessions"])) + " channel(s), " + str(handshakes) + " handshake(s) taking " + str(round(handshake_seconds, 1)) + " seconds in total")
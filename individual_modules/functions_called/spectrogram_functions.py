@@ -0,0 +1,92 @@
+# set of functions for queuing spectrogram images to be rendered later, instead of drawing them with matplotlib inside the VAD compute loops
+# a queued image is an .npz job holding its panels as dB spectrograms already reduced to the resolution of the saved figure - so the jobs stay small, and rendering them is cheap -
+# which phone_audio_spectrograms.py then renders in a pool of processes, into the same figures the VAD code used to draw directly
+
+import os
+import numpy as np
+import librosa
+import librosa.display
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.scale
+plt.ioff()
+
+# figure size (inches) used for a single panel image, which is the matplotlib default - and the resolution figures are saved at
+DEFAULT_FIGSIZE = (6.4, 4.8)
+FIGURE_DPI = 100
+
+# groups the rows of a spectrogram (frequency bins, at sample rate sr) by the pixel row they land on when drawn with y_axis='log' in an axis height_px tall
+# returns the index of the first bin in each group, and the centre frequency of each group
+def log_frequency_groups(num_bins, sr, height_px):
+	freqs = librosa.fft_frequencies(sr=sr, n_fft=2 * (num_bins - 1))
+	# same scaling as librosa.display uses for a log frequency axis
+	transform = matplotlib.scale.SymmetricalLogTransform(base=2, linthresh=float(librosa.note_to_hz("C2")), linscale=0.5)
+	scaled = transform.transform(freqs)
+	rows = np.floor((scaled - scaled[0]) / (scaled[-1] - scaled[0]) * (height_px - 1)).astype(int)
+	starts = np.concatenate([[0], np.where(np.diff(rows) > 0)[0] + 1])
+	centres = np.add.reduceat(freqs, starts) / np.diff(np.append(starts, num_bins))
+	return starts, centres
+
+# converts a magnitude spectrogram to dB (relative to its max, as the VAD images always were) and reduces it to at most height_px frequency rows on a log axis and width_px time columns
+# each reduced cell is the mean dB of the values it covers, which is close to what the full resolution figure ends up showing once rasterized
+# returns the reduced dB array, the centre frequency of each row, and the time (seconds) of the centre of each column, for spectrogram time points hop_length samples apart
+def reduce_spectrogram(S, sr, height_px, width_px, hop_length=512):
+	S_db = librosa.amplitude_to_db(S, ref=np.max)
+	row_starts, freqs = log_frequency_groups(S_db.shape[0], sr, height_px)
+	S_db = np.add.reduceat(S_db, row_starts, axis=0) / np.diff(np.append(row_starts, S_db.shape[0]))[:, np.newaxis]
+	factor = int(np.ceil(S_db.shape[1] / float(width_px)))
+	col_starts = np.arange(0, S_db.shape[1], factor)
+	S_db = np.add.reduceat(S_db, col_starts, axis=1) / np.diff(np.append(col_starts, S_db.shape[1]))[np.newaxis, :]
+	times = librosa.frames_to_time(col_starts + (np.minimum(col_starts + factor, S.shape[1]) - col_starts - 1) / 2.0, sr=sr, hop_length=hop_length)
+	return S_db.astype(np.float32), freqs, times
+
+# averages a magnitude spectrogram over groups of factor consecutive time points (the last group may be shorter), e.g. to build up an image's panels a chunk at a time
+# the result can be queued with a hop_length factor times the original
+def pool_time_points(S, factor):
+	starts = np.arange(0, S.shape[1], factor)
+	return np.add.reduceat(S, starts, axis=1) / np.diff(np.append(starts, S.shape[1]))[np.newaxis, :]
+
+# queues an image of one or more spectrogram panels, stacked vertically, to be saved at out_path
+# panels is a list of (title, magnitude spectrogram, x_axis) - x_axis is passed on to specshow, with 'time' labelling the time axis
+# hop_length is the number of audio samples between the spectrogram time points
+# the job is saved into queue_folder (created if needed), named after the image, and written under a temporary name so a half written job is never picked up
+# returns False without queuing anything if a spectrogram is empty, as there would be nothing to draw
+def queue_spectrogram(queue_folder, out_path, panels, sr, figsize=DEFAULT_FIGSIZE, hop_length=512):
+	if not os.path.isdir(queue_folder):
+		os.makedirs(queue_folder)
+	width_px = int(figsize[0] * FIGURE_DPI)
+	height_px = int(figsize[1] * FIGURE_DPI / len(panels))
+	job = {"out_path": np.array(os.path.abspath(out_path)), "figsize": np.array(figsize, dtype=float), "titles": np.array([p[0] for p in panels]), "x_axes": np.array([str(p[2]) for p in panels])}
+	for i, (title, S, x_axis) in enumerate(panels):
+		if S.size == 0:
+			print("empty spectrogram for " + os.path.basename(out_path) + ", not queuing it")
+			return False
+		job["db" + str(i)], job["freqs" + str(i)], job["times" + str(i)] = reduce_spectrogram(S, sr, height_px, width_px, hop_length=hop_length)
+	job_path = os.path.join(queue_folder, os.path.splitext(os.path.basename(out_path))[0] + ".npz")
+	np.savez_compressed(job_path + ".tmp.npz", **job)
+	os.rename(job_path + ".tmp.npz", job_path)
+	return True
+
+# renders a queued spectrogram job into its image - laid out the same way as the figures the VAD code used to draw directly - and removes the job once the image is saved
+# returns (job path, True or False for success, error message)
+def render_spectrogram_job(job_path):
+	try:
+		with np.load(job_path, allow_pickle=False) as job:
+			num_panels = len(job["titles"])
+			plt.figure(figsize=tuple(job["figsize"]))
+			for i in range(num_panels):
+				if num_panels > 1:
+					plt.subplot(num_panels, 1, i + 1)
+				x_axis = str(job["x_axes"][i])
+				librosa.display.specshow(job["db" + str(i)], y_axis='log', x_axis=(None if x_axis == "None" else x_axis), y_coords=job["freqs" + str(i)], x_coords=job["times" + str(i)])
+				plt.title(str(job["titles"][i]))
+				plt.colorbar()
+			plt.tight_layout()
+			plt.savefig(str(job["out_path"]), dpi=FIGURE_DPI)
+			plt.close()
+	except Exception as e:
+		plt.close("all")
+		return (job_path, False, str(e))
+	os.remove(job_path)
+	return (job_path, True, "")
@@ -0,0 +1,66 @@
+# set of functions for recording how long each diary takes in each processing stage, along with the peak memory (resident set size) of the process while it was being processed
+# a stage calls profile_diary with a filename at the start of each diary it processes, and with None once its loop is done - each record runs from one call to the next
+# peak memory is reset at the start of each diary where the system allows it (Linux, via /proc/self/clear_refs), otherwise the record holds the peak of the process so far
+# profiling is off unless enable_profiling is called, in which case save_profile appends the records to a CSV and prints a summary per stage
+
+import os
+import time
+import resource
+import collections
+import numpy as np
+import pandas as pd
+
+profile_settings = {"enabled": False, "label": ""}
+open_records = {} # stage -> (filename, start time)
+profile_rows = [] # (stage, filename, seconds, peak RSS in MB)
+
+# label is recorded alongside each row, e.g. the numeric precision the stages were run at
+def enable_profiling(label=""):
+	profile_settings["enabled"] = True
+	profile_settings["label"] = label
+
+def reset_peak_rss():
+	try:
+		with open("/proc/self/clear_refs", "w") as f:
+			f.write("5")
+		return True
+	except:
+		return False
+
+def peak_rss_mb():
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("VmHWM:"):
+					return float(line.split()[1]) / 1024.0
+	except:
+		pass
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 # reported in KB on Linux
+
+# closes the open record for this stage (if any), and opens a new one for filename unless it is None
+def profile_diary(stage, filename):
+	if not profile_settings["enabled"]:
+		return
+	if stage in open_records:
+		prev_filename, start_time = open_records.pop(stage)
+		profile_rows.append((stage, prev_filename, time.time() - start_time, peak_rss_mb()))
+	if filename is not None:
+		reset_peak_rss()
+		open_records[stage] = (filename, time.time())
+
+# appends the records so far to the CSV at output_path (creating it if needed), prints the mean time and the largest peak memory per stage, and clears the records
+def save_profile(output_path):
+	if not profile_settings["enabled"] or len(profile_rows) == 0:
+		return
+	profile_df = pd.DataFrame(profile_rows, columns=["stage", "filename", "seconds", "peak_rss_mb"])
+	profile_df["numeric_dtype"] = profile_settings["label"]
+	profile_df.to_csv(output_path, mode="a", header=not os.path.isfile(output_path), index=False)
+
+	stage_rows = collections.OrderedDict()
+	for stage, filename, seconds, peak in profile_rows:
+		stage_rows.setdefault(stage, []).append((seconds, peak))
+	for stage in stage_rows:
+		seconds = [r[0] for r in stage_rows[stage]]
+		peaks = [r[1] for r in stage_rows[stage]]
+		print(stage + " profile: " + str(len(seconds)) + " diaries, " + str(round(np.mean(seconds), 2)) + " seconds per diary (max " + str(round(np.max(seconds), 2)) + "), peak memory up to " + str(round(np.max(peaks), 1)) + " MB")
+	del profile_rows[:]
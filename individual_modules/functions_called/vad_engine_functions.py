@@ -0,0 +1,132 @@
+# set of functions providing alternative engines for the slow parts of VAD
+# the default VAD follows the librosa vocal separation example exactly, these are faster (re)implementations of parts of it that can be selected instead
+# there are also lightweight VAD backends that skip the foreground separation entirely, and find pauses straight from the spectrogram (e.g. for quick triage runs)
+# benchmarks/phone_audio_benchmarks.py has checks comparing each engine against the librosa path, on real or synthetic diaries
+
+import numpy as np
+import librosa
+
+# fast version of librosa.decompose.nn_filter(S, aggregate=np.median, metric='cosine', width=width), as used for VAD foreground separation
+# librosa finds the k+2*width most similar (by cosine similarity) time points to each time point, drops any closer than width time points to it, and keeps the k earliest of what is left
+# (as the links all have the same weight, the remaining ones are kept in time order rather than by similarity) - each time point is then replaced by the median of those neighbours
+# here the same neighbours are found with plain matrix products over blocks of time points, and the median is taken for a whole block at once instead of one time point at a time
+# with the default arguments this gives the same result as librosa, barring ties in similarity - the optional arguments make it a faster approximation:
+#	n_bands averages the linear frequency bins into that many bands before computing similarity (the median itself is still taken at full resolution)
+#	search_frames only considers time points within that distance as candidate neighbours, so the cost grows linearly rather than quadratically with diary length
+#	k sets the number of neighbours directly, otherwise it is chosen the same way as librosa (which grows with the square root of the diary length)
+# block_mb caps the memory used for the gathered neighbours of a block
+# raises a ValueError if the spectrogram is too short for the given width, in the same situations librosa would raise an error
+def fast_nn_filter(S, width, k=None, n_bands=None, search_frames=None, block_mb=128):
+	num_bins, num_timepoints = S.shape
+	if width < 1 or width >= (num_timepoints - 1) // 2:
+		raise ValueError("spectrogram with " + str(num_timepoints) + " time points is too short for nearest neighbor filter width " + str(width))
+	if k is None:
+		k = int(2 * np.ceil(np.sqrt(num_timepoints - 2 * width + 1)))
+	if search_frames is None or search_frames >= num_timepoints:
+		search_frames = num_timepoints
+	num_candidates = min(num_timepoints - 1, k + 2 * width, 2 * search_frames)
+
+	# unit length features, so dot products are cosine similarities
+	if n_bands is None or n_bands >= num_bins:
+		features = S
+	else:
+		band_edges = np.unique(np.linspace(0, num_bins, n_bands + 1).astype(int))[:-1]
+		features = np.add.reduceat(S, band_edges, axis=0)
+	norms = np.linalg.norm(features, axis=0)
+	norms[norms == 0] = 1
+	features = (features / norms).astype(np.float32)
+
+	S_time = np.ascontiguousarray(S.T) # time points x frequency bins, so neighbours can be gathered as rows
+	S_out = np.empty_like(S_time)
+	block_len = max(1, int(block_mb * 1024 * 1024 / (max(k, num_candidates) * num_bins * S_time.itemsize)))
+	for block_start in range(0, num_timepoints, block_len):
+		block_stop = min(num_timepoints, block_start + block_len)
+		cand_start = max(0, block_start - search_frames)
+		cand_stop = min(num_timepoints, block_stop + search_frames)
+		similarity = np.dot(features[:,block_start:block_stop].T, features[:,cand_start:cand_stop])
+		# a time point is never its own neighbour, and nothing beyond the search distance is considered
+		offsets = np.abs(np.arange(cand_start, cand_stop)[np.newaxis,:] - np.arange(block_start, block_stop)[:,np.newaxis])
+		similarity[(offsets == 0) | (offsets > search_frames)] = -np.inf
+		nearest = np.argpartition(-similarity, num_candidates - 1, axis=1)[:,:num_candidates]
+		# then drop the ones within width, and keep the k earliest of the rest
+		nearest_offsets = np.take_along_axis(offsets, nearest, axis=1)
+		nearest = nearest + cand_start
+		nearest[(nearest_offsets < width) | (np.take_along_axis(similarity, nearest - cand_start, axis=1) == -np.inf)] = num_timepoints
+		nearest = np.sort(nearest, axis=1)[:,:k]
+		counts = np.sum(nearest < num_timepoints, axis=1)
+		full_rows = np.where(counts == k)[0]
+		S_out[block_start + full_rows] = np.median(S_time[nearest[full_rows]], axis=1)
+		# time points left with fewer neighbours (only possible near the ends of short files) are done individually, as librosa does
+		for row in np.where(counts < k)[0]:
+			if counts[row] == 0:
+				S_out[block_start + row] = S_time[block_start + row]
+			else:
+				S_out[block_start + row] = np.median(S_time[nearest[row,:counts[row]]], axis=0)
+	return S_out.T
+
+# nearest neighbor filter used by the librosa vocal separation example, over a 2 second width - this is the original VAD
+def librosa_nn_filter(S_full, sr):
+	return librosa.decompose.nn_filter(S_full,aggregate=np.median,metric='cosine',width=int(librosa.time_to_frames(2, sr=sr)))
+
+# same neighbours and result as librosa_nn_filter (barring ties in similarity), computed in blocks - faster for short diaries, but for long ones the median over the growing number of neighbours dominates either way
+# mainly useful for checking that the approximate engine differs from librosa only because of its approximations
+def blocked_nn_filter_engine(S_full, sr):
+	return fast_nn_filter(S_full, int(librosa.time_to_frames(2, sr=sr)))
+
+# approximation of librosa_nn_filter - takes the median over 32 neighbours instead of a number growing with diary length (142 for a 2 minute diary, 322 for 10 minutes),
+# and only searches for neighbours within 2 minutes either side, so the cost grows linearly with diary length
+def approximate_nn_filter_engine(S_full, sr):
+	return fast_nn_filter(S_full, int(librosa.time_to_frames(2, sr=sr)), k=32, search_frames=int(librosa.time_to_frames(120, sr=sr)))
+
+# nearest neighbor filter engines that can be selected for VAD foreground separation, by name
+# each takes (magnitude spectrogram, sample rate) and returns the filtered spectrogram, raising an error if the audio is too short
+nn_filter_engines = {"librosa": librosa_nn_filter, "blocked": blocked_nn_filter_engine, "approximate": approximate_nn_filter_engine}
+
+# finds the continuous pause periods covered by a set of sliding windows judged to be pause - the windows start at low_starts and are window_len spectrogram time points long
+# returns a list of (first spectrogram time index, last spectrogram time index, number of time indices) for each continuous pause, in order, dropping any single index pauses
+# (as with the original pause detection, the windows at the end of the file can extend a bit past the last real index)
+def window_pause_periods(low_starts, window_len, num_timepoints):
+	if len(low_starts) == 0:
+		return []
+	coverage = np.zeros(num_timepoints + window_len + 1, dtype=int)
+	coverage[low_starts] += 1
+	coverage[low_starts + window_len] -= 1
+	in_pause = (np.cumsum(coverage)[:-1] > 0).astype(np.int8)
+
+	# run length encode the covered indices to get the continuous pause periods
+	edges = np.diff(np.concatenate(([0], in_pause, [0])))
+	run_firsts = np.where(edges == 1)[0]
+	run_lasts = np.where(edges == -1)[0] - 1
+	run_lengths = run_lasts - run_firsts + 1
+	keep = run_lengths >= 2
+	return list(zip(run_firsts[keep].tolist(), run_lasts[keep].tolist(), run_lengths[keep].tolist()))
+
+# lightweight VAD backend - finds pauses straight from the full magnitude spectrogram (as from librosa.stft) of audio at sample rate fs, using frame energy and spectral flux
+# a time point counts as speech if its energy is more than margin_db above the diary's noise floor (the 10th percentile of frame energy, so it adapts to each recording's level),
+# or more than half that above the floor while the spectrum is changing - its spectral flux (mean rise in dB across frequency bins, smoothed over 100 ms) is over flux_ratio times the diary median
+# pauses are then found with the same sliding windows as the original pause detection, with a window being pause if it contains no speech time points
+# returns pause periods in the same format as detect_pauses, so they can be saved and used the same way
+def energy_flux_pauses(S_full, fs, window_sec=0.25, slide_sec=0.05, margin_db=12.0, flux_ratio=2.0, samples_per_spec_bin=512):
+	num_timepoints = S_full.shape[1]
+	window_len = int((float(fs)/samples_per_spec_bin) * window_sec)
+	slide_len = int((float(fs)/samples_per_spec_bin) * slide_sec)
+	if num_timepoints == 0 or window_len == 0:
+		return []
+
+	energy_db = 10 * np.log10(np.mean(S_full**2, axis=0) + 1e-20)
+	floor_db = np.percentile(energy_db, 10)
+	S_db = librosa.amplitude_to_db(S_full, ref=np.max)
+	flux = np.concatenate(([0], np.mean(np.maximum(0, np.diff(S_db, axis=1)), axis=0)))
+	smooth_len = max(1, int((float(fs)/samples_per_spec_bin) * 0.1))
+	flux = np.convolve(flux, np.ones(smooth_len) / smooth_len, mode="same")
+	speech = (energy_db > floor_db + margin_db) | ((energy_db > floor_db + margin_db / 2) & (flux > flux_ratio * np.median(flux)))
+
+	# count the speech time points in each window with a cumulative sum, windows at the end of the file are cut short
+	window_starts = np.arange(0, num_timepoints, slide_len)
+	speech_counts = np.concatenate(([0], np.cumsum(speech)))
+	window_speech = speech_counts[np.minimum(window_starts + window_len, num_timepoints)] - speech_counts[window_starts]
+	return window_pause_periods(window_starts[window_speech == 0], window_len, num_timepoints)
+
+# lightweight VAD backends that can be selected in place of the original foreground separation (which is always available as "separation", with its nearest neighbor filter engine chosen above), by name
+# each takes (magnitude spectrogram, sample rate, window_sec, slide_sec) and returns the pause periods in the same format as detect_pauses in phone_audio_vad.py
+vad_backends = {"energy": energy_flux_pauses}
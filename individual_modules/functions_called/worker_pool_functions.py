@@ -0,0 +1,12 @@
+# small helpers shared by the stages that run a pool of workers (decryption, OpenSMILE, spectrogram rendering)
+# kept free of any of the pipeline's other dependencies, so importing it doesn't pull in e.g. cryptease just to size a pool
+
+import os
+import multiprocessing
+
+# the number of cores actually available to this process, which on the cluster may be fewer than the node total
+def available_cores():
+	try:
+		return len(os.sched_getaffinity(0))
+	except:
+		return multiprocessing.cpu_count()
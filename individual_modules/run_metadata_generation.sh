@@ -34,6 +34,19 @@ else
 	func_root="$repo_root"/individual_modules/functions_called
 fi
 
+# ETFileMap setting - if Y, each patient's ETFileMap is updated with just the recordings added since the last run, using the raw listing saved alongside it (folders that haven't changed since are not listed again)
+# falls back to a full rebuild automatically whenever earlier history changes (a recording removed, or one turning up that dates before the last one mapped), so the result is always the same as with N, which rebuilds it from scratch every time
+# can be overridden by exporting filemap_incremental before calling this module
+if [[ -z "${filemap_incremental}" ]]; then
+	filemap_incremental="Y"
+fi
+
+# timezone the diary submission times are converted to - the 4 am day boundary and the "ET" hour and time columns of the ETFileMap are in this timezone (any name in the tz database, e.g. US/Pacific)
+# can be overridden by exporting filemap_timezone before calling this module
+if [[ -z "${filemap_timezone}" ]]; then
+	filemap_timezone="US/Eastern"
+fi
+
 # body:
 # actually start running the main computations
 cd /data/sbdp/PHOENIX/PROTECTED/"$study"
@@ -44,5 +57,5 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	fi
 	
 	# now run script on this patient
-	python "$func_root"/phone_audio_metadata_format.py "$study" "$p"
+	python "$func_root"/phone_audio_metadata_format.py "$study" "$p" "$filemap_incremental" "$filemap_timezone"
 done
\ No newline at end of file
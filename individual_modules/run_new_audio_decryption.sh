@@ -19,7 +19,7 @@ if [[ -z "${study}" ]]; then
 		exit
 	fi
 fi
-# similarly, need to check for repo path, use it to define expected path to decryption helper utility - crypt_exp will be under the functions_called subfolder
+# similarly, need to check for repo path, use it to define expected path to decryption python script - it will be under the functions_called subfolder
 if [[ -z "${repo_root}" ]]; then
 	# if don't have the variable, repeat similar process to get directory this script is in, which should be under individual_modules subfolder of the repo
 	full_path=$(realpath $0)
@@ -40,75 +40,47 @@ if [[ -z "${password}" ]]; then
 	echo ""
 fi
 
+# decoding setting - if Y, decrypted bytes are piped straight into ffmpeg and only the final WAV is written to disk (mono, at the 22050 Hz rate the VAD code uses)
+# if N, uses the original approach of writing each decrypted mp4, converting it to WAV with ffmpeg, and then deleting the mp4s
+# defaults to N to keep audio QC outputs directly comparable with previously processed diaries, can be overridden by exporting decrypt_stream before calling this module
+if [[ -z "${decrypt_stream}" ]]; then
+	decrypt_stream="N"
+fi
+
+# selection setting - if Y, only the first recording of each study day (as assigned in the ETFileMap made by the metadata step) is decrypted
+# secondary same-day recordings would otherwise be decrypted, QCed, run through OpenSMILE and VAD, only to be rejected by the audio selection step
+# note skipped recordings never reach audio selection, so the email alert counts them neither as rejected secondary submissions nor in its total of newly processed diaries
+# defaults to N so those email counts stay as they were, can be overridden by exporting decrypt_primary_only before calling this module
+if [[ -z "${decrypt_primary_only}" ]]; then
+	decrypt_primary_only="N"
+fi
+
 # body:
 # actually start running the main computations
+# decryption of all new files across the study is done in a single python process, with a pool of workers sized to the available cores
+# (previously this called the crypt_exp helper once per file, which meant a new crypt.py process and passphrase key derivation for every diary)
+# password is passed via environment variable rather than command line argument
+export password
+python "$func_root"/phone_audio_decrypt.py "$study" "$decrypt_stream" "$decrypt_primary_only"
+
 cd /data/sbdp/PHOENIX/PROTECTED/"$study"
 for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	# first check that it is truly an OLID, that has phone data
-	if [[ ! -d $p/phone ]]; then
+	if [[ ! -d $p/phone/processed/audio/decrypted_files ]]; then
 		continue
 	fi
-	# now begin on this patient
-	cd "$p"
-	echo "On participant ${p}"
-	# create temporary folder for the decrypted files
-	mkdir phone/processed/audio/decrypted_files
-
-	# some raw files are directly in audio_recordings subfolder
-	for file in phone/raw/*/audio_recordings/*.mp4.lock; do 
-		# get metadata info
-		nameint=$(echo "$file" | awk -F '/' '{print $5}') 
-		name=$(echo "$nameint" | awk -F '.' '{print $1}') 
-		date=$(echo "$name" | awk -F ' ' '{print $1}')
-		time=$(echo "$name" | awk -F ' ' '{print $2}')
-		hour=$(echo "$time" | awk -F '_' '{print $1}')
-
-		if [[ -e phone/processed/audio/decrypted_files/"$date"+"$time".mp4 ]]; then
-			# don't redecrypt if already decrypted for this batch! (in case resuming code after some disruption for example)
-			continue
-		fi
-
-		# decrypt if new
-		if [[ ! -e phone/processed/audio/opensmile_feature_extraction/"$date"+"$time".csv ]]; then
-			"$func_root"/crypt_exp "$password" phone/processed/audio/decrypted_files/"$date"+"$time".mp4 "$file" > /dev/null 
-		fi
-	done
-
-	# some files are under additional subfolder - repeat similar process
-	for file in phone/raw/*/audio_recordings/*/*.mp4.lock; do 
-		# get metadata info
-		nameint=$(echo "$file" | awk -F '/' '{print $6}') 
-		name=$(echo "$nameint" | awk -F '.' '{print $1}') 
-		date=$(echo "$name" | awk -F ' ' '{print $1}')
-		time=$(echo "$name" | awk -F ' ' '{print $2}')
-		hour=$(echo "$time" | awk -F '_' '{print $1}')
-
-		if [[ -e phone/processed/audio/decrypted_files/"$date"+"$time".mp4 ]]; then
-			# don't redecrypt if already decrypted for this batch!
-			# especially relevant this time because bad folder organization with the two different folder levels occasionally leads to duplicate files
-			continue
-		fi
-
-		# decrypt if new
-		if [[ ! -e phone/processed/audio/opensmile_feature_extraction/"$date"+"$time".csv ]]; then
-			"$func_root"/crypt_exp "$password" phone/processed/audio/decrypted_files/"$date"+"$time".mp4 "$file" > /dev/null 
-		fi
-	done
 
-	# once all decrypted convert to wav and remove mp4s
-	cd phone/processed/audio/decrypted_files
-	# instead of printing file not found error message when there are no mp4's, print custom message indicating there was no new audio for this patient this round
-	# (which will be last time patient is mentioned in these logs)	
+	# once all decrypted convert to wav and remove mp4s (in streaming mode there will be no mp4s, as WAVs were already written directly)
+	cd "$p"/phone/processed/audio/decrypted_files
+	# (the python script above already printed a message for any participant with no new audio this round)
 	if [ ! -z "$(ls -A *.mp4 2>/dev/null)" ]; then # need to redirect error from within the command
 		for file in *.mp4; do
 			name=$(echo "$file" | awk -F '.' '{print $1}')
 			ffmpeg -i "$file" "$name".wav &> /dev/null
 		done
 		rm *.mp4
-	else
-		echo "No new audio diary submissions for this participant"
 	fi
 
 	# back out of pt folder when done
 	cd /data/sbdp/PHOENIX/PROTECTED/"$study"
-done
\ No newline at end of file
+done
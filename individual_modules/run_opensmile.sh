@@ -23,45 +23,44 @@ if [[ -z "${study}" ]]; then
 	echo "$study"
 	echo ""
 fi
+# similarly, need to check for repo path, use it to define expected python script path
+if [[ -z "${repo_root}" ]]; then
+	# if don't have the variable, repeat similar process to get directory this script is in, which should be under individual_modules subfolder of the repo
+	full_path=$(realpath $0)
+	repo_root=$(dirname $full_path)
+	func_root="$repo_root"/functions_called
+else
+	func_root="$repo_root"/individual_modules/functions_called
+fi
 
-# body:
-# actually start running the main computations
-cd /data/sbdp/PHOENIX/PROTECTED/"$study"
-for p in *; do # loop over all patients in the specified study folder on PHOENIX
-	# first check that it is truly an OLID, that has phone audio data
-	if [[ ! -d $p/phone/processed/audio ]]; then
-		continue
-	fi
-	cd "$p"/phone/processed/audio
-
-	# then check that there are some decrypted files available for OpenSMILE to run on this round
-	if [ -z "$(ls -A decrypted_files)" ]; then
-		cd /data/sbdp/PHOENIX/PROTECTED/"$study" # back out of folder before skipping over patient
-		continue
-	fi
-
-	# now actually begin script
-	echo "OpenSMILE on patient ${p}"
-	if [[ ! -d opensmile_feature_extraction ]]; then
-		mkdir opensmile_feature_extraction # make subfolder in case it doesn't already exist
-	fi
+# parallelism settings - OpenSMILE is run on all new files across the study at once, with opensmile_workers SMILExtract processes going at a time (auto uses all available cores)
+# any single file taking longer than opensmile_timeout seconds is stopped and counted as failed, so one bad file can't hold up the whole run
+# each can be overridden by exporting the variable before calling this module
+if [[ -z "${opensmile_workers}" ]]; then
+	opensmile_workers="auto"
+fi
+if [[ -z "${opensmile_timeout}" ]]; then
+	opensmile_timeout=600
+fi
 
- 	# loop through the wav files in decrypted_files to run OpenSMILE
- 	# note that each OpenSMILE CSV output is named using the input WAV filename as is - so it will reflect naming convention used in decrypted_files
- 	# when run using pipeline tools, this will be just a slight modification (removing spaces) to the raw audio file naming coming from Beiwe
- 	# makes it easier to track which files have already been processed this way, and the corresponding metadata and transcript name (if available) can be found by referring to the DPDash formatted outputs the pipeline creates
- 	# (see the "filename" column in the DPDash formatted AudioQC output for a given patient to match to the OpenSMILE output names)
- 	# future steps of the pipeline that summarize OpenSMILE results will move away from this convention and focus on day numbers however
- 	# may also add a utility in the future for sharing raw OpenSMILE outputs (as we deem those non-PII) by simply copying/renaming all the existing OpenSMILE outputs into a new folder, transferring that folder using input SFTP settings, and then deleting it locally.
-	cd decrypted_files
-	for file in *.wav; do
-		if [[ ! -e $file ]]; then # avoid error message for when file doesn't exist
-			continue
-		fi
-		name=$(echo "$file" | awk -F '.' '{print $1}')
-		SMILExtract -C /data/sbdp/opensmile/opensmile-2.3.0/config/gemaps/GeMAPSv01a.conf -I "$file" --lldcsvoutput ../opensmile_feature_extraction/"$name".csv &> /dev/null
-	done
+# engine setting - smilextract runs the OpenSMILE 2.3.0 command line tool as above, python instead runs OpenSMILE in process with the opensmile python package (pip install opensmile), one patient at a time
+# the python engine saves each diary's features in a compact binary format (.npz) next to the CSV - set opensmile_save_csv to N to skip the CSV, later steps of the pipeline read either
+# note the main pipeline runs the python engine within the VAD module instead of calling this module, so that the decoded audio is shared with audio QC and VAD
+if [[ -z "${opensmile_engine}" ]]; then
+	opensmile_engine="smilextract"
+fi
+if [[ -z "${opensmile_save_csv}" ]]; then
+	opensmile_save_csv="Y"
+fi
 
-	# at end of iteration for this pt go back to top
-	cd /data/sbdp/PHOENIX/PROTECTED/"$study"
-done
\ No newline at end of file
+# body:
+# actually start running the main computations
+# the python script finds every decrypted WAV in the study that the processing ledger says still needs OpenSMILE (i.e. skipping those that failed the pre-screen or already finished in an earlier run),
+# runs SMILExtract on them with a pool of workers, records the outcome of each in the ledger, and prints a throughput summary at the end
+# the output of any SMILExtract run that failed or timed out is saved to a per-patient opensmileFailures CSV, instead of being discarded
+# note that each OpenSMILE CSV output is named using the input WAV filename as is - so it will reflect naming convention used in decrypted_files
+# when run using pipeline tools, this will be just a slight modification (removing spaces) to the raw audio file naming coming from Beiwe
+# makes it easier to track which files have already been processed this way, and the corresponding metadata and transcript name (if available) can be found by referring to the DPDash formatted outputs the pipeline creates
+# (see the "filename" column in the DPDash formatted AudioQC output for a given patient to match to the OpenSMILE output names)
+# future steps of the pipeline that summarize OpenSMILE results will move away from this convention and focus on day numbers however
+python "$func_root"/phone_audio_opensmile.py "$study" "$opensmile_timeout" "$opensmile_workers" "$opensmile_engine" "$opensmile_save_csv"
@@ -42,6 +42,15 @@ if [[ -z "${transcribeme_password}" ]]; then
 	echo ""
 fi
 
+# SFTP transfer settings - number of files moved to/from TranscribeMe at once, each over its own SFTP connection, and a cap on their combined bandwidth in MB per second (0 for no cap)
+# can be overridden by exporting sftp_channels or sftp_bandwidth_mb before calling this module
+if [[ -z "${sftp_channels}" ]]; then
+	sftp_channels=4
+fi
+if [[ -z "${sftp_bandwidth_mb}" ]]; then
+	sftp_bandwidth_mb=0
+fi
+
 # body:
 # initialize email alert txt file, if this was called by the pipeline (no email alert from standalone module)
 if [[ $pipeline == "Y" ]]; then
@@ -50,35 +59,52 @@ if [[ $pipeline == "Y" ]]; then
 	# give some additional context for what will be inside this email
 	echo "Each newly pulled phone diary transcript and each phone transcript still being waited on are listed below, split by OLID. Additionally, if warnings were encountered during the process of pulling an available transcript, they will be listed under the corresponding patient section. If any (known) issues arose with subsequent transcript processing steps, a description is appended at the bottom of this email." >> "$repo_root"/transcript_lab_email_body.txt
 fi
-# actually start running the main computations
+# actually start running the main computations - first get patient folders ready for the pull
 cd /data/sbdp/PHOENIX/PROTECTED/"$study"
 for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	# first check that it is truly an OLID, that has had some files successfully pushed to transcribeme in the past
 	if [[ ! -d $p/phone/processed/audio/pending_audio ]]; then
 		continue
 	fi
-	cd "$p"/phone/processed/audio
 	# also check that pending_audio is not empty, so we know if there are actually files actively being waited on
-	if [ -z "$(ls -A pending_audio)" ]; then
-   		# back out of pt folder if there is nothing to check for
-		cd /data/sbdp/PHOENIX/PROTECTED/"$study"
+	if [ -z "$(ls -A $p/phone/processed/audio/pending_audio)" ]; then
 		continue
 	fi
 	# create transcripts folder if it hasn't been done for this patient yet
-	if [[ ! -d transcripts ]]; then
-		mkdir transcripts
+	if [[ ! -d $p/phone/processed/audio/transcripts ]]; then
+		mkdir $p/phone/processed/audio/transcripts
 	fi
 
 	# announce each patient that will be input to the python script on this run through
 	echo "Checking ${p}"
+done
+
+# this script will go through the pending_audio folder for every patient, check for corresponding named outputs on the transcribeme server, pulling them if available
+# transcripts from all patients are pulled sftp_channels at a time, each over its own SFTP connection
+# it will also do file management on the server, update the pending_audio folder accordingly
+# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
+python "$func_root"/phone_transcribeme_sftp_pull.py "$study" all "$transcribeme_password" "$pipeline" "$sftp_channels" "$sftp_bandwidth_mb"
 
-	# this script will go through the pending_audio folder for this patient, check for corresponding named outputs on the transcribeme server, pulling them if available
-	# it will also do file management on the server, update the pending_audio folder accordingly
-	# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
-	python "$func_root"/phone_transcribeme_sftp_pull.py "$study" "$p" "$transcribeme_password" "$pipeline" "$repo_root"/transcript_lab_email_body.txt
+# now go back through patients to add the new info about each to the email alert body (if this is part of pipeline)
+for p in *; do
+	if [[ ! -d $p/phone/processed/audio/pending_audio ]]; then
+		continue
+	fi
+	cd "$p"/phone/processed/audio
+	# skip patients that had nothing pending (they will have no pulled files or server warning)
+	if [ -z "$(ls -A pending_audio)" ] && [[ ! -e transcribeme_cleanup_warning.txt ]]; then
+		cd /data/sbdp/PHOENIX/PROTECTED/"$study"
+		continue
+	fi
 
 	# now add new info about this OLID to email alert body (if this is part of pipeline)
 	if [[ $pipeline == "Y" ]]; then
+		# any warning from cleaning up the transcribeme server goes just above this patient's section
+		if [[ -e transcribeme_cleanup_warning.txt ]]; then
+			cat transcribeme_cleanup_warning.txt >> "$repo_root"/transcript_lab_email_body.txt
+			rm transcribeme_cleanup_warning.txt
+		fi
+
 		# pending_audio folder will contain all necessary info
 		cd pending_audio
 
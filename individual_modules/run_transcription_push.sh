@@ -57,6 +57,15 @@ if [[ -z "${transcribeme_password}" ]]; then
 	echo ""
 fi
 
+# SFTP transfer settings - number of files moved to/from TranscribeMe at once, each over its own SFTP connection, and a cap on their combined bandwidth in MB per second (0 for no cap)
+# can be overridden by exporting sftp_channels or sftp_bandwidth_mb before calling this module
+if [[ -z "${sftp_channels}" ]]; then
+	sftp_channels=4
+fi
+if [[ -z "${sftp_bandwidth_mb}" ]]; then
+	sftp_bandwidth_mb=0
+fi
+
 # body:
 # actually start running the main computations - first check that total length doesn't exceed the threshold, if necessary
 if [ $auto_send_limit_bool = "Y" ] || [ $auto_send_limit_bool = "y" ]; then
@@ -71,7 +80,7 @@ if [ $auto_send_limit_bool = "Y" ] || [ $auto_send_limit_bool = "y" ]; then
 	fi
 fi
 
-# now start going through patients for the upload
+# now start going through patients to get their folders ready for the upload
 cd /data/sbdp/PHOENIX/PROTECTED/"$study"
 for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	# first check that it is truly an OLID, that has phone audio data to send
@@ -90,23 +99,27 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 
 	if [ -z "$(ls -A to_send)" ]; then # also check that to_send isn't empty
 		rm -rf to_send # if it is empty, clear it out!
-		cd /data/sbdp/PHOENIX/PROTECTED/"$study" # back out of pt folder before skipping
-		continue
 	fi
 
-	# this script will go through the files in to_send and send them to transcribeme, moving them to pending_audio if push was successful
-	# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
-	python "$func_root"/phone_transcribeme_sftp_push.py "$study" "$p" "$transcribeme_password" "$pipeline"
+	# back out of pt folder when done
+	cd /data/sbdp/PHOENIX/PROTECTED/"$study"
+done
+
+# this script will go through the files in to_send for every patient and send them to transcribeme, moving them to pending_audio if push was successful
+# files from all patients are pushed sftp_channels at a time, each connection reused for every file it pushes and only reopened if it drops - rather than logging in again for every file
+# behaves slightly differently whether this is called individually or via pipeline, because when called via pipeline have email alert related work to do
+python "$func_root"/phone_transcribeme_sftp_push.py "$study" all "$transcribeme_password" "$pipeline" "$sftp_channels" "$sftp_bandwidth_mb"
 
-	# check if to_send is empty now - if so delete it, if not print an error message
-	if [ -z "$(ls -A to_send)" ]; then
-   		rm -rf to_send
+# finally check each patient's to_send - if empty now delete it, if not print an error message
+for p in *; do
+	if [[ ! -d $p/phone/processed/audio/to_send ]]; then
+		continue
+	fi
+	if [ -z "$(ls -A $p/phone/processed/audio/to_send)" ]; then
+   		rm -rf $p/phone/processed/audio/to_send
 	else
 		echo ""
    		echo "Warning: some diaries meant to be pushed to TranscribeMe failed to upload. Check /data/sbdp/PHOENIX/PROTECTED/${study}/${p}/phone/processed/audio/to_send for more info."
    		echo ""
 	fi
-
-	# back out of pt folder when done
-	cd /data/sbdp/PHOENIX/PROTECTED/"$study"
-done
\ No newline at end of file
+done
@@ -34,6 +34,80 @@ else
 	func_root="$repo_root"/individual_modules/functions_called
 fi
 
+# QC setting - if Y, audio QC is run at the start of the same python process as VAD, so each diary is only decoded once across audio QC, VAD, and pause-derived QC
+# the main pipeline sets this to Y (in place of running the audio QC module separately), when called stand alone defaults to N as audio QC has its own module
+if [[ -z "${vad_with_qc}" ]]; then
+	vad_with_qc="N"
+fi
+
+# memory budget (in MB) for decoded audio shared between those stages - least recently used audio is dropped (and decoded again if needed) beyond this
+# can be overridden by exporting audio_buffer_mb before calling this module
+if [[ -z "${audio_buffer_mb}" ]]; then
+	audio_buffer_mb=2048
+fi
+
+# OpenSMILE setting - if Y, OpenSMILE is run in process (opensmile python package) right after audio QC in the same python process, on the already decoded audio, instead of by the OpenSMILE module
+# the main pipeline sets this to Y when opensmile_engine is python, opensmile_save_csv set to N then saves only the binary (.npz) version of the features
+if [[ -z "${vad_with_opensmile}" ]]; then
+	vad_with_opensmile="N"
+fi
+if [[ -z "${opensmile_save_csv}" ]]; then
+	opensmile_save_csv="Y"
+fi
+
+# pause detection settings - if vad_fused is Y, pauses are detected within VAD on the in-memory foreground spectrogram, instead of writing foreground audio and reading it back in a separate step
+# vad_save_foreground set to Y still writes the foreground audio to decrypted_files/foreground_audio (always done when vad_fused is N)
+# vad_pause_spectrogram of resynthesized gives exactly the same pause times as the separate step, foreground skips two transforms per diary but changes the pauses (threshold not yet retuned for it)
+# each can be overridden by exporting the variable before calling this module
+if [[ -z "${vad_fused}" ]]; then
+	vad_fused="Y"
+fi
+if [[ -z "${vad_save_foreground}" ]]; then
+	vad_save_foreground="N"
+fi
+if [[ -z "${vad_pause_spectrogram}" ]]; then
+	vad_pause_spectrogram="resynthesized"
+fi
+
+# nearest neighbor filter engine used by VAD to separate the foreground - librosa is the original, blocked gives the same result computed in blocks (only faster for short diaries), approximate uses fewer neighbours searched over a limited range for a large speedup on long diaries
+# see vad_engine_functions.py, and compare them on real diaries with python ../benchmarks/phone_audio_benchmarks.py nn_filter [WAV paths] before switching
+if [[ -z "${vad_nn_engine}" ]]; then
+	vad_nn_engine="librosa"
+fi
+
+# chunked VAD setting - above 0, the foreground separation is run in chunks of that many seconds (with about 2 minutes of context either side), so memory use no longer grows with diary length
+# 0 (the default) separates each diary all at once as always - diaries no longer than a chunk come out exactly the same either way, longer ones change slightly with the librosa engine (and not at all with approximate)
+if [[ -z "${vad_chunk_sec}" ]]; then
+	vad_chunk_sec=0
+fi
+
+# numeric precision setting - float64 (the default) gives the original outputs, float32 roughly halves the memory used by the audio QC, pause detection, and pause-derived QC arrays
+# float32 outputs stay within the tolerances in tests/reference_functions.py (FLOAT32_TOLERANCES) of the float64 ones, check with python ../benchmarks/phone_audio_benchmarks.py float32 [WAV paths]
+# profile_stages set to Y also records the time and peak memory of each diary in each stage, appended to processed/audio/[study]_[OLID]_phone_audio_stage_profile.csv
+if [[ -z "${audio_dtype}" ]]; then
+	audio_dtype="float64"
+fi
+if [[ -z "${profile_stages}" ]]; then
+	profile_stages="N"
+fi
+
+# VAD backend - separation is the original foreground separation VAD (with the nearest neighbor filter engine above), energy instead finds pauses straight from each diary's spectrogram by frame energy and spectral flux
+# energy is roughly 100x faster but gives somewhat different pauses, so it is meant for quick triage runs - it always detects pauses within VAD (as if vad_fused were Y), and has no foreground audio or foreground/background image
+# compare them on real diaries with python ../benchmarks/phone_audio_benchmarks.py vad_backends [WAV paths] before choosing
+if [[ -z "${vad_backend}" ]]; then
+	vad_backend="separation"
+fi
+
+# spectrogram image settings - if vad_spectrograms is Y, VAD and pause-derived QC queue their spectrogram comparison images (in processed/audio/spectrogram_queue) instead of drawing them inline,
+# and the queued images are all rendered at the end of this module by phone_audio_spectrograms.py, using a pool of spectrogram_workers processes (auto uses the available cores)
+# set vad_spectrograms to N to skip the images entirely (this also skips the pause and speech transforms pause-derived QC only computes for them)
+if [[ -z "${vad_spectrograms}" ]]; then
+	vad_spectrograms="Y"
+fi
+if [[ -z "${spectrogram_workers}" ]]; then
+	spectrogram_workers="auto"
+fi
+
 # body:
 # actually start running the main computations
 cd /data/sbdp/PHOENIX/PROTECTED/"$study"
@@ -55,8 +129,10 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	fi
 
 	# if good to go, setup relevant folders for the VAD outputs
-	# first the temp audio output folder that needs to be created every time
-	mkdir decrypted_files/foreground_audio
+	# first the temp audio output folder that needs to be created every time foreground audio is saved
+	if [ $vad_backend = "separation" ] && ( [ $vad_fused = "N" ] || [ $vad_save_foreground = "Y" ] ); then
+		mkdir decrypted_files/foreground_audio
+	fi
 	# then the permanent output folders in the case that they don't already exist (new patient)
 	if [[ ! -d vad_spectrogram_comparisons ]]; then
 		mkdir vad_spectrogram_comparisons
@@ -66,11 +142,22 @@ for p in *; do # loop over all patients in the specified study folder on PHOENIX
 	fi
 	
 	# now finally run script on this patient
-	python "$func_root"/phone_audio_vad.py "$study" "$p"
+	# each setting is passed as a named option with the same name as its variable above (see python phone_audio_vad.py -h), so the order doesn't matter
+	python "$func_root"/phone_audio_vad.py "$study" "$p" \
+		--vad_with_qc "$vad_with_qc" --audio_buffer_mb "$audio_buffer_mb" \
+		--vad_fused "$vad_fused" --vad_save_foreground "$vad_save_foreground" --vad_pause_spectrogram "$vad_pause_spectrogram" \
+		--vad_nn_engine "$vad_nn_engine" --vad_backend "$vad_backend" --vad_chunk_sec "$vad_chunk_sec" \
+		--vad_with_opensmile "$vad_with_opensmile" --opensmile_save_csv "$opensmile_save_csv" \
+		--vad_spectrograms "$vad_spectrograms" --audio_dtype "$audio_dtype" --profile_stages "$profile_stages"
 
 	# back out of folder before continuing to next patient
 	cd /data/sbdp/PHOENIX/PROTECTED/"$study"
 
 	# foreground_audio will be deleted as part of the main pipeline script, when the decrypted_files folder is deleted
 	# when running this module stand alone, will be up to user to deal with decrypted files manually
-done
\ No newline at end of file
+done
+
+# render the spectrogram images queued across the study above
+if [[ $vad_spectrograms = "Y" ]]; then
+	python "$func_root"/phone_audio_spectrograms.py "$study" "$spectrogram_workers"
+fi
@@ -150,7 +150,7 @@ now=$(date +"%T")
 echo "Current time: ${now}"
 echo ""
 
-# format file metadata first - fast, so just rerun for all audio diaries every time
+# format file metadata first - rerun for all patients every time, but each ETFileMap is only updated with recordings new since the last run (see filemap_incremental in run_metadata_generation.sh)
 echo "Creating timezone map for all audio diaries"
 bash "$repo_root"/individual_modules/run_metadata_generation.sh
 echo ""
@@ -173,9 +173,13 @@ now=$(date +"%T")
 echo "Current time: ${now}"
 echo ""
 
-# now run audio QC
-echo "Running audio QC on newly decrypted files"
-bash "$repo_root"/individual_modules/run_audio_qc.sh
+# pre-screen the newly decrypted files against the length and volume cutoffs, so that obvious rejects skip OpenSMILE and VAD
+# (when auto transcription is off the cutoffs are 0, so nothing will be rejected here)
+echo "Pre-screening newly decrypted files"
+export length_cutoff
+export db_cutoff
+bash "$repo_root"/individual_modules/run_audio_prescreen.sh
+# cutoffs are left set here, as audio selection below needs them too (they are unset once it is done)
 echo ""
 
 # add current time for runtime tracking purposes
@@ -183,9 +187,18 @@ now=$(date +"%T")
 echo "Current time: ${now}"
 echo ""
 
-# then run OpenSMILE
-echo "Running OpenSMILE on newly decrypted files"
-bash "$repo_root"/individual_modules/run_opensmile.sh
+# run OpenSMILE
+# with the default smilextract engine this is its own module, with the python engine (export opensmile_engine="python" before running the pipeline) it is instead run in process by the VAD module below,
+# so that it works from the same decoded audio as audio QC and VAD
+if [[ -z "${opensmile_engine}" ]]; then
+	opensmile_engine="smilextract"
+fi
+if [[ $opensmile_engine = "python" ]]; then
+	echo "OpenSMILE will be run in process along with audio QC and VAD"
+else
+	echo "Running OpenSMILE on newly decrypted files"
+	bash "$repo_root"/individual_modules/run_opensmile.sh
+fi
 echo ""
 
 # add current time for runtime tracking purposes
@@ -193,9 +206,16 @@ now=$(date +"%T")
 echo "Current time: ${now}"
 echo ""
 
-# now run VAD - includes full list of identified pause times, calculation of additional QC measures, filtering of OpenSMILE results, and creation of spectrograms
-echo "Running VAD functions on newly decrypted files"
+# now run audio QC and VAD - VAD includes full list of identified pause times, calculation of additional QC measures, filtering of OpenSMILE results, and creation of spectrograms
+# audio QC is run within the VAD module's python process, so each diary only needs to be decoded once for all of these
+echo "Running audio QC and VAD functions on newly decrypted files"
+export vad_with_qc="Y"
+if [[ $opensmile_engine = "python" ]]; then
+	export vad_with_opensmile="Y"
+fi
 bash "$repo_root"/individual_modules/run_vad.sh
+unset vad_with_qc
+unset vad_with_opensmile
 echo ""
 
 # add current time for runtime tracking purposes
@@ -0,0 +1,26 @@
+# puts the pipeline's functions_called folder on the path, so the tests import its modules the same way the pipeline scripts do
+# this folder is put on the path by pytest, for the reference versions in reference_functions.py
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "individual_modules", "functions_called"))
+
+from local_sftp_server import start_local_sftp_server, stop_local_sftp_server
+
+# starts local SFTP servers standing in for TranscribeMe (see local_sftp_server.py), each serving a folder with an empty audio subfolder under the test's temporary folder
+# call it with the name of the folder and any other keyword arguments of start_local_sftp_server, the login is always partners_itp with password pw
+# it returns the server state, with the "port" to connect to and the "root_folder" served - every server started is stopped at the end of the test
+@pytest.fixture
+def sftp_server(tmp_path):
+	servers = []
+	def start(name="server", **kwargs):
+		server_folder = tmp_path / name
+		(server_folder / "audio").mkdir(parents=True)
+		server = start_local_sftp_server(str(server_folder), "partners_itp", "pw", **kwargs)
+		servers.append(server)
+		return server
+	yield start
+	for server in servers:
+		stop_local_sftp_server(server)
@@ -0,0 +1,190 @@
+# a local SFTP server standing in for the TranscribeMe server, for checking the SFTP code without touching the real one (see the sftp_server fixture in conftest.py, and benchmarks/phone_audio_benchmarks.py)
+# it serves a local folder to a single username and password on a free port of localhost, from background threads of the calling process
+# it can also be set to drop a connection after a number of uploaded files, or to take extra time over each login and each request, to check reconnecting and to give the handshake and transfers a more realistic cost
+# note paramiko needs its server interfaces to be subclassed, which is why this module has classes
+
+import os
+import time
+import socket
+import threading
+import paramiko
+
+# accepts only the given username and password
+class LocalServerInterface(paramiko.ServerInterface):
+	def __init__(self, transport, username, password, login_delay_sec):
+		self.transport = transport
+		self.username = username
+		self.password = password
+		self.login_delay_sec = login_delay_sec
+
+	def check_auth_password(self, username, password):
+		time.sleep(self.login_delay_sec)
+		if username == self.username and password == self.password:
+			return paramiko.AUTH_SUCCESSFUL
+		return paramiko.AUTH_FAILED
+
+	def get_allowed_auths(self, username):
+		return "password"
+
+	def check_channel_request(self, kind, chanid):
+		if kind == "session":
+			return paramiko.OPEN_SUCCEEDED
+		return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+# an open file on the server - counts finished uploads, and drops the connection once the server's drop_after count is reached
+class LocalSFTPHandle(paramiko.SFTPHandle):
+	def read(self, offset, length):
+		time.sleep(self.server_state["request_delay_sec"])
+		return super(LocalSFTPHandle, self).read(offset, length)
+
+	def write(self, offset, data):
+		time.sleep(self.server_state["request_delay_sec"])
+		return super(LocalSFTPHandle, self).write(offset, data)
+
+	def stat(self):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def close(self):
+		super(LocalSFTPHandle, self).close()
+		if self.writing:
+			state = self.server_state
+			with state["lock"]:
+				state["files_uploaded"] = state["files_uploaded"] + 1
+				drop = state["drop_after"] is not None and state["files_uploaded"] % state["drop_after"] == 0
+			if drop:
+				threading.Thread(target=self.transport.close, daemon=True).start() # from another thread, as this one is handling the request
+
+# maps SFTP paths onto the served folder
+class LocalSFTPFolder(paramiko.SFTPServerInterface):
+	def __init__(self, server, root_folder, server_state, *args, **kwargs):
+		super(LocalSFTPFolder, self).__init__(server, *args, **kwargs)
+		self.root_folder = root_folder
+		self.server_state = server_state
+		self.transport = server.transport
+
+	def local_path(self, path):
+		time.sleep(self.server_state["request_delay_sec"]) # every request on a path goes through here
+		return os.path.join(self.root_folder, self.canonicalize(path).lstrip("/"))
+
+	def list_folder(self, path):
+		try:
+			folder = self.local_path(path)
+			attrs = []
+			for name in os.listdir(folder):
+				attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(folder, name)))
+				attr.filename = name
+				attrs.append(attr)
+			return attrs
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def stat(self, path):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.stat(self.local_path(path)))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def lstat(self, path):
+		try:
+			return paramiko.SFTPAttributes.from_stat(os.lstat(self.local_path(path)))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+
+	def open(self, path, flags, attr):
+		path = self.local_path(path)
+		try:
+			fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o644)
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		if flags & os.O_WRONLY:
+			mode = "ab" if flags & os.O_APPEND else "wb"
+		elif flags & os.O_RDWR:
+			mode = "a+b" if flags & os.O_APPEND else "r+b"
+		else:
+			mode = "rb"
+		try:
+			f = os.fdopen(fd, mode)
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		handle = LocalSFTPHandle(flags)
+		handle.filename = path
+		handle.readfile = f
+		handle.writefile = f
+		handle.writing = bool(flags & (os.O_WRONLY | os.O_RDWR))
+		handle.server_state = self.server_state
+		handle.transport = self.transport
+		return handle
+
+	def remove(self, path):
+		try:
+			os.remove(self.local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def rename(self, oldpath, newpath):
+		try:
+			os.rename(self.local_path(oldpath), self.local_path(newpath))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def mkdir(self, path, attr):
+		try:
+			os.mkdir(self.local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+	def rmdir(self, path):
+		try:
+			os.rmdir(self.local_path(path))
+		except OSError as e:
+			return paramiko.SFTPServer.convert_errno(e.errno)
+		return paramiko.SFTP_OK
+
+# serves one client connection until it closes
+def serve_connection(client_socket, server_state):
+	transport = paramiko.Transport(client_socket)
+	transport.add_server_key(server_state["host_key"])
+	transport.set_subsystem_handler("sftp", paramiko.SFTPServer, LocalSFTPFolder, server_state["root_folder"], server_state)
+	with server_state["lock"]:
+		server_state["transports"].append(transport)
+		server_state["connections"] = server_state["connections"] + 1
+	try:
+		transport.start_server(server=LocalServerInterface(transport, server_state["username"], server_state["password"], server_state["login_delay_sec"]))
+	except:
+		transport.close()
+
+def accept_connections(listen_socket, server_state):
+	while not server_state["stopped"]:
+		try:
+			client_socket, address = listen_socket.accept()
+		except:
+			return
+		threading.Thread(target=serve_connection, args=(client_socket, server_state), daemon=True).start()
+
+# starts the server for root_folder (which must already exist) in background threads, and returns its state - a dict with the "port" to connect to on localhost,
+# along with running counts of "connections" made and "files_uploaded"
+# if drop_after is given, the connection a file was uploaded over is closed by the server after every drop_after uploads (counted across connections)
+# login_delay_sec is added to every login, e.g. to make the handshake cost closer to that of a remote server
+# request_delay_sec is added to every request (each 32 KB read or write of a file, and each operation on a path) - the server answers the requests of a connection one at a time, so this limits each connection's rate much as the round trips to a remote server do
+def start_local_sftp_server(root_folder, username, password, drop_after=None, login_delay_sec=0, request_delay_sec=0):
+	listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	listen_socket.bind(("127.0.0.1", 0))
+	listen_socket.listen(50)
+	server_state = {"port": listen_socket.getsockname()[1], "root_folder": os.path.abspath(root_folder), "username": username, "password": password, "drop_after": drop_after, "login_delay_sec": login_delay_sec, "request_delay_sec": request_delay_sec,
+					"host_key": paramiko.RSAKey.generate(2048), "lock": threading.Lock(), "transports": [], "connections": 0, "files_uploaded": 0, "stopped": False, "listen_socket": listen_socket}
+	threading.Thread(target=accept_connections, args=(listen_socket, server_state), daemon=True).start()
+	return server_state
+
+# stops a server started by start_local_sftp_server, closing any connections still open
+def stop_local_sftp_server(server_state):
+	server_state["stopped"] = True
+	server_state["listen_socket"].close()
+	for transport in server_state["transports"]:
+		transport.close()
@@ -0,0 +1,506 @@
+# original versions of the optimized parts of the audio pipeline, along with generators for the synthetic inputs they are compared on
+# kept here rather than in functions_called so they aren't lost when the pipeline code changes - used by the tests in this folder, and by benchmarks/phone_audio_benchmarks.py for the timing comparisons
+
+# prevent librosa from logging a warning every time it is imported
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import os
+import glob
+import time
+import shutil
+import numpy as np
+import librosa
+import pandas as pd
+from datetime import date, datetime, timedelta
+import pytz
+import paramiko
+
+# makes a synthetic diary-like signal - alternating stretches of voiced sound and quiet background noise, with random stretch lengths
+# returns (audio, sample rate)
+def synthetic_diary(seconds=60, sr=22050, seed=0):
+	rng = np.random.default_rng(seed)
+	num_samples = int(seconds * sr)
+	t = np.arange(num_samples) / float(sr)
+	envelope = np.zeros(num_samples)
+	cur = 0
+	speaking = True
+	while cur < num_samples:
+		stretch = int(rng.uniform(0.2, 3.0) * sr)
+		if speaking:
+			envelope[cur:cur+stretch] = rng.uniform(0.1, 0.5)
+		speaking = not speaking
+		cur = cur + stretch
+	pitch = 120 + 60 * np.sin(2 * np.pi * 0.3 * t)
+	voiced = np.sin(2 * np.pi * np.cumsum(pitch) / sr) + 0.3 * rng.standard_normal(num_samples)
+	audio = envelope * voiced + 0.0002 * rng.standard_normal(num_samples)
+	return (audio.astype(np.float32), sr)
+
+# compares two sets of pause periods (as returned by detect_pauses) by the spectrogram indices they mark as pause
+# returns (number of indices both mark as pause, number of indices either marks as pause)
+def pause_overlap(pauses_a, pauses_b):
+	indices_a = set()
+	for first, last, num in pauses_a:
+		indices_a.update(range(first, last+1))
+	indices_b = set()
+	for first, last, num in pauses_b:
+		indices_b.update(range(first, last+1))
+	return (len(indices_a.intersection(indices_b)), len(indices_a.union(indices_b)))
+
+# fraction of pause spectrogram indices two sets of pause periods agree on, out of all indices either marks as pause
+def pause_agreement(pauses_a, pauses_b):
+	num_both, num_either = pause_overlap(pauses_a, pauses_b)
+	if num_either == 0:
+		return 1.0
+	return float(num_both) / num_either
+
+# tolerances the float32 numeric mode is held to against float64 - decibel levels in dB, standard deviation and spectral flatness relative to the float64 value, and the minimum fraction of pause spectrogram indices agreeing
+FLOAT32_TOLERANCES = {"db": 0.001, "std": 1e-5, "flatness": 1e-4, "pause_agreement": 0.99}
+
+# original pause detection from phone_audio_vad.diary_pause_detect, before it was vectorized
+# returns the pause periods in the same format as detect_pauses
+def legacy_detect_pauses(S_full, fs, spec_thres=0.03, window_sec=0.25, slide_sec=0.05, samples_per_spec_bin=512):
+	num_timepoints = S_full.shape[1]
+	window_len = int((float(fs)/samples_per_spec_bin) * window_sec)
+	slide_len = int((float(fs)/samples_per_spec_bin) * slide_sec)
+
+	diary_summary = []
+	for i in range(0, num_timepoints, slide_len):
+		window_max = []
+		for j in range(i, i+window_len):
+			try:
+				cur_time = S_full[:,j].flatten()
+			except:
+				continue
+			cur_max = np.max(cur_time)
+			window_max.append(cur_max)
+		window_max = np.array(window_max)
+		cur_RMS = np.sqrt(np.mean(window_max**2))
+		diary_summary.append(cur_RMS)
+
+	diary_summary = np.array(diary_summary)
+	low_indices = np.where(diary_summary < spec_thres)[0]
+
+	pause_indices = []
+	timepoints_list = list(range(0, num_timepoints, slide_len))
+	for ind in low_indices:
+		start_point = timepoints_list[ind]
+		pause_indices.extend(range(start_point, start_point+window_len))
+	pause_indices = list(set(pause_indices))
+	pause_indices.sort()
+	if len(pause_indices) == 0:
+		return []
+
+	pause_periods = np.split(pause_indices, np.where(np.diff(pause_indices) != 1)[0]+1)
+	results = []
+	for pause in pause_periods:
+		if len(pause) < 2:
+			continue
+		results.append((int(pause[0]), int(pause[-1]), len(pause)))
+	return results
+
+# original assembly of the pause-only and speech-only signals in phone_audio_vad.diary_pause_qc, before it used a sample mask
+# returns (pause signal, speech signal)
+def legacy_pause_speech_signals(chan1, pause_starts, pause_stops):
+	pauses_only = np.array([])
+	for x in range(len(pause_starts)): # extend numpy array with the audio values from each pause
+		pauses_only = np.append(pauses_only, chan1[pause_starts[x]:pause_stops[x]])
+	speech_only = np.array([])
+	speech_start = [0]
+	for t in pause_stops:
+		speech_start.append(t)
+	speech_stop = []
+	for t in pause_starts:
+		speech_stop.append(t)
+	speech_stop.append(len(chan1)-1)
+	for x in range(len(speech_start)):
+		speech_only = np.append(speech_only, chan1[speech_start[x]:speech_stop[x]])
+	return (pauses_only, speech_only)
+
+# original filtering of the OpenSMILE LLDs by pause times in phone_audio_vad.diary_pause_qc, before it used pause_frame_mask
+# returns the filtered df of the given feature columns, with frameTime added back at the end
+def legacy_filter_opensmile(raw_os_result, pause_start_times, pause_stop_times, feature_cols):
+	raw_os_result = raw_os_result.copy()
+	os_start_times = raw_os_result["frameTime"].tolist()
+	os_stop_times = [t + 0.01 for t in os_start_times]
+	raw_os_result["frameStop"] = os_stop_times
+	for p_start,p_stop in zip(pause_start_times, pause_stop_times):
+		raw_os_result.loc[(raw_os_result["frameTime"] >= p_start) & (raw_os_result["frameStop"] <= p_stop)] = np.nan
+	raw_os_result = raw_os_result[feature_cols]
+	raw_os_result["frameTime"] = os_start_times
+	return raw_os_result
+
+# makes a table of 10 ms frames in the OpenSMILE LLD layout covering seconds of audio, with random values for the given feature columns (as OpenSMILE is not needed to check the pause filtering)
+def synthetic_frame_table(seconds, feature_cols, seed=0):
+	num_frames = int(seconds / 0.01)
+	rng = np.random.default_rng(seed)
+	raw_os_result = pd.DataFrame()
+	raw_os_result["name"] = ["'unknown'"] * num_frames
+	raw_os_result["frameTime"] = np.round(np.arange(num_frames) * 0.01, 2)
+	for col in feature_cols:
+		raw_os_result[col] = rng.standard_normal(num_frames)
+	return raw_os_result
+
+# makes OpenSMILE LLDs for seconds of audio with random values, in the layout extract_lld returns - 10 ms frames, with NaN where unvoiced like the _sma3nz features
+def synthetic_lld(seconds, feature_cols, seed=0):
+	num_frames = int(seconds / 0.01)
+	rng = np.random.default_rng(seed)
+	lld = pd.DataFrame()
+	lld["name"] = ["'unknown'"] * num_frames
+	lld["frameTime"] = np.round(np.arange(num_frames) * 0.01, 6)
+	for feature in feature_cols:
+		lld[feature] = rng.standard_normal(num_frames)
+		if feature.endswith("nz"):
+			lld.loc[rng.random(num_frames) < 0.3, feature] = np.nan
+	return lld
+
+# original incremental CSV save, as used for the audio QC, pause times, pause-derived QC, and transcript NLP outputs before the feature store
+def legacy_save_csv(output_path, new_df, key_cols):
+	if os.path.isfile(output_path): # concatenate first if necessary
+		old_df = pd.read_csv(output_path)
+		join_csv = pd.concat([old_df, new_df])
+		join_csv.reset_index(drop=True, inplace=True)
+		join_csv.drop_duplicates(subset=key_cols,inplace=True)
+		join_csv.to_csv(output_path,index=False)
+	else:
+		new_df.to_csv(output_path,index=False)
+
+# checks two tables have the same columns and rows, with numeric values allowed to differ by float rounding - values written to CSV and read back in (as the original saves did every run) can be off in the last digit
+def tables_match(table_a, table_b):
+	if table_a.columns.tolist() != table_b.columns.tolist() or table_a.shape != table_b.shape:
+		return False
+	for col in table_a.columns:
+		if pd.api.types.is_numeric_dtype(table_a[col]) and pd.api.types.is_numeric_dtype(table_b[col]):
+			if not np.allclose(table_a[col].to_numpy(dtype=float), table_b[col].to_numpy(dtype=float), rtol=1e-12, atol=0, equal_nan=True):
+				return False
+		elif table_a[col].tolist() != table_b[col].tolist():
+			return False
+	return True
+
+# makes one week of audio QC style rows for a synthetic patient (7 diaries), with a couple of NaNs in the way real outputs can have them
+def synthetic_qc_rows(week, rng):
+	rows = pd.DataFrame()
+	rows["OLID"] = ["AAAAA"] * 7
+	rows["filename"] = ["week" + str(week).zfill(4) + "_day" + str(d) + ".wav" for d in range(7)]
+	rows["length(minutes)"] = rng.random(7) * 3
+	rows["stereo?"] = [0] * 7
+	rows["overall_db"] = rng.normal(60, 5, 7)
+	rows["mean_flatness"] = rng.random(7)
+	rows.loc[rng.random(7) < 0.1, "mean_flatness"] = np.nan
+	return rows
+
+# makes pause times rows for one week of diaries for a synthetic patient (7 diaries, each with 50 to 300 pauses), in the pause times CSV layout
+def synthetic_pause_rows(week, rng):
+	filenames = []
+	pause_ids = []
+	pause_starts = []
+	pause_stops = []
+	pause_lengths = []
+	for d in range(7):
+		num_pauses = int(rng.integers(50, 300))
+		starts = np.cumsum(rng.integers(2000, 40000, num_pauses))
+		lengths = rng.integers(5000, 20000, num_pauses)
+		filenames.extend(["week" + str(week).zfill(4) + "_day" + str(d) + ".wav"] * num_pauses)
+		pause_ids.extend(range(1, num_pauses + 1))
+		pause_starts.extend(starts.tolist())
+		pause_stops.extend((starts + lengths).tolist())
+		pause_lengths.extend((lengths / 44100.0).tolist())
+	rows = pd.DataFrame()
+	rows["filename"] = filenames
+	rows["pause_number"] = pause_ids
+	rows["pause_start_bin"] = pause_starts
+	rows["pause_stop_bin"] = pause_stops
+	rows["pause_length_seconds"] = pause_lengths
+	return rows
+
+# original inline rendering of the VAD foreground/background comparison image, drawn at full resolution straight from the spectrograms
+def legacy_comparison_image(S_full, S_background, S_foreground, sr, image_out_path):
+	import matplotlib.pyplot as plt
+	import librosa.display
+	plt.figure(figsize=(12, 8))
+	plt.subplot(3, 1, 1)
+	librosa.display.specshow(librosa.amplitude_to_db(S_full, ref=np.max),y_axis='log', sr=sr)
+	plt.title('Full spectrum')
+	plt.colorbar()
+	plt.subplot(3, 1, 2)
+	librosa.display.specshow(librosa.amplitude_to_db(S_background, ref=np.max),y_axis='log', sr=sr)
+	plt.title('Background')
+	plt.colorbar()
+	plt.subplot(3, 1, 3)
+	librosa.display.specshow(librosa.amplitude_to_db(S_foreground, ref=np.max),y_axis='log', x_axis='time', sr=sr)
+	plt.title('Foreground')
+	plt.colorbar()
+	plt.tight_layout()
+	plt.savefig(image_out_path)
+	plt.close()
+
+# adds one week of synthetic raw Beiwe recordings to the raw folder, as empty .lock files - usually one a day at a random UTC time, with the odd same-day repeat or missed day
+# phones are swapped every year and the prompt folder recordings are saved under changes every 3 months, with some recordings saved directly in audio_recordings
+# folder modification times are then set back a day, as though the week had passed before the next run
+# returns the paths of the recordings added
+def add_raw_week(raw_folder, week, rng, start=datetime(2019, 1, 1)):
+	added = []
+	touched = set()
+	for d in range(7):
+		num_recordings = int(rng.choice([0, 1, 1, 1, 1, 1, 2]))
+		for r in range(num_recordings):
+			when = start + timedelta(days=week * 7 + d, seconds=int(rng.integers(0, 86400)))
+			folder = os.path.join(raw_folder, "phone" + str(week // 52), "audio_recordings")
+			if rng.random() > 0.2:
+				folder = os.path.join(folder, "prompt" + str(week // 13))
+			if not os.path.isdir(folder):
+				os.makedirs(folder)
+			path = os.path.join(folder, when.strftime("%Y-%m-%d %H_%M_%S") + ".mp4.lock")
+			open(path, "w").close()
+			added.append(path)
+			touched.add(folder)
+	past_ns = time.time_ns() - 86400 * 10**9
+	for folder in touched:
+		while folder != os.path.dirname(raw_folder):
+			os.utime(folder, ns=(past_ns, past_ns))
+			folder = os.path.dirname(folder)
+	return added
+
+# original daylight savings check used by the ETFileMap - note it is given the UTC hour from the file name as though it were already local time
+def legacy_is_dst(dt, timezone="US/Eastern"):
+	timezone = pytz.timezone(timezone)
+	timezone_aware_date = timezone.localize(dt, is_dst=None)
+	return timezone_aware_date.tzinfo._dst.seconds != 0
+
+# original per-file loop that maps each study day to its first recording in Eastern Time, given the recording paths (relative to the raw folder) - returns the ETFileMap table
+def legacy_eastern_time_filemap(files_absolute):
+	is_dst = legacy_is_dst
+	oneday=timedelta(days=1)
+	days = {}
+	cur_day = ""
+	cur_recording_number = 1
+	files = [x.split("/")[-1] for x in files_absolute]
+	indices_sorted = sorted(range(len(files)), key=lambda k: files[k])
+	file_paths_final = [files_absolute[i] for i in indices_sorted]
+	
+	for f in range(len(file_paths_final)):
+		file_real = file_paths_final[f]
+		file = file_paths_final[f].split("/")[-1] # remove the absolute path info for following part
+		try:
+			name = file.split(".")[0]
+			date_str = name.split(" ")[0]
+			year = int(date_str.split("-")[0])
+			month = int(date_str.split("-")[1])
+			day = int(date_str.split("-")[2])
+			time = name.split(" ")[1]
+			hour = int(time.split("_")[0])
+			minsec = time.split("_")[1] + "_" + time.split("_")[2]
+			try: 
+				dst_bool = is_dst(datetime(year=year,month=month,day=day,hour=hour))
+				if dst_bool:
+					hour = hour - 4
+				else:
+					hour = hour - 5
+			except:
+				hour = hour - 4
+			hour_date = hour - 4 # if answers prior to 4 am, count it as previous day! -> hours will range from 4 to 27 instead of 0 to 23
+			date_form = date(year,month,day)
+			if hour_date < 0:
+				hour = hour + 24
+				true_date = date_form - oneday
+				date_str = true_date.isoformat()	
+		except:
+			print("Name formatted incorrectly for: " + file + ", ignoring") # even for pipeline purposes will want to know if a file is found in raw not matching expected naming conventions
+			cur_recording_number = cur_recording_number + 1
+			continue
+
+		if cur_day == date_str:
+			# duplicate days also means we need to skip over it - but no need to log that info here, will be clear from other steps of pipeline.
+			cur_recording_number = cur_recording_number + 1
+			continue
+
+		if cur_day != "":
+			year = int(date_str.split("-")[0])
+			month = int(date_str.split("-")[1])
+			day = int(date_str.split("-")[2])
+			date_form = date(year,month,day)
+			prev_year = int(cur_day.split("-")[0])
+			prev_month = int(cur_day.split("-")[1])
+			prev_day = int(cur_day.split("-")[2])
+			prev_date_form = date(prev_year,prev_month,prev_day)
+			if date_form - prev_date_form != oneday:
+				days_gap = int((date_form - prev_date_form).days)
+				for d in range(1,days_gap):
+					missing_day = prev_date_form + timedelta(days=d)
+					missing_day_str = missing_day.isoformat()
+					days[missing_day_str] = 0
+		cur_day = date_str
+		days[cur_day] = (str(hour)+"_"+minsec, file_real, cur_recording_number)
+		cur_recording_number = cur_recording_number + 1
+
+	df_columns = ["iso_date", "year_int", "month_int", "day_int", "survey_answer_available", "ET_hour_int_formatted", "ET_time_formatted_string", "original_filepath", "new_filename", "recording_number"]
+	iso_dates = list(days.keys())
+	iso_dates.sort()
+	years = []
+	months = []
+	days_list = []
+	surveys_available = []
+	hours_int_list = []
+	time_str_list = []
+	files_list = []
+	filenames = []
+	recording_numbers = []
+	for d in iso_dates:
+		years.append(int(d.split("-")[0]))
+		months.append(int(d.split("-")[1]))
+		days_list.append(int(d.split("-")[2]))
+		if days[d] == 0:
+			surveys_available.append(0)
+			hours_int_list.append(np.nan)
+			time_str_list.append("")
+			files_list.append("")
+			filenames.append("")
+			recording_numbers.append(np.nan)
+		else:
+			surveys_available.append(1)
+			ans_tuple = days[d]
+			hours_int_list.append(int(ans_tuple[0].split("_")[0]))
+			time_str_list.append(ans_tuple[0])
+			files_list.append(ans_tuple[1])
+			file_formatted = ans_tuple[1].split("/")[-1].split(".")[0]
+			filenames.append(file_formatted.split(" ")[0] + "+" + file_formatted.split(" ")[1])
+			recording_numbers.append(ans_tuple[2])
+	df_vals = [iso_dates, years, months, days_list, surveys_available, hours_int_list, time_str_list, files_list, filenames, recording_numbers]
+
+	map_csv = pd.DataFrame()
+	for i in range(len(df_columns)):
+		label = df_columns[i]
+		value = df_vals[i]
+		map_csv[label] = value
+	return map_csv
+
+# makes a synthetic raw recording history for one patient - usually one recording a day at a random UTC time, with the odd same-day repeat or missed day (and the odd missed week), over num_years years
+# a few recordings have the "+00" code after the time, and a few are badly named
+# returns the recording paths relative to the raw folder, in no particular order
+def synthetic_raw_history(num_years, rng, start=datetime(2017, 1, 1)):
+	paths = []
+	for d in range(int(num_years * 365)):
+		if d % 60 < 7 and (d // 60) % 3 == 2:
+			continue
+		for r in range(int(rng.choice([0, 1, 1, 1, 1, 1, 2]))):
+			when = start + timedelta(days=d, seconds=int(rng.integers(0, 86400)))
+			name = when.strftime("%Y-%m-%d %H_%M_%S")
+			if rng.random() < 0.05:
+				name = name + "+00"
+			if rng.random() < 0.002:
+				name = when.strftime("%Y-%m-%d") + " unknown"
+			paths.append("phone" + str(d // 365) + "/audio_recordings/prompt" + str(d // 90) + "/" + name + ".mp4.lock")
+	order = rng.permutation(len(paths))
+	return [paths[i] for i in order]
+
+# original per-file lookup of a diary's length in minutes, as the length check and email writer did it - finding and loading the patient's QC CSV again for every file and scanning it for the matching row
+# day_num looks the diary up by study day in the DPDash CSV, otherwise filename is looked up in the raw audio QC output
+def legacy_qc_minutes(root, study, OLID, day_num=None, filename=None):
+	os.chdir(root + study + "/" + OLID + "/phone/processed/audio")
+	if day_num is not None:
+		dpdash_name_format = study + "-" + OLID + "-phoneAudioQC-day1to*.csv"
+		dpdash_name = glob.glob(dpdash_name_format)[0]
+		dpdash_qc = pd.read_csv(dpdash_name)
+		cur_row = dpdash_qc[dpdash_qc["day"]==day_num]
+	else:
+		audio_qc_df = pd.read_csv(study + "_" + OLID + "_phone_audioQC_output.csv")
+		cur_row = audio_qc_df[audio_qc_df["filename"]==filename]
+	return float(cur_row["length(minutes)"].tolist()[0])
+
+# makes a synthetic study under root with num_days of QC outputs for each of num_patients patients - the DPDash CSV with one diary per day, and the raw audio QC output with some extra same-day diaries
+# returns a list of (OLID, day_num, filename) lookups to make, num_lookups by study day and half as many by filename of an extra diary per patient
+def synthetic_qc_study(root, num_patients, num_days, num_lookups, rng):
+	lookups = []
+	for p in range(num_patients):
+		OLID = "P" + str(p).zfill(4)
+		folder = os.path.join(root, "TEST", OLID, "phone", "processed", "audio")
+		os.makedirs(folder)
+		# a few columns like the DPDash CSV has
+		days = np.arange(1, num_days + 1)
+		filenames = [str(d).zfill(5) + "+12_00_00.wav" for d in days]
+		dpdash_qc = pd.DataFrame({"reftime": days * 86400000, "day": days, "timeofday": "12:00:00", "weekday": days % 7 + 1, "study": "TEST", "patient": OLID, "filename": filenames, "length(minutes)": np.round(rng.uniform(0.1, 5, num_days), 4), "overall_db": np.round(rng.uniform(40, 80, num_days), 4)})
+		dpdash_qc.to_csv(os.path.join(folder, "TEST-" + OLID + "-phoneAudioQC-day1to" + str(num_days) + ".csv"), index=False)
+		extra = dpdash_qc.sample(num_days // 10, random_state=p).copy()
+		extra["filename"] = extra["filename"].str.replace("12_00_00", "18_00_00")
+		raw_qc = pd.concat([dpdash_qc, extra])[["filename", "length(minutes)", "overall_db"]]
+		raw_qc.to_csv(os.path.join(folder, "TEST_" + OLID + "_phone_audioQC_output.csv"), index=False)
+		for d in rng.choice(days, num_lookups, replace=False):
+			lookups.append((OLID, int(d), None))
+		for filename in extra["filename"].iloc[:num_lookups // 2]:
+			lookups.append((OLID, None, filename))
+	return lookups
+
+# the original push, which made a new SFTP connection (and login) for each file - with paramiko used directly in place of pysftp, which no longer imports with current paramiko releases
+def legacy_transcript_push(root, study, OLID, password, port, pipeline=False):
+	os.chdir(os.path.join(root, study, OLID, "phone/processed/audio/to_send"))
+	push_list = []
+	for filename in os.listdir("."):
+		if not filename.endswith(".wav"):
+			continue
+		try:
+			transport = paramiko.Transport(("127.0.0.1", port))
+			transport.connect(username="partners_itp", password=password)
+			sftp = paramiko.SFTPClient.from_transport(transport)
+			sftp.put(filename, os.path.join("audio", filename))
+			transport.close()
+			push_list.append(filename)
+		except:
+			continue
+	for filename in push_list:
+		shutil.move(filename, "../pending_audio/" + ("new+" + filename if pipeline else filename))
+
+# makes a synthetic study under root with to_send folders of random WAV-sized files for each patient, returning {(OLID, filename): bytes}
+def synthetic_to_send(root, num_patients, files_per_patient, file_mb, rng):
+	contents = {}
+	for p in range(num_patients):
+		OLID = "P" + str(p).zfill(4)
+		folder = os.path.join(root, "TEST", OLID, "phone", "processed", "audio")
+		os.makedirs(os.path.join(folder, "to_send"))
+		os.makedirs(os.path.join(folder, "pending_audio"))
+		for f in range(files_per_patient):
+			filename = "TEST_" + OLID + "_audioJournal_day" + str(f + 1).zfill(4) + ".wav"
+			contents[(OLID, filename)] = rng.bytes(int(file_mb * 1048576))
+			with open(os.path.join(folder, "to_send", filename), "wb") as wav:
+				wav.write(contents[(OLID, filename)])
+	return contents
+
+# checks that every file arrived intact on the server and was moved to pending_audio (with the new+ marker when pipeline)
+def pushed_correctly(root, server_folder, contents, pipeline):
+	for (OLID, filename), data in contents.items():
+		remote_path = os.path.join(server_folder, "audio", filename)
+		local_path = os.path.join(root, "TEST", OLID, "phone", "processed", "audio", "pending_audio", ("new+" if pipeline else "") + filename)
+		if not os.path.isfile(remote_path) or not os.path.isfile(local_path):
+			return False
+		with open(remote_path, "rb") as f:
+			if f.read() != data:
+				return False
+	return True
+
+# adds a transcript to the server's output folder for every other pushed file, returning {(OLID, transcript name): text}
+def synthetic_transcripts(server_folder, contents, rng):
+	transcripts = {}
+	os.makedirs(os.path.join(server_folder, "output"), exist_ok=True)
+	for i, (OLID, filename) in enumerate(sorted(contents.keys())):
+		if i % 2 == 1:
+			continue
+		transname = filename.split(".")[0] + ".txt"
+		transcripts[(OLID, transname)] = "\n".join(["S1 00:00:" + str(j).zfill(2) + ".000 Sentence number " + str(rng.integers(1000000)) + "." for j in range(20)]) + "\n"
+		with open(os.path.join(server_folder, "output", transname), "w") as f:
+			f.write(transcripts[(OLID, transname)])
+	return transcripts
+
+# checks a pull left the local and server folders as expected - pulled transcripts in place with their audio gone from pending_audio and the server, and archived on the server, with the rest still pending
+def pulled_correctly(root, server_folder, contents, transcripts):
+	for (OLID, filename) in contents:
+		folder = os.path.join(root, "TEST", OLID, "phone", "processed", "audio")
+		transname = filename.split(".")[0] + ".txt"
+		if (OLID, transname) in transcripts:
+			with open(os.path.join(folder, "transcripts", transname)) as f:
+				if f.read() != transcripts[(OLID, transname)]:
+					return False
+			done = not os.path.exists(os.path.join(folder, "pending_audio", filename)) and not os.path.exists(os.path.join(server_folder, "audio", filename))
+			if not done or not os.path.isfile(os.path.join(server_folder, "output", "TEST_archive", transname)) or os.path.exists(os.path.join(server_folder, "output", transname)):
+				return False
+		elif not os.path.isfile(os.path.join(folder, "pending_audio", filename)) or os.path.exists(os.path.join(folder, "transcripts", transname)):
+			return False
+	return True
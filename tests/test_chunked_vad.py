@@ -0,0 +1,27 @@
+# chunked VAD has to give exactly the same pauses (resynthesized and direct foreground) as separating the whole diary at once where it should -
+# for a diary no longer than one chunk with any engine, and for the approximate engine given at least 2 minutes of overlap between chunks
+# short chunks are used for the longer diary here to keep the test quick, the pipeline default is 240 seconds
+
+import pytest
+import numpy as np
+import librosa
+
+from phone_audio_vad import separate_foreground, resynthesized_magnitude, detect_pauses, chunked_separation, resynthesized_max, detect_pauses_from_max
+from reference_functions import synthetic_diary
+
+@pytest.mark.parametrize("seconds, engine, chunk_sec", [(30, "librosa", 240), (90, "approximate", 30)])
+def test_chunked_matches_whole_diary(seconds, engine, chunk_sec):
+	audio, sr = synthetic_diary(seconds=seconds, seed=3)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=engine)
+	whole_foreground = librosa.istft(S_foreground)
+	whole_pauses = detect_pauses(resynthesized_magnitude(whole_foreground, sr), sr)
+	whole_direct = detect_pauses(S_foreground, sr)
+
+	foreground, frame_max, image_panels, image_factor = chunked_separation(audio, sr, nn_engine=engine, chunk_sec=chunk_sec, overlap_sec=125, foreground_max=True, image_width_px=1200)
+	assert detect_pauses_from_max(resynthesized_max(foreground, sr, int(librosa.time_to_frames(chunk_sec, sr=sr))), sr) == whole_pauses
+	assert detect_pauses_from_max(frame_max, sr) == whole_direct
+	assert len(foreground) == len(whole_foreground)
+	assert len(image_panels) == 3
+	for panel in image_panels:
+		assert panel.shape[1] <= 1200
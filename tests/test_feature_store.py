@@ -0,0 +1,50 @@
+# saving weekly batches of rows through the feature store has to give the same CSV as the original read-concatenate-rewrite save, and saving a row again with an existing key has to replace it
+
+import numpy as np
+import pandas as pd
+
+from feature_store_functions import upsert_rows, load_table
+from reference_functions import legacy_save_csv, tables_match, synthetic_qc_rows
+
+KEY_COLS = ["OLID", "filename"]
+
+# saves num_weeks of synthetic QC rows both ways, returning (legacy CSV path, store CSV path, the weekly rows)
+def save_weeks(tmp_path, num_weeks):
+	rng = np.random.default_rng(0)
+	weekly_rows = [synthetic_qc_rows(w, rng) for w in range(num_weeks)]
+	legacy_path = tmp_path / "legacy" / "TEST_AAAAA_phone_audioQC_output.csv"
+	store_path = tmp_path / "store" / "TEST_AAAAA_phone_audioQC_output.csv"
+	legacy_path.parent.mkdir()
+	store_path.parent.mkdir()
+	for rows in weekly_rows:
+		legacy_save_csv(str(legacy_path), rows, KEY_COLS)
+		upsert_rows(str(store_path), rows, KEY_COLS)
+	return (str(legacy_path), str(store_path), weekly_rows)
+
+def test_weekly_saves_match_original(tmp_path):
+	legacy_path, store_path, weekly_rows = save_weeks(tmp_path, 30)
+	legacy_csv = pd.read_csv(legacy_path)
+	assert legacy_csv.shape[0] == 30 * 7
+	assert tables_match(legacy_csv, pd.read_csv(store_path))
+	assert tables_match(legacy_csv, load_table(store_path))
+
+def test_existing_row_replaced(tmp_path):
+	legacy_path, store_path, weekly_rows = save_weeks(tmp_path, 5)
+	replacement = weekly_rows[0].iloc[[3]].copy()
+	replacement["overall_db"] = -1.0
+	upsert_rows(store_path, replacement, KEY_COLS)
+	expected = pd.concat([pd.read_csv(legacy_path).drop(index=3), replacement], ignore_index=True)
+	assert tables_match(expected, pd.read_csv(store_path))
+	assert tables_match(expected, load_table(store_path))
+
+def test_existing_csv_imported(tmp_path):
+	# rows already in the CSV from before the store existed are kept
+	rng = np.random.default_rng(0)
+	csv_path = str(tmp_path / "TEST_AAAAA_phone_audioQC_output.csv")
+	first_week = synthetic_qc_rows(0, rng)
+	first_week.to_csv(csv_path, index=False)
+	second_week = synthetic_qc_rows(1, rng)
+	upsert_rows(csv_path, second_week, KEY_COLS)
+	expected = pd.concat([first_week, second_week], ignore_index=True)
+	assert tables_match(expected, pd.read_csv(csv_path))
+	assert tables_match(expected, load_table(csv_path))
@@ -0,0 +1,53 @@
+# building the ETFileMap incrementally from the last run's raw listing has to give exactly the same CSV as a full rebuild, for simulated weekly runs
+# and for the cases that fall back to a full rebuild - a recording that turns up dated before the last one mapped, and a removed recording
+
+import os
+import numpy as np
+import pytest
+
+from phone_audio_metadata_format import create_eastern_time_filemap
+from reference_functions import add_raw_week
+
+# both builds read the same raw folder, each writing to its own processed folder
+@pytest.fixture
+def filemap_roots(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path) # the builds change directory
+	full_root = str(tmp_path / "full") + "/"
+	incremental_root = str(tmp_path / "incremental") + "/"
+	raw_folder = os.path.join(full_root, "TEST", "AAAAA", "phone", "raw")
+	os.makedirs(raw_folder)
+	os.makedirs(os.path.join(incremental_root, "TEST", "AAAAA", "phone"))
+	os.symlink(raw_folder, os.path.join(incremental_root, "TEST", "AAAAA", "phone", "raw"))
+	for root in [full_root, incremental_root]:
+		os.makedirs(os.path.join(root, "TEST", "AAAAA", "phone", "processed", "audio"))
+	return (full_root, incremental_root, raw_folder)
+
+# runs a full and an incremental build, returning whether the two ETFileMaps are identical
+def builds_match(full_root, incremental_root):
+	create_eastern_time_filemap("TEST", "AAAAA", incremental=False, root=full_root)
+	create_eastern_time_filemap("TEST", "AAAAA", incremental=True, root=incremental_root)
+	map_name = os.path.join("TEST", "AAAAA", "phone", "processed", "audio", "TEST_AAAAA_phone_audio_ETFileMap.csv")
+	with open(os.path.join(full_root, map_name)) as f_full, open(os.path.join(incremental_root, map_name)) as f_incremental:
+		return f_full.read() == f_incremental.read()
+
+def test_weekly_runs_match_full_rebuild(filemap_roots):
+	full_root, incremental_root, raw_folder = filemap_roots
+	rng = np.random.default_rng(0)
+	for week in range(30):
+		add_raw_week(raw_folder, week, rng)
+		assert builds_match(full_root, incremental_root)
+	# and a run with no new recordings
+	assert builds_match(full_root, incremental_root)
+
+def test_late_and_removed_recordings(filemap_roots):
+	full_root, incremental_root, raw_folder = filemap_roots
+	rng = np.random.default_rng(0)
+	for week in range(8):
+		add_raw_week(raw_folder, week, rng)
+		builds_match(full_root, incremental_root)
+	# a late arriving recording from early in the history changes recording numbers, and a removed one can change which recording a day maps to
+	late_path = os.path.join(raw_folder, "phone0", "audio_recordings", "2019-01-01 20_00_00.mp4.lock")
+	open(late_path, "w").close()
+	assert builds_match(full_root, incremental_root)
+	os.remove(late_path)
+	assert builds_match(full_root, incremental_root)
@@ -0,0 +1,65 @@
+# the vectorized ETFileMap day assignment converts the actual UTC time of each recording, while the original per-file loop applied the Eastern Time offset for the UTC hour as though it were local time
+# so the two may only differ on days involving a recording submitted within a few hours of a daylight savings change - and every mapped recording has to agree with a plain per-recording conversion, for any timezone
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+import pytest
+
+from phone_audio_metadata_format import parse_recordings, first_per_day, filemap_table
+from reference_functions import legacy_is_dst, legacy_eastern_time_filemap, synthetic_raw_history
+
+@pytest.fixture(scope="module")
+def history():
+	paths = synthetic_raw_history(3, np.random.default_rng(0))
+	files = [x.split("/")[-1] for x in paths]
+	sorted_paths = [paths[i] for i in sorted(range(len(paths)), key=lambda k: files[k])]
+	return (paths, sorted_paths)
+
+def test_differences_only_around_daylight_savings(history):
+	paths, sorted_paths = history
+	legacy_csv = legacy_eastern_time_filemap(paths)
+	vectorized_csv = filemap_table(first_per_day(parse_recordings(sorted_paths, 1, "US/Eastern")))
+	assert legacy_csv.columns.equals(vectorized_csv.columns)
+
+	# recordings where the original offset isn't the real one
+	offset_differs = set()
+	for path in sorted_paths:
+		name = path.split("/")[-1].split(".")[0]
+		try:
+			utc_time = datetime.strptime(name[:19], "%Y-%m-%d %H_%M_%S")
+		except:
+			continue
+		try:
+			legacy_offset = -4 if legacy_is_dst(utc_time) else -5
+		except:
+			legacy_offset = -4
+		real_offset = pytz.utc.localize(utc_time).astimezone(pytz.timezone("US/Eastern")).utcoffset().total_seconds() / 3600
+		if legacy_offset != real_offset:
+			offset_differs.add(path)
+	assert len(offset_differs) > 0
+
+	# a differing day must involve one of those recordings, either as the recording mapped to it by one version, or as the recording just before it (which can decide whether a same-day recording is skipped)
+	legacy_rows = legacy_csv.astype(object).fillna("").astype(str).set_index("iso_date")
+	vectorized_rows = vectorized_csv.astype(object).fillna("").astype(str).set_index("iso_date")
+	differing_days = [d for d in legacy_rows.index.union(vectorized_rows.index) if d not in legacy_rows.index or d not in vectorized_rows.index or not legacy_rows.loc[d].equals(vectorized_rows.loc[d])]
+	for d in differing_days:
+		explained = False
+		for rows in [legacy_rows, vectorized_rows]:
+			if d in rows.index and rows.loc[d, "original_filepath"] != "":
+				position = sorted_paths.index(rows.loc[d, "original_filepath"])
+				explained = explained or len(offset_differs.intersection(sorted_paths[max(0, position - 1):position + 1])) > 0
+		assert explained, d
+
+@pytest.mark.parametrize("timezone", ["US/Eastern", "US/Pacific", "Asia/Kolkata"])
+def test_matches_per_recording_conversion(history, timezone):
+	paths, sorted_paths = history
+	day_rows = first_per_day(parse_recordings(sorted_paths, 1, timezone))
+	assert day_rows["iso_date"].is_monotonic_increasing
+	assert day_rows["iso_date"].is_unique
+	for iso_date, time_str, path in zip(day_rows["iso_date"], day_rows["ET_time_formatted_string"], day_rows["original_filepath"]):
+		name = path.split("/")[-1].split(".")[0]
+		local_time = pytz.utc.localize(datetime.strptime(name[:19], "%Y-%m-%d %H_%M_%S")).astimezone(pytz.timezone(timezone))
+		study_day = (local_time - timedelta(hours=4)).date()
+		assert iso_date == study_day.isoformat()
+		assert time_str == str(local_time.hour + (24 if local_time.hour < 4 else 0)) + "_" + local_time.strftime("%M_%S") + name[19:]
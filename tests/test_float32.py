@@ -0,0 +1,41 @@
+# the audio QC metrics, resynthesized pause detection, and pause-derived dB and flatness computed in the float32 numeric mode have to stay within FLOAT32_TOLERANCES of the float64 results
+
+import pytest
+import numpy as np
+import librosa
+
+from phone_audio_vad import separate_foreground, resynthesized_magnitude, detect_pauses, add_pause_rows, pause_sample_mask, pause_audio_metrics
+from phone_audio_qc import qc_metrics
+from audio_buffer_functions import set_audio_dtype
+from reference_functions import synthetic_diary, pause_agreement, FLOAT32_TOLERANCES
+
+# the outputs at the given precision, run on one shared VAD foreground (which is float32 either way)
+def precision_outputs(audio, foreground, sr, dtype_name):
+	set_audio_dtype(dtype_name)
+	try:
+		vol, std, mean_flat, max_flat = qc_metrics(audio)
+		pauses = detect_pauses(resynthesized_magnitude(foreground, sr), sr)
+		pause_vals = [[], [], [], [], []]
+		add_pause_rows(pause_vals, "diary.wav", pauses, sr, 1.0)
+		pause_mask = pause_sample_mask(len(audio), pause_vals[2], pause_vals[3])
+		pause_db, pause_flatness = pause_audio_metrics(audio[pause_mask].astype(dtype_name))
+	finally:
+		set_audio_dtype("float64")
+	return {"db": 20 * np.log10(vol / float(2*(10**(-5)))), "std": std, "flatness": [mean_flat, max_flat, pause_flatness], "pauses": pauses, "pause_db": pause_db}
+
+@pytest.mark.parametrize("seconds, seed", [(5, 0), (30, 1)])
+def test_float32_within_tolerance(seconds, seed):
+	audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	S_foreground, S_background = separate_foreground(S_full, sr, nn_engine="approximate")
+	foreground = librosa.istft(S_foreground)
+	result64 = precision_outputs(audio, foreground, sr, "float64")
+	result32 = precision_outputs(audio, foreground, sr, "float32")
+
+	assert len(result64["pauses"]) > 0
+	assert abs(result32["db"] - result64["db"]) <= FLOAT32_TOLERANCES["db"]
+	assert abs(result32["pause_db"] - result64["pause_db"]) <= FLOAT32_TOLERANCES["db"]
+	assert abs(result32["std"] - result64["std"]) / result64["std"] <= FLOAT32_TOLERANCES["std"]
+	for flat32, flat64 in zip(result32["flatness"], result64["flatness"]):
+		assert abs(flat32 - flat64) / flat64 <= FLOAT32_TOLERANCES["flatness"]
+	assert pause_agreement(result64["pauses"], result32["pauses"]) >= FLOAT32_TOLERANCES["pause_agreement"]
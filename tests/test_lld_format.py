@@ -0,0 +1,26 @@
+# OpenSMILE LLDs saved in the binary format have to load back the same as the semicolon CSV written alongside them, and the CSV has to be used when there is no binary version
+
+import os
+import numpy as np
+
+from opensmile_functions import LLD_FEATURES, save_lld, load_lld, lld_exists
+from reference_functions import synthetic_lld
+
+def test_binary_matches_csv(tmp_path):
+	out_root = str(tmp_path / "diary")
+	save_lld(synthetic_lld(30, LLD_FEATURES), out_root, save_csv=True)
+	from_binary = load_lld(out_root)
+	os.remove(out_root + ".npz")
+	from_csv = load_lld(out_root)
+	numeric_cols = ["frameTime"] + LLD_FEATURES
+	assert from_binary.columns.tolist() == from_csv.columns.tolist()
+	assert from_binary["name"].equals(from_csv["name"])
+	assert np.allclose(from_binary[numeric_cols].to_numpy(), from_csv[numeric_cols].to_numpy(), rtol=1e-12, atol=0, equal_nan=True)
+
+def test_binary_only(tmp_path):
+	out_root = str(tmp_path / "diary")
+	lld = synthetic_lld(5, LLD_FEATURES)
+	save_lld(lld, out_root, save_csv=False)
+	assert lld_exists(out_root)
+	assert not os.path.isfile(out_root + ".csv")
+	assert load_lld(out_root).equals(lld)
@@ -0,0 +1,40 @@
+# the blocked nearest neighbor filter engine for VAD has to give exactly the same pause times as the original librosa one, and the approximate engine has to agree on most of the pause time points
+# agreement on a single short diary with only a few pauses can swing a lot from one pause changing, so the approximate engine is held to it pooled across the diaries
+
+import pytest
+import librosa
+
+from phone_audio_vad import separate_foreground, resynthesized_magnitude, detect_pauses
+from vad_engine_functions import nn_filter_engines
+from reference_functions import synthetic_diary, pause_overlap
+
+MIN_AGREEMENT = 0.9
+
+# pauses found by each engine on each diary, as a list of {engine: pauses}
+@pytest.fixture(scope="module")
+def engine_pauses():
+	results = []
+	for seconds, seed in [(5, 0), (20, 2), (30, 1)]:
+		audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+		S_full, phase = librosa.magphase(librosa.stft(audio))
+		cur_results = {}
+		for engine in nn_filter_engines:
+			S_foreground, S_background = separate_foreground(S_full, sr, nn_engine=engine)
+			assert S_foreground.shape == S_full.shape
+			cur_results[engine] = detect_pauses(resynthesized_magnitude(librosa.istft(S_foreground), sr), sr)
+		results.append(cur_results)
+	return results
+
+def test_blocked_matches_librosa(engine_pauses):
+	for cur_results in engine_pauses:
+		assert cur_results["blocked"] == cur_results["librosa"]
+
+def test_approximate_agrees_with_librosa(engine_pauses):
+	pooled_both = 0
+	pooled_either = 0
+	for cur_results in engine_pauses:
+		num_both, num_either = pause_overlap(cur_results["librosa"], cur_results["approximate"])
+		pooled_both = pooled_both + num_both
+		pooled_either = pooled_either + num_either
+	assert pooled_either > 0
+	assert float(pooled_both) / pooled_either >= MIN_AGREEMENT
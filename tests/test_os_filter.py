@@ -0,0 +1,40 @@
+# filtering a frame-level feature table by pause times with the sorted interval search (frame_filter_functions.pause_frame_mask) has to give exactly the same table as the original per-pause loop
+# uses the pause times detected on synthetic diaries at a couple of thresholds, applied to a table of 10 ms frames with random feature values
+
+import pytest
+import numpy as np
+import librosa
+
+from phone_audio_vad import detect_pauses, add_pause_rows
+from frame_filter_functions import pause_frame_mask
+from reference_functions import synthetic_diary, synthetic_frame_table, legacy_filter_opensmile
+
+FEATURE_COLS = ["Loudness_sma3", "F0semitoneFrom27.5Hz_sma3nz", "HNRdBACF_sma3nz"]
+
+# filters the table as diary_pause_qc does
+def filter_frames(raw_os_result, pause_start_times, pause_stop_times):
+	in_pause = pause_frame_mask(raw_os_result, pause_start_times, pause_stop_times)
+	current = raw_os_result[FEATURE_COLS].copy()
+	current.loc[in_pause] = np.nan
+	current["frameTime"] = raw_os_result["frameTime"].tolist()
+	return current
+
+@pytest.mark.parametrize("seconds, seed", [(5, 0), (30, 1)])
+@pytest.mark.parametrize("spec_thres", [0.03, 0.1])
+def test_filter_matches_original(seconds, seed, spec_thres):
+	audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	pause_vals = [[], [], [], [], []]
+	add_pause_rows(pause_vals, "diary.wav", detect_pauses(S_full, sr, spec_thres=spec_thres), sr, 1.0)
+	pause_start_times = [b/float(sr) for b in pause_vals[2]]
+	pause_stop_times = [b/float(sr) for b in pause_vals[3]]
+	raw_os_result = synthetic_frame_table(len(audio) / float(sr), FEATURE_COLS, seed=seed)
+	current = filter_frames(raw_os_result, pause_start_times, pause_stop_times)
+	assert current.equals(legacy_filter_opensmile(raw_os_result, pause_start_times, pause_stop_times, FEATURE_COLS))
+	assert current[FEATURE_COLS[0]].isna().any()
+
+def test_filter_without_pauses():
+	raw_os_result = synthetic_frame_table(5, FEATURE_COLS)
+	current = filter_frames(raw_os_result, [], [])
+	assert not current[FEATURE_COLS].isna().any().any()
+	assert current.equals(legacy_filter_opensmile(raw_os_result, [], [], FEATURE_COLS))
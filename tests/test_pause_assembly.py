@@ -0,0 +1,34 @@
+# building the pause-only and speech-only signals for pause QC from a sample mask has to give exactly the same signals as the original appending loops
+# a lower threshold is tried as well to get diaries with many short pauses
+
+import pytest
+import numpy as np
+import librosa
+
+from phone_audio_vad import detect_pauses, add_pause_rows, pause_sample_mask
+from reference_functions import synthetic_diary, legacy_pause_speech_signals
+
+# signals as diary_pause_qc builds them from the mask - the last sample is never included in the speech, as the original loop stopped one short of the end
+def mask_signals(audio, pause_starts, pause_stops):
+	pause_mask = pause_sample_mask(len(audio), pause_starts, pause_stops)
+	speech_mask = ~pause_mask
+	speech_mask[-1] = False
+	return (audio[pause_mask].astype(np.float64), audio[speech_mask].astype(np.float64))
+
+@pytest.mark.parametrize("seconds, seed", [(5, 0), (30, 1)])
+@pytest.mark.parametrize("spec_thres", [0.03, 0.1])
+def test_mask_matches_original(seconds, seed, spec_thres):
+	audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	pause_vals = [[], [], [], [], []]
+	add_pause_rows(pause_vals, "diary.wav", detect_pauses(S_full, sr, spec_thres=spec_thres), sr, 1.0)
+	legacy_pauses, legacy_speech = legacy_pause_speech_signals(audio, pause_vals[2], pause_vals[3])
+	pauses_only, speech_only = mask_signals(audio, pause_vals[2], pause_vals[3])
+	assert np.array_equal(legacy_pauses, pauses_only)
+	assert np.array_equal(legacy_speech, speech_only)
+
+def test_mask_without_pauses():
+	audio, sr = synthetic_diary(seconds=5, seed=0)
+	pauses_only, speech_only = mask_signals(audio, [], [])
+	assert len(pauses_only) == 0
+	assert np.array_equal(speech_only, audio[:-1].astype(np.float64))
@@ -0,0 +1,23 @@
+# the vectorized pause detection in phone_audio_vad has to give exactly the same pause periods (and therefore the same pauseTimesOutput CSV rows) as the original loops
+# a few thresholds are tried for each diary so that both sparse and dense pause patterns are covered
+
+import pytest
+import librosa
+
+from phone_audio_vad import detect_pauses
+from reference_functions import synthetic_diary, legacy_detect_pauses
+
+@pytest.mark.parametrize("seconds, seed", [(5, 0), (30, 1)])
+@pytest.mark.parametrize("spec_thres", [0.01, 0.03, 0.1, 0.5])
+def test_detect_pauses_matches_original(seconds, seed, spec_thres):
+	audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	assert detect_pauses(S_full, sr, spec_thres=spec_thres) == legacy_detect_pauses(S_full, sr, spec_thres=spec_thres)
+
+def test_detect_pauses_finds_pauses():
+	audio, sr = synthetic_diary(seconds=30, seed=1)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	pauses = detect_pauses(S_full, sr)
+	assert len(pauses) > 0
+	for first, last, num in pauses:
+		assert num == last - first + 1
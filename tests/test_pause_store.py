@@ -0,0 +1,37 @@
+# pause times saved with one feature store partition per diary have to give the same CSV and the same per-diary pauses as the original pause times CSV, and saving a diary again has to replace all of its old pauses
+
+import numpy as np
+import pandas as pd
+
+from feature_store_functions import upsert_partitions, load_partition
+from reference_functions import legacy_save_csv, tables_match, synthetic_pause_rows
+
+def test_weekly_runs_match_original(tmp_path):
+	rng = np.random.default_rng(0)
+	legacy_path = str(tmp_path / "TEST_AAAAA_phone_audioVAD_pauseTimesOutput_legacy.csv")
+	store_path = str(tmp_path / "TEST_AAAAA_phone_audioVAD_pauseTimesOutput.csv")
+	for week in range(8):
+		rows = synthetic_pause_rows(week, rng)
+		legacy_save_csv(legacy_path, rows, ["filename", "pause_number"])
+		upsert_partitions(store_path, rows, "filename")
+		# each of the week's diaries' pauses are read back, as pause-derived QC does
+		pause_times = pd.read_csv(legacy_path)
+		for filename in pd.unique(rows["filename"]):
+			legacy_pauses = pause_times[pause_times["filename"]==filename].reset_index(drop=True)
+			assert tables_match(legacy_pauses, load_partition(store_path, "filename", filename))
+	assert tables_match(pd.read_csv(legacy_path), pd.read_csv(store_path))
+
+def test_diary_saved_again(tmp_path):
+	rng = np.random.default_rng(0)
+	store_path = str(tmp_path / "TEST_AAAAA_phone_audioVAD_pauseTimesOutput.csv")
+	first_week = synthetic_pause_rows(0, rng)
+	upsert_partitions(store_path, first_week, "filename")
+	second_week = synthetic_pause_rows(1, rng)
+	upsert_partitions(store_path, second_week, "filename")
+	filename = first_week["filename"].iloc[0]
+	redo = first_week[first_week["filename"]==filename].iloc[:10].copy()
+	upsert_partitions(store_path, redo, "filename")
+	assert tables_match(redo.reset_index(drop=True), load_partition(store_path, "filename", filename))
+	saved = pd.read_csv(store_path)
+	assert (saved["filename"]==filename).sum() == 10
+	assert saved.shape[0] == first_week.shape[0] - (first_week["filename"]==filename).sum() + 10 + second_week.shape[0]
@@ -0,0 +1,30 @@
+# the study-wide QC index has to give the same diary lengths as the original per-file CSV lookups, and handle missing days and patients the way the scripts expect
+
+import numpy as np
+import pytest
+
+from qc_index_functions import qc_row_by_day, qc_row_by_filename
+from reference_functions import legacy_qc_minutes, synthetic_qc_study
+
+def test_lengths_match_original(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path) # the original lookups change directory
+	root = str(tmp_path) + "/"
+	lookups = synthetic_qc_study(root, 5, 60, 6, np.random.default_rng(0))
+	legacy_minutes = [legacy_qc_minutes(root, "TEST", OLID, day_num=day_num, filename=filename) for OLID, day_num, filename in lookups]
+	index_minutes = []
+	for OLID, day_num, filename in lookups:
+		if day_num is not None:
+			index_minutes.append(float(qc_row_by_day("TEST", OLID, day_num, root=root)["length(minutes)"]))
+		else:
+			index_minutes.append(float(qc_row_by_filename("TEST", OLID, filename, source="raw", root=root)["length(minutes)"]))
+	assert len(lookups) == 5 * 9
+	assert index_minutes == legacy_minutes
+
+def test_missing_entries(tmp_path):
+	root = str(tmp_path) + "/"
+	synthetic_qc_study(root, 1, 60, 6, np.random.default_rng(0))
+	# a missing day or file comes back as None, and a patient without a table raises an IOError
+	assert qc_row_by_day("TEST", "P0000", 61, root=root) is None
+	assert qc_row_by_filename("TEST", "P0000", "00001+18_00_00.wav", root=root) is None
+	with pytest.raises(IOError):
+		qc_row_by_day("TEST", "NOTAPATIENT", 1, root=root)
@@ -0,0 +1,47 @@
+# the study-wide push has to upload every file intact over a single SFTP session, reopen a dropped connection without losing files, and fail straight away on a wrong password leaving the files in to_send
+# a file that can't be uploaded because of the file itself has to fail without reconnecting
+
+import os
+import numpy as np
+import pytest
+
+from phone_transcribeme_sftp_push import study_transcript_push
+from sftp_session_functions import open_sftp_session, close_sftp_session, session_call
+from reference_functions import synthetic_to_send, pushed_correctly
+
+@pytest.fixture
+def to_send(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path) # the push changes directory
+	root = str(tmp_path / "PROTECTED")
+	return (root, synthetic_to_send(root, 3, 3, 0.05, np.random.default_rng(0)))
+
+def test_push_over_one_session(sftp_server, to_send):
+	root, contents = to_send
+	server = sftp_server()
+	study_transcript_push("TEST", "pw", pipeline=True, num_channels=1, host="127.0.0.1", port=server["port"], root=root)
+	assert pushed_correctly(root, server["root_folder"], contents, True)
+	assert server["connections"] == 1
+
+def test_push_reconnects_after_drop(sftp_server, to_send):
+	root, contents = to_send
+	server = sftp_server(drop_after=4)
+	study_transcript_push("TEST", "pw", pipeline=True, num_channels=1, host="127.0.0.1", port=server["port"], root=root)
+	assert pushed_correctly(root, server["root_folder"], contents, True)
+	assert server["connections"] > 1
+
+def test_wrong_password_leaves_files(sftp_server, to_send):
+	root, contents = to_send
+	server = sftp_server()
+	study_transcript_push("TEST", "wrong", pipeline=True, num_channels=1, host="127.0.0.1", port=server["port"], root=root)
+	for OLID, filename in contents:
+		assert os.path.isfile(os.path.join(root, "TEST", OLID, "phone", "processed", "audio", "to_send", filename))
+	assert server["connections"] == 1
+	assert len(os.listdir(os.path.join(server["root_folder"], "audio"))) == 0
+
+def test_missing_file_not_retried(sftp_server, tmp_path):
+	server = sftp_server()
+	session = open_sftp_session("pw", host="127.0.0.1", port=server["port"])
+	with pytest.raises(FileNotFoundError):
+		session_call(session, "put", str(tmp_path / "missing.wav"), "audio/missing.wav")
+	assert session["handshakes"] == 1
+	close_sftp_session(session)
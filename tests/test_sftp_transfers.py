@@ -0,0 +1,52 @@
+# the concurrent push and pull have to leave the local and server folders as expected, keep the combined rate under a bandwidth cap, and survive connections being dropped partway through
+# a transfer that fails because of the file itself has to fail without being retried
+
+import numpy as np
+import pytest
+
+from phone_transcribeme_sftp_push import study_transcript_push
+from phone_transcribeme_sftp_pull import study_transcript_pull
+from sftp_transfer_functions import open_transfer_pool, run_transfers, close_transfer_pool
+from reference_functions import synthetic_to_send, pushed_correctly, synthetic_transcripts, pulled_correctly
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	return str(tmp_path / "PROTECTED")
+
+def test_concurrent_push_and_pull(sftp_server, root):
+	rng = np.random.default_rng(0)
+	contents = synthetic_to_send(root, 3, 4, 0.05, rng)
+	server = sftp_server()
+	study_transcript_push("TEST", "pw", num_channels=4, host="127.0.0.1", port=server["port"], root=root)
+	assert pushed_correctly(root, server["root_folder"], contents, False)
+	transcripts = synthetic_transcripts(server["root_folder"], contents, rng)
+	study_transcript_pull("TEST", "pw", num_channels=4, host="127.0.0.1", port=server["port"], root=root)
+	assert pulled_correctly(root, server["root_folder"], contents, transcripts)
+
+def test_bandwidth_cap(sftp_server, root):
+	contents = synthetic_to_send(root, 1, 4, 0.25, np.random.default_rng(0))
+	server = sftp_server()
+	pool_state = open_transfer_pool("pw", host="127.0.0.1", port=server["port"], num_channels=4, bandwidth_mb=2.0)
+	tasks = [{"operation": "put", "args": (root + "/TEST/P0000/phone/processed/audio/to_send/" + filename, "audio/" + filename)} for OLID, filename in contents]
+	results = run_transfers(pool_state, tasks, label="upload")
+	close_transfer_pool(pool_state)
+	assert all([r["success"] for r in results])
+	assert pool_state["bytes_done"] / 1048576.0 / pool_state["seconds"] <= 2.0 * 1.05
+
+def test_push_survives_dropped_connections(sftp_server, root):
+	contents = synthetic_to_send(root, 3, 4, 0.05, np.random.default_rng(0))
+	server = sftp_server(drop_after=3)
+	study_transcript_push("TEST", "pw", num_channels=2, host="127.0.0.1", port=server["port"], root=root)
+	assert pushed_correctly(root, server["root_folder"], contents, False)
+	assert server["connections"] > 2
+
+def test_file_errors_not_retried(sftp_server, root, tmp_path, capsys):
+	server = sftp_server()
+	pool_state = open_transfer_pool("pw", host="127.0.0.1", port=server["port"], num_channels=2)
+	results = run_transfers(pool_state, [{"operation": "get", "args": ("output/missing.txt", str(tmp_path / "missing.txt"))}, {"operation": "put", "args": (str(tmp_path / "missing.wav"), "audio/missing.wav")},
+										  {"operation": "mkdir", "args": ("audio",)}]) # the folder already exists
+	close_transfer_pool(pool_state)
+	assert not any([r["success"] for r in results])
+	assert "retrying" not in capsys.readouterr().out
+	assert server["connections"] <= 2
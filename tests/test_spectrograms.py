@@ -0,0 +1,33 @@
+# a VAD comparison image queued and rendered separately has to come out the same size as the original inline rendering, and look the same (mean absolute pixel difference, on a 0 to 1 scale)
+# the approximate nearest neighbor filter is used for the foreground, as only the rendering is being compared here
+
+import os
+import pytest
+import numpy as np
+import librosa
+import matplotlib.pyplot as plt
+
+from phone_audio_vad import separate_foreground
+from spectrogram_functions import queue_spectrogram, render_spectrogram_job
+from reference_functions import synthetic_diary, legacy_comparison_image
+
+MAX_PIXEL_DIFF = 0.03
+
+@pytest.mark.parametrize("seconds, seed", [(5, 0), (30, 1)])
+def test_queued_image_matches_inline(seconds, seed, tmp_path):
+	audio, sr = synthetic_diary(seconds=seconds, seed=seed)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	S_foreground, S_background = separate_foreground(S_full, sr, nn_engine="approximate")
+	legacy_path = str(tmp_path / "legacy.png")
+	queued_path = str(tmp_path / "queued.png")
+
+	queue_spectrogram(str(tmp_path / "queue"), queued_path, [("Full spectrum", S_full, None), ("Background", S_background, None), ("Foreground", S_foreground, "time")], sr, figsize=(12, 8))
+	job_path, success, error = render_spectrogram_job(str(tmp_path / "queue" / "queued.npz"))
+	assert success, error
+	assert not os.path.exists(str(tmp_path / "queue" / "queued.npz")) # the job is removed once rendered
+	legacy_comparison_image(S_full, S_background, S_foreground, sr, legacy_path)
+
+	legacy_image = plt.imread(legacy_path)
+	queued_image = plt.imread(queued_path)
+	assert legacy_image.shape == queued_image.shape
+	assert np.mean(np.abs(legacy_image - queued_image)) <= MAX_PIXEL_DIFF
@@ -0,0 +1,39 @@
+# each lightweight VAD backend has to return pause periods in the same format as detect_pauses, so they can be saved and used the same way, and find a stretch of silence as one pause
+# how closely a backend agrees with the foreground separation VAD is only reported by the benchmark, as that depends on what a run is for
+
+import pytest
+import numpy as np
+import librosa
+
+from vad_engine_functions import vad_backends
+from reference_functions import synthetic_diary
+
+@pytest.mark.parametrize("backend", sorted(vad_backends.keys()))
+def test_pause_format(backend):
+	audio, sr = synthetic_diary(seconds=30, seed=1)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	pauses = vad_backends[backend](S_full, sr)
+	assert len(pauses) > 0
+	last_index = -2
+	for first, last, num in pauses:
+		assert num == last - first + 1
+		assert num >= 2
+		assert first > last_index + 1 # in order, and separated from the pause before
+		last_index = last
+
+@pytest.mark.parametrize("backend", sorted(vad_backends.keys()))
+def test_silence_found(backend):
+	audio, sr = synthetic_diary(seconds=20, seed=2)
+	silence_start = 8 * sr
+	silence_stop = 11 * sr
+	audio[silence_start:silence_stop] = 0.0002 * np.random.default_rng(0).standard_normal(silence_stop - silence_start)
+	S_full, phase = librosa.magphase(librosa.stft(audio))
+	pauses = vad_backends[backend](S_full, sr)
+	# the middle two seconds of the silence are covered by a single pause
+	first_index = int(librosa.samples_to_frames(silence_start + sr // 2))
+	last_index = int(librosa.samples_to_frames(silence_stop - sr // 2))
+	assert any([first <= first_index and last >= last_index for first, last, num in pauses])
+
+@pytest.mark.parametrize("backend", sorted(vad_backends.keys()))
+def test_empty_spectrogram(backend):
+	assert vad_backends[backend](np.zeros((1025, 0)), 22050) == []